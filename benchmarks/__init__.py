@@ -0,0 +1 @@
+"""Benchmarks and synthetic data for metrex (not part of the installed package)."""
@@ -0,0 +1,232 @@
+"""
+Benchmark harness for metrex.
+
+    python -m benchmarks.bench generate DIR [--pairs 200 --bars 20000 ...]
+    python -m benchmarks.bench run [--datafolder DIR] [--report out.json]
+    python -m benchmarks.bench check --datafolder DIR --reference REF [--save]
+
+`run` times every stage of a metrics run (load, panel build, each registered
+metric, the `run_metrics` join) and of `rank_pairs` (load, rank, write) and
+reports wall time (best of `--repeat`) and peak memory per stage. Peak memory
+is measured by tracemalloc in a separate pass, so it counts Python and NumPy
+allocations but not Arrow buffers. `check` recomputes metrics and ranks and
+compares them with a reference saved earlier by `check --save`, so optimized
+code paths can be verified against a previous release's output.
+"""
+import json
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import click
+import numpy as np
+import pandas as pd
+from metrex.io import feather_files
+from metrex.metrics import REGISTRY, all_names
+from metrex.metrics.base import PanelMetric
+from metrex.panel import MarketPanel
+from metrex.processor import (_rank_frame, _write_ranks, join_metric_frames, load_market, process,
+                              rank_pairs)
+from metrex.options import STORES
+from metrex.store import open_store, read_pair
+from metrex.writer import PairWriter
+from .synthetic import generate
+
+
+def measure(fn: Callable[[], Any], repeat: int = 1, memory: bool = True) -> Tuple[Any, Dict[str, float]]:
+    """Run `fn` `repeat` times; returns its last result and {'seconds', 'peak_mb'}."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    stats = {'seconds': min(times)}
+    if memory:
+        tracemalloc.start()
+        result = fn()
+        stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, stats
+
+
+def bench_metrics(datafolder: Path, timeframe: str, names: List[str], repeat: int = 1,
+                  memory: bool = True, compact: bool = False) -> List[Dict[str, Any]]:
+    """Stage timings of a metrics run."""
+    report = []
+
+    def stage(name: str, fn: Callable[[], Any], rows: Callable[[Any], int] = len) -> Any:
+        result, stats = measure(fn, repeat, memory)
+        report.append({'stage': name, 'rows': rows(result), **stats})
+        return result
+
+    df = stage('metrics:load', lambda: load_market(datafolder, timeframe, compact=compact))
+    panel = stage('metrics:panel', lambda: MarketPanel.from_frame(df), rows=lambda p: int(p.present.sum()))
+    frames = []
+    for name in names:
+        metric = REGISTRY[name]
+
+        def compute(metric=metric):
+            # Drop derived arrays (returns, ...) so each metric pays for what it uses
+            panel._cache.clear()
+            ctx: Dict[str, Any] = {}
+            return metric.compute_panel(panel, ctx) if isinstance(metric, PanelMetric) else metric.compute(df, ctx)
+        frames.append(stage(f'metric:{name}', compute))
+    stage('metrics:join', lambda: join_metric_frames(frames, float32=compact))
+    return report
+
+
+def bench_rank(datafolder: Path, timeframe: str, store: str = 'feather', repeat: int = 1,
+               memory: bool = True, compact: bool = False) -> List[Dict[str, Any]]:
+    """Stage timings of a full (non-latest) `rank_pairs` run."""
+    report = []
+    df, stats = measure(lambda: load_market(datafolder, timeframe, compact=compact), repeat, memory)
+    report.append({'stage': 'rank:load', 'rows': len(df), **stats})
+    ranked, stats = measure(lambda: _rank_frame(df.copy(), {}, compact), repeat, memory)
+    report.append({'stage': 'rank:compute', 'rows': len(ranked[1]), **stats})
+
+    def write():
+        out = Path(tempfile.mkdtemp(prefix='metrex-bench-'))
+        try:
+            out_store = open_store(store, out, timeframe)
+            with PairWriter(out_store) as writer:
+                _write_ranks(*ranked, writer, {})
+            out_store.flush()
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+        return ranked[1]
+    _, stats = measure(write, repeat, memory)
+    report.append({'stage': f'rank:write[{store}]', 'rows': len(ranked[1]), **stats})
+    return report
+
+
+def compare_frames(expected: pd.DataFrame, actual: pd.DataFrame, rtol: float = 1e-9,
+                   atol: float = 1e-12) -> List[str]:
+    """Differences between two result frames (empty when equivalent).
+
+    Float columns are compared with tolerances, everything else exactly.
+    """
+    problems = []
+    if list(expected.columns) != list(actual.columns):
+        return [f"columns {list(expected.columns)} != {list(actual.columns)}"]
+    if len(expected) != len(actual):
+        return [f"{len(expected)} rows != {len(actual)} rows"]
+    for col in expected.columns:
+        a, b = expected[col], actual[col]
+        if pd.api.types.is_float_dtype(a) and pd.api.types.is_numeric_dtype(b):
+            same = np.isclose(a.to_numpy(), b.to_numpy(dtype=float), rtol=rtol, atol=atol, equal_nan=True)
+        else:
+            same = (a.astype(str) == b.astype(str)).to_numpy()
+        if not same.all():
+            first = int(np.argmin(same))
+            problems.append(f"{col}: {int((~same).sum())} rows differ (first at row {first}: "
+                            f"{a.iloc[first]!r} != {b.iloc[first]!r})")
+    return problems
+
+
+def _outputs(datafolder: Path, timeframe: str, timerange: str, folder: Path) -> None:
+    process(datafolder, timeframe, timerange, all_names(), folder / 'metrics.feather')
+    rank_pairs(datafolder, timeframe, timerange, folder / 'ranks')
+
+
+def _print_report(report: List[Dict[str, Any]]) -> None:
+    click.echo(f"{'stage':<36}{'rows':>12}{'seconds':>10}{'peak MB':>10}")
+    for r in report:
+        peak = f"{r['peak_mb']:10.1f}" if 'peak_mb' in r else f"{'-':>10}"
+        click.echo(f"{r['stage']:<36}{r['rows']:>12}{r['seconds']:>10.3f}{peak}")
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command('generate')
+@click.argument('folder', type=click.Path(file_okay=False, path_type=Path))
+@click.option('--pairs', type=int, default=50, show_default=True)
+@click.option('--bars', type=int, default=5000, show_default=True)
+@click.option('--timeframe', type=str, default='1h', show_default=True)
+@click.option('--listings', type=float, default=0.2, show_default=True, help='Fraction of pairs listed late')
+@click.option('--delistings', type=float, default=0.1, show_default=True, help='Fraction of pairs delisted early')
+@click.option('--gaps', type=float, default=0.01, show_default=True, help='Fraction of candles missing per pair')
+@click.option('--seed', type=int, default=0, show_default=True)
+def generate_cmd(folder, pairs, bars, timeframe, listings, delistings, gaps, seed):
+    """Write a deterministic synthetic dataset to FOLDER."""
+    paths = generate(folder, pairs, bars, timeframe, listings=listings, delistings=delistings, gaps=gaps, seed=seed)
+    click.echo(f"Wrote {len(paths)} files to {folder}")
+
+
+@cli.command('run')
+@click.option('--datafolder', type=click.Path(exists=True, file_okay=False, path_type=Path), default=None,
+              help='Dataset to benchmark (default: generate one with --pairs/--bars/--seed)')
+@click.option('--timeframe', type=str, default='1h', show_default=True)
+@click.option('--pairs', type=int, default=50, show_default=True)
+@click.option('--bars', type=int, default=5000, show_default=True)
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--metrics', type=str, default=None, help='Comma-separated metric names (default: all)')
+@click.option('--store', type=click.Choice(STORES), default='feather', show_default=True)
+@click.option('--repeat', type=click.IntRange(min=1), default=3, show_default=True, help='Best-of-N wall time')
+@click.option('--no-memory', is_flag=True, help='Skip the tracemalloc peak-memory pass')
+@click.option('--compact', is_flag=True, help='Benchmark the --compact dtype mode')
+@click.option('--report', type=click.Path(dir_okay=False, path_type=Path), default=None, help='Write the report as JSON')
+def run_cmd(datafolder, timeframe, pairs, bars, seed, metrics, store, repeat, no_memory, compact, report):
+    """Time and measure peak memory of each metrics and rank stage."""
+    tmp = None
+    if datafolder is None:
+        tmp = Path(tempfile.mkdtemp(prefix='metrex-bench-data-'))
+        generate(tmp, pairs, bars, timeframe, seed=seed)
+        datafolder = tmp
+    try:
+        names = all_names() if not metrics else [m.strip() for m in metrics.split(',')]
+        stages = bench_metrics(datafolder, timeframe, names, repeat, not no_memory, compact)
+        stages += bench_rank(datafolder, timeframe, store, repeat, not no_memory, compact)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+    _print_report(stages)
+    if report is not None:
+        meta = {'datafolder': str(datafolder) if tmp is None else None, 'timeframe': timeframe, 'compact': compact,
+                'files': len(feather_files(datafolder, timeframe)) if tmp is None else pairs,
+                'python': sys.version.split()[0], 'pandas': pd.__version__, 'numpy': np.__version__}
+        report.write_text(json.dumps({'meta': meta, 'stages': stages}, indent=2))
+
+
+@cli.command('check')
+@click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option('--timeframe', type=str, default='1h', show_default=True)
+@click.option('--timerange', type=str, default='20000101-21000101', show_default=True)
+@click.option('--reference', required=True, type=click.Path(file_okay=False, path_type=Path))
+@click.option('--save', is_flag=True, help='Write the reference instead of comparing against it')
+@click.option('--rtol', type=float, default=1e-9, show_default=True)
+def check_cmd(datafolder, timeframe, timerange, reference, save, rtol):
+    """Compare metrics and rank outputs with a saved reference."""
+    if save:
+        shutil.rmtree(reference, ignore_errors=True)
+        reference.mkdir(parents=True)
+        _outputs(datafolder, timeframe, timerange, reference)
+        click.echo(f"Saved reference outputs to {reference}")
+        return
+    with tempfile.TemporaryDirectory(prefix='metrex-check-') as tmp:
+        actual = Path(tmp)
+        _outputs(datafolder, timeframe, timerange, actual)
+        problems = [f"metrics {p}" for p in compare_frames(pd.read_feather(reference / 'metrics.feather'),
+                                                          pd.read_feather(actual / 'metrics.feather'), rtol)]
+        pairs = sorted(f.stem.split('-')[0] for f in feather_files(datafolder, timeframe))
+        for pair in pairs:
+            try:
+                expected = read_pair(reference / 'ranks', pair, timeframe)
+            except FileNotFoundError:
+                continue
+            problems += [f"rank {pair} {p}" for p in
+                         compare_frames(expected, read_pair(actual / 'ranks', pair, timeframe), rtol)]
+    for p in problems:
+        click.echo(p)
+    if problems:
+        raise click.ClickException(f"{len(problems)} differences against {reference}")
+    click.echo('Outputs match the reference')
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,62 @@
+"""
+Deterministic synthetic Freqtrade candle data for benchmarks.
+
+Writes one `{PAIR}-{timeframe}.feather` per pair (date, open, high, low,
+close, volume), the layout `metrex.io.load_feathers` reads. The first pair is
+BTC_USDT; the rest are random walks partly correlated with it. A fraction of
+pairs list late or delist early, every pair can lose a block of candles
+(gap) and a few closes are NaN. The same arguments always produce the same
+files.
+"""
+from pathlib import Path
+from typing import List
+import numpy as np
+import pandas as pd
+from metrex.timeutils import timeframe_to_timedelta
+
+
+def generate(folder: Path, pairs: int = 50, bars: int = 5000, timeframe: str = '1h',
+             start: str = '2022-01-01', listings: float = 0.2, delistings: float = 0.1,
+             gaps: float = 0.01, nan_closes: float = 0.001, seed: int = 0) -> List[Path]:
+    """Write `pairs` candle files of up to `bars` candles each; returns the paths.
+
+    `listings`/`delistings` are the fractions of pairs that start late / end
+    early (anywhere in the first / last half of the history), `gaps` the
+    fraction of each pair's candles removed as one contiguous block, and
+    `nan_closes` the fraction of closes set to NaN.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    dates = pd.date_range(start, periods=bars, freq=timeframe_to_timedelta(timeframe), tz='UTC')
+    btc = np.random.default_rng([seed, 0]).normal(0, 0.01, bars)
+    paths = []
+    for k in range(pairs):
+        rng = np.random.default_rng([seed, k + 1])
+        name = 'BTC_USDT' if k == 0 else f'P{k:04d}_USDT'
+        lo, hi = 0, bars
+        if k and rng.random() < listings:
+            lo = int(rng.integers(0, bars // 2))
+        if k and rng.random() < delistings:
+            hi = int(rng.integers(bars // 2, bars))
+        rows = np.arange(lo, hi)
+        gap = int(len(rows) * gaps)
+        if k and gap:
+            at = int(rng.integers(0, len(rows) - gap))
+            rows = np.delete(rows, slice(at, at + gap))
+        beta = 0.0 if k == 0 else rng.uniform(0.2, 1.5)
+        ret = btc if k == 0 else beta * btc + rng.normal(0, 0.01, bars)
+        close = (10 ** rng.uniform(-2, 4)) * np.exp(np.cumsum(ret))[rows]
+        spread = np.abs(rng.normal(0, 0.004, len(rows)))
+        df = pd.DataFrame({
+            'date': dates[rows],
+            'open': close * (1 + rng.normal(0, 0.002, len(rows))),
+            'high': close * (1 + spread),
+            'low': close * (1 - spread),
+            'close': close,
+            'volume': rng.lognormal(8, 1.5, len(rows)),
+        })
+        df.loc[rng.random(len(rows)) < nan_closes, 'close'] = np.nan
+        path = folder / f"{name}-{timeframe}.feather"
+        df.to_feather(path)
+        paths.append(path)
+    return paths
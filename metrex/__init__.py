@@ -4,4 +4,14 @@ Metrex: External market metrics for trading strategies.
 Provides breadth, volatility, and trend context from your local Freqtrade data.
 """
 
-__version__ = "0.1.0"
\ No newline at end of file
+__version__ = "0.1.0"
+
+__all__ = ['read']
+
+
+def __getattr__(name):
+    # `metrex.read` imports pandas/pyarrow only when first used
+    if name == 'read':
+        from .reader import read
+        return read
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
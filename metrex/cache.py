@@ -0,0 +1,128 @@
+"""
+On-disk cache of per-metric results.
+
+Each metric's output is stored under a content-addressed key derived from the
+metric name and version, its parameters, the run context (timeframe,
+timerange, incremental state) and the fingerprints (mtime, size, hash) of the
+input files the metric reads. Entries are evicted least-recently-used once
+the cache exceeds its size budget.
+
+An entry covers one exact (start, end): overlapping timeranges do not share
+entries, and a change to any file a metric reads (e.g. new candles for one
+pair) invalidates that metric's entries for every timerange.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+import pandas as pd
+from . import __version__
+
+DEFAULT_MAX_BYTES = 1 << 30
+_HASH_CHUNK = 1 << 20
+
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MetricCache:
+    """LRU, size-bounded store of metric frames keyed by content hashes."""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._index_path = self.root / 'fingerprints.json'
+        self._fp_index: Dict[str, list] = {}
+        if self._index_path.exists():
+            try:
+                self._fp_index = json.loads(self._index_path.read_text())
+            except ValueError:
+                self._fp_index = {}
+
+    # Input fingerprints
+
+    def fingerprint(self, path: Path) -> Tuple[int, int, str]:
+        """(mtime_ns, size, hash) of a file; the hash is reused while mtime/size hold."""
+        st = os.stat(path)
+        known = self._fp_index.get(str(path))
+        if known and known[0] == st.st_mtime_ns and known[1] == st.st_size:
+            return tuple(known)  # type: ignore
+        fp = [st.st_mtime_ns, st.st_size, _file_hash(path)]
+        self._fp_index[str(path)] = fp
+        return tuple(fp)  # type: ignore
+
+    def fingerprints(self, files: Iterable[Path]) -> Dict[str, Tuple[int, int, str]]:
+        fps = {Path(f).name: self.fingerprint(Path(f)) for f in sorted(files)}
+        self._save_index()
+        return fps
+
+    def _save_index(self) -> None:
+        tmp = self._index_path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self._fp_index))
+        os.replace(tmp, self._index_path)
+
+    # Entries
+
+    def key(self, metric, ctx: Dict[str, Any], inputs: Dict[str, Any]) -> str:
+        """Content address of one metric's result for a run."""
+        params = {k: v for k, v in vars(metric).items() if not k.startswith('_')}
+        run_ctx = {k: v for k, v in ctx.items() if k != 'state'}
+        payload = {
+            'metrex': __version__,
+            'metric': metric.name,
+            'version': getattr(metric, 'version', 1),
+            'params': params,
+            'ctx': run_ctx,
+            'state': ctx.get('state', {}).get(metric.name),
+            'inputs': inputs,
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.root / f"{key}.feather", self.root / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Tuple[pd.DataFrame, Optional[Dict[str, Any]]]]:
+        """Cached (frame, metric state) or None; a hit refreshes the entry's LRU time."""
+        data, meta = self._paths(key)
+        if not (data.exists() and meta.exists()):
+            return None
+        try:
+            frame = pd.read_feather(data)
+            state = json.loads(meta.read_text()).get('state')
+        except Exception:
+            return None
+        os.utime(data)
+        os.utime(meta)
+        return frame, state
+
+    def put(self, key: str, frame: pd.DataFrame, state: Optional[Dict[str, Any]] = None) -> None:
+        data, meta = self._paths(key)
+        tmp = data.with_suffix('.tmp')
+        frame.reset_index(drop=True).to_feather(tmp, compression='lz4')
+        os.replace(tmp, data)
+        meta.write_text(json.dumps({'state': state}, default=str))
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop least-recently-used entries until the cache fits `max_bytes`."""
+        entries = []
+        total = 0
+        for data in self.root.glob('*.feather'):
+            meta = data.with_suffix('.json')
+            size = data.stat().st_size + (meta.stat().st_size if meta.exists() else 0)
+            entries.append((data.stat().st_mtime_ns, size, data, meta))
+            total += size
+        for _, size, data, meta in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            data.unlink(missing_ok=True)
+            meta.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,39 @@
+"""
+Time-chunk planning for streaming runs over datasets larger than memory.
+"""
+from typing import List, Optional
+import pandas as pd
+from .timeutils import timeframe_to_timedelta
+
+# Rough peak bytes per (bar, pair) cell while a chunk is processed: the long
+# frame, the panel arrays, derived arrays and the per-pair output frame.
+CELL_BYTES = 256
+
+
+def chunk_span(n_pairs: int, timeframe: str, lookback: pd.Timedelta,
+               max_memory: Optional[int] = None, chunk: Optional[str] = None) -> pd.Timedelta:
+    """Length of time covered by each chunk.
+
+    `chunk` (e.g. '30D') wins if given; otherwise the span is sized so that
+    lookback plus chunk stays within `max_memory` bytes for `n_pairs` pairs.
+    """
+    if chunk is not None:
+        return pd.Timedelta(chunk)
+    if max_memory is None:
+        raise ValueError("Specify a chunk length or a memory budget")
+    bar = timeframe_to_timedelta(timeframe)
+    bars = max_memory // (max(n_pairs, 1) * CELL_BYTES) - lookback // bar
+    if bars < 1:
+        raise ValueError(f"Memory budget of {max_memory} bytes is too small for {n_pairs} pairs at {timeframe}")
+    return bars * bar
+
+
+def chunk_ends(start: pd.Timestamp, end: pd.Timestamp, span: pd.Timedelta) -> List[pd.Timestamp]:
+    """Inclusive end of each chunk covering [start, end]."""
+    ends = []
+    t = start + span
+    while t < end:
+        ends.append(t)
+        t += span
+    ends.append(end)
+    return ends
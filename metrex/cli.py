@@ -1,35 +1,104 @@
 """
 CLI interface for metrex.
+
+Only click and the option values in `metrex.options` are imported up front;
+each command imports what it runs (and with it numpy/pandas), so `--help`
+and `metrex list` start without them.
 """
 
 
 import click
+from contextlib import nullcontext
+from datetime import datetime, timezone
 from pathlib import Path
-from .processor import process, rank_pairs
-from .metrics import all_names
+from .profiling import profile
+from .metrics import REGISTRY, all_names
+from .options import COMPRESSIONS, DEFAULT_BATCH_ROWS, DEFAULT_COMPRESSION_LEVEL, DEFAULT_PORT, DEFAULT_WORKERS, STORES, VOL_REGIME_MODES
 
 @click.group()
 def cli():
     pass
 
+def _profiling(path, stages):
+    """`profile()` when --profile is given, otherwise a no-op context."""
+    if path is None:
+        return nullcontext()
+    return profile(path, cprofile=stages)
+
+def _timeframes(timeframe, timeframes, base_timeframe):
+    """Validated --timeframes list (empty for a single --timeframe run)."""
+    if timeframes is None:
+        if timeframe is None:
+            raise click.UsageError('Specify --timeframe or --timeframes')
+        if base_timeframe is not None:
+            raise click.UsageError('--base-timeframe is only used with --timeframes')
+        return []
+    if timeframe is not None:
+        raise click.UsageError('Use either --timeframe or --timeframes')
+    if base_timeframe is None:
+        raise click.UsageError('--timeframes needs --base-timeframe')
+    return [t.strip() for t in timeframes.split(',') if t.strip()]
+
 @cli.command()
 @click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
-@click.option('--timeframe', required=True, type=str)
+@click.option('--timeframe', required=False, type=str, default=None)
+@click.option('--timeframes', type=str, default=None,
+              help='Comma-separated timeframes derived from --base-timeframe candles in one load')
+@click.option('--base-timeframe', type=str, default=None, help='Timeframe of the candle files used with --timeframes')
 @click.option('--timerange', required=True, type=str)
 @click.option('--metrics', required=False, type=str, help='Comma-separated metric names')
 @click.option('--all-metrics', is_flag=True, help='Run all metrics in registry')
 @click.option('--output', required=True, type=click.Path(path_type=Path))
-def metrics(datafolder, timeframe, timerange, metrics, all_metrics, output):
+@click.option('--cache-dir', type=click.Path(file_okay=False, path_type=Path), default=None,
+              help='Reuse per-metric results cached here when inputs are unchanged')
+@click.option('--cache-size', type=int, default=1024, show_default=True, help='Cache size budget in MB (LRU eviction)')
+@click.option('--jobs', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Worker processes for computing metrics concurrently')
+@click.option('--max-memory', type=int, default=None, help='Stream over time chunks sized to this budget (MB)')
+@click.option('--chunk', type=str, default=None, help="Stream over time chunks of this length (e.g. '30D')")
+@click.option('--vol-regime', type=click.Choice(VOL_REGIME_MODES), default='full', show_default=True,
+              help='market_vol_regime thresholds: whole sample, or expanding (only bars up to each bar)')
+@click.option('--float32', is_flag=True, help='Store float metric columns as float32 (smaller, ~7 significant digits)')
+@click.option('--batch-rows', type=click.IntRange(min=1), default=None,
+              help=f'Rows per indexed record batch of feather outputs; metrex.read decodes only the batches '
+                   f'a query needs (default: {DEFAULT_BATCH_ROWS})')
+@click.option('--compact', is_flag=True,
+              help='float32 candles and values, small nullable integer ranks (smaller and faster, ~7 significant digits)')
+@click.option('--profile', 'profile_path', type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help='Write per-stage wall/CPU time, rows and peak RSS as JSON to this file')
+@click.option('--profile-stage', multiple=True,
+              help="Also run stages matching this pattern under cProfile (e.g. 'run_metrics/metric:*')")
+def metrics(datafolder, timeframe, timeframes, base_timeframe, timerange, metrics, all_metrics, output, cache_dir,
+            cache_size, jobs, max_memory, chunk, vol_regime, float32, batch_rows, compact, profile_path, profile_stage):
     """
     Run selected market metrics and save results.
+
+    With --timeframes, metrics are computed for each timeframe from one load
+    of --base-timeframe candles and saved per timeframe ({timeframe} in
+    --output is filled in, otherwise -{timeframe} is added to the file name).
     """
+    from .processor import process, process_timeframes
+    timeframes = _timeframes(timeframe, timeframes, base_timeframe)
+    if timeframes and (cache_dir is not None or max_memory is not None or chunk is not None):
+        raise click.UsageError('--timeframes cannot be combined with --cache-dir, --max-memory or --chunk')
     if all_metrics:
         metric_names = all_names()
     else:
         if not metrics:
             raise click.UsageError('Specify --metrics or --all-metrics')
         metric_names = [m.strip() for m in metrics.split(',')]
-    process(datafolder, timeframe, timerange, metric_names, output)
+    # Only set when changed, so cache keys of default runs stay the same
+    ctx = {} if vol_regime == 'full' else {'vol_regime_mode': vol_regime}
+    with _profiling(profile_path, profile_stage):
+        if timeframes:
+            outputs = process_timeframes(datafolder, base_timeframe, timeframes, timerange, metric_names, output,
+                                         ctx=ctx, jobs=jobs, float32=float32, compact=compact, batch_rows=batch_rows)
+            output = ', '.join(str(p) for p in outputs.values())
+        else:
+            process(datafolder, timeframe, timerange, metric_names, output, ctx=ctx,
+                    cache_dir=cache_dir, cache_max_bytes=cache_size * 1024 * 1024, jobs=jobs,
+                    max_memory=None if max_memory is None else max_memory * 1024 * 1024, chunk=chunk,
+                    float32=float32, compact=compact, batch_rows=batch_rows)
     click.echo(f"✅ Metrics computed: {', '.join(metric_names)}\nSaved to {output}")
 
 if __name__ == '__main__':
@@ -37,10 +106,40 @@ if __name__ == '__main__':
 
 @cli.command()
 @click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
-@click.option('--timeframe', required=True, type=str)
+@click.option('--timeframe', required=False, type=str, default=None)
+@click.option('--timeframes', type=str, default=None,
+              help='Comma-separated timeframes derived from --base-timeframe candles in one load')
+@click.option('--base-timeframe', type=str, default=None, help='Timeframe of the candle files used with --timeframes')
 @click.option('--timerange', required=True, type=str)
 @click.option('--outputfolder', required=True, type=click.Path(path_type=Path))
-def rank(datafolder, timeframe, timerange, outputfolder):
+@click.option('--store', type=click.Choice(STORES), default='feather', show_default=True,
+              help="Output layout: one feather per pair, or append-only partitioned segments")
+@click.option('--max-memory', type=int, default=None, help='Stream over time chunks sized to this budget (MB)')
+@click.option('--chunk', type=str, default=None, help="Stream over time chunks of this length (e.g. '30D')")
+@click.option('--compact', is_flag=True,
+              help='float32 candles and values, small nullable integer ranks (smaller and faster, ~7 significant digits)')
+@click.option('--write-workers', type=click.IntRange(min=1), default=DEFAULT_WORKERS, show_default=True,
+              help='Threads reading, merging and writing pair files')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default=None,
+              help='Codec of the rank files (default: lz4)')
+@click.option('--compression-level', type=int, default=None,
+              help=f'Codec level (default: {DEFAULT_COMPRESSION_LEVEL})')
+@click.option('--batch-rows', type=click.IntRange(min=1), default=None,
+              help=f'Rows per indexed record batch of feather outputs; metrex.read decodes only the batches '
+                   f'a query needs (default: {DEFAULT_BATCH_ROWS})')
+@click.option('--shards', type=click.IntRange(min=1), default=None,
+              help='Split the pairs into this many shards ranked by separate processes')
+@click.option('--jobs', type=click.IntRange(min=1), default=None,
+              help='Processes working on shards at once (default: one per shard)')
+@click.option('--workdir', type=click.Path(file_okay=False, path_type=Path), default=None,
+              help='Keep the intermediate shard files here (default: a temporary folder)')
+@click.option('--profile', 'profile_path', type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help='Write per-stage wall/CPU time, rows and peak RSS as JSON to this file')
+@click.option('--profile-stage', multiple=True,
+              help="Also run stages matching this pattern under cProfile (e.g. 'run_metrics/metric:*')")
+def rank(datafolder, timeframe, timeframes, base_timeframe, timerange, outputfolder, store, max_memory, chunk,
+         compact, write_workers, compression, compression_level, batch_rows, shards, jobs, workdir, profile_path,
+         profile_stage):
         """Generate/append per-pair ranked metrics (no duplicate dates).
 
         Behavior:
@@ -48,15 +147,239 @@ def rank(datafolder, timeframe, timerange, outputfolder):
         - Timerange supports special form 'latest-YYYYMMDD' where the start date is
             taken as the last date already present in each pair's output (or the first
             available input date if the output file does not yet exist).
+        - With --store partitioned, new rows are written as date-range segments under
+            {pair}-{timeframe}/ and tracked in manifest-{timeframe}.json; use
+            `metrex compact` to merge segments.
+        - With --timeframes, ranks for each timeframe are computed from one load of
+            --base-timeframe candles and written side by side in outputfolder.
+        - With --shards, each process loads and writes only its own pairs; the
+            cross-sectional ranks are computed in one gather step over all shards.
         """
-        rank_pairs(datafolder, timeframe, timerange, outputfolder)
+        from .processor import rank_pairs, rank_timeframes
+        from .sharding import rank_sharded
+        timeframes = _timeframes(timeframe, timeframes, base_timeframe)
+        if timeframes and (max_memory is not None or chunk is not None):
+            raise click.UsageError('--timeframes cannot be combined with --max-memory or --chunk')
+        if shards is None and (jobs is not None or workdir is not None):
+            raise click.UsageError('--jobs and --workdir are only used with --shards')
+        if shards is not None and (timeframes or max_memory is not None or chunk is not None):
+            raise click.UsageError('--shards cannot be combined with --timeframes, --max-memory or --chunk')
+        if compression_level is not None and compression is None:
+            compression = 'lz4'
+        writing = dict(write_workers=write_workers, compression=compression, compression_level=compression_level,
+                       batch_rows=batch_rows)
+        with _profiling(profile_path, profile_stage):
+            if shards is not None:
+                rank_sharded(datafolder, timeframe, timerange, outputfolder, shards, store=store, jobs=jobs,
+                             compact=compact, workdir=workdir, **writing)
+            elif timeframes:
+                rank_timeframes(datafolder, base_timeframe, timeframes, timerange, outputfolder, store=store,
+                                compact=compact, **writing)
+            else:
+                rank_pairs(datafolder, timeframe, timerange, outputfolder, store=store,
+                           max_memory=None if max_memory is None else max_memory * 1024 * 1024, chunk=chunk,
+                           compact=compact, **writing)
         click.echo(f"✅ Rank files written to {outputfolder}")
 
+@cli.group()
+def shard():
+    """Run the steps of `rank --shards` one at a time (e.g. on several hosts).
+
+    \b
+    Every step shares --workdir:
+      metrex shard features --index I ...   (for each I in 0..shards-1)
+      metrex shard gather --workdir W       (after every shard's features)
+      metrex shard write --index I ...      (for each I, after the gather)
+    """
+
+@shard.command(name='features')
+@click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
+@click.option('--timeframe', required=True, type=str)
+@click.option('--timerange', required=True, type=str)
+@click.option('--outputfolder', required=True, type=click.Path(path_type=Path))
+@click.option('--store', type=click.Choice(STORES), default='feather', show_default=True)
+@click.option('--workdir', required=True, type=click.Path(file_okay=False, path_type=Path))
+@click.option('--shards', required=True, type=click.IntRange(min=1))
+@click.option('--index', required=True, type=click.IntRange(min=0))
+@click.option('--compact', is_flag=True, help='float32 candles and values, small nullable integer ranks')
+def shard_features(datafolder, timeframe, timerange, outputfolder, store, workdir, shards, index, compact):
+    """Per-pair rank columns of one shard."""
+    from .sharding import compute_shard
+    if index >= shards:
+        raise click.UsageError(f"--index must be below --shards ({shards})")
+    rows = compute_shard(datafolder, timeframe, timerange, outputfolder, workdir, shards, index, store, compact)
+    click.echo(f"✅ Shard {index}: {rows} rows in {workdir}")
+
+@shard.command(name='gather')
+@click.option('--workdir', required=True, type=click.Path(exists=True, file_okay=False, path_type=Path))
+def shard_gather(workdir):
+    """Cross-sectional ranks over every shard's features."""
+    from .sharding import gather_shards
+    try:
+        rows = gather_shards(workdir)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(f"✅ Ranked {rows} rows in {workdir}")
+
+@shard.command(name='write')
+@click.option('--workdir', required=True, type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option('--index', required=True, type=click.IntRange(min=0))
+@click.option('--write-workers', type=click.IntRange(min=1), default=DEFAULT_WORKERS, show_default=True,
+              help='Threads reading, merging and writing pair files')
+@click.option('--compression', type=click.Choice(COMPRESSIONS), default=None,
+              help='Codec of the rank files (default: lz4)')
+@click.option('--compression-level', type=int, default=None,
+              help=f'Codec level (default: {DEFAULT_COMPRESSION_LEVEL})')
+@click.option('--batch-rows', type=click.IntRange(min=1), default=None,
+              help=f'Rows per indexed record batch of feather outputs; metrex.read decodes only the batches '
+                   f'a query needs (default: {DEFAULT_BATCH_ROWS})')
+def shard_write(workdir, index, write_workers, compression, compression_level, batch_rows):
+    """Append one shard's pairs with their ranks to the output folder."""
+    from .sharding import write_shard
+    if compression_level is not None and compression is None:
+        compression = 'lz4'
+    try:
+        rows = write_shard(workdir, index, write_workers, compression, compression_level, batch_rows)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    click.echo(f"✅ Shard {index}: {rows} rows written")
+
+@cli.command()
+@click.option('--outputfolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
+@click.option('--timeframe', required=True, type=str)
+def compact(outputfolder, timeframe):
+    """Merge partitioned rank segments into one segment per pair and month."""
+    from .store import PartitionedStore
+    store = PartitionedStore(outputfolder, timeframe)
+    if not store.manifest:
+        raise click.UsageError(f"No manifest-{timeframe}.json in {outputfolder}")
+    store.compact()
+    click.echo(f"✅ Compacted {len(store.manifest)} pairs in {outputfolder}")
+
+@cli.command()
+@click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
+@click.option('--timeframe', required=True, type=str)
+@click.option('--metrics', required=False, type=str, help='Comma-separated metric names')
+@click.option('--all-metrics', is_flag=True, help='Run all metrics in registry')
+@click.option('--output', type=click.Path(path_type=Path), default=None, help='Metrics output file to keep updated')
+@click.option('--outputfolder', type=click.Path(path_type=Path), default=None, help='Rank output folder to keep updated')
+@click.option('--store', type=click.Choice(STORES), default='feather', show_default=True)
+@click.option('--interval', type=float, default=5.0, show_default=True, help='Seconds between polls')
+@click.option('--once', is_flag=True, help='Catch up once and exit')
+@click.option('--compact', is_flag=True,
+              help='float32 candles and values, small nullable integer ranks (smaller and faster, ~7 significant digits)')
+@click.option('--vol-regime', type=click.Choice(VOL_REGIME_MODES), default='full', show_default=True,
+              help='market_vol_regime thresholds: whole sample, or expanding (only bars up to each bar)')
+@click.option('--write-workers', type=click.IntRange(min=1), default=DEFAULT_WORKERS, show_default=True,
+              help='Threads reading, merging and writing pair files')
+def watch(datafolder, timeframe, metrics, all_metrics, output, outputfolder, store, interval, once, compact,
+          vol_regime, write_workers):
+    """Keep the market in memory and update outputs as candle files change.
+
+    Loads the needed history once, then polls DATAFOLDER and reads only newly
+    appended candles; metrics (--output) and ranks (--outputfolder) are updated
+    like a `latest-` run. New rank rows are appended and the metrics file is
+    rewritten from memory.
+    """
+    from .watch import Watcher
+    metric_names = []
+    if output is not None:
+        if all_metrics:
+            metric_names = all_names()
+        elif metrics:
+            metric_names = [m.strip() for m in metrics.split(',')]
+        else:
+            raise click.UsageError('Specify --metrics or --all-metrics with --output')
+    elif outputfolder is None:
+        raise click.UsageError('Specify --output and/or --outputfolder')
+    watcher = Watcher(datafolder, timeframe, metric_names, output=output, outputfolder=outputfolder, store=store,
+                      ctx={} if vol_regime == 'full' else {'vol_regime_mode': vol_regime}, compact=compact,
+                      write_workers=write_workers)
+
+    def report(w, n):
+        click.echo(f"{datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} +{n} candles")
+    try:
+        watcher.run(interval, iterations=1 if once else None, on_update=report)
+    except KeyboardInterrupt:
+        pass
+
+@cli.command()
+@click.option('--timeframe', required=True, type=str)
+@click.option('--output', type=click.Path(path_type=Path), default=None, help='Metrics output file to serve')
+@click.option('--outputfolder', type=click.Path(path_type=Path), default=None, help='Rank output folder to serve')
+@click.option('--datafolder', type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path), default=None,
+              help='Also keep the outputs updated from this datafolder (as `watch` does)')
+@click.option('--metrics', required=False, type=str, help='Comma-separated metric names (with --datafolder)')
+@click.option('--all-metrics', is_flag=True, help='Run all metrics in registry (with --datafolder)')
+@click.option('--store', type=click.Choice(STORES), default='feather', show_default=True)
+@click.option('--host', type=str, default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=DEFAULT_PORT, show_default=True)
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False, path_type=Path), default=None,
+              help='Listen on this Unix socket instead of TCP')
+@click.option('--interval', type=float, default=5.0, show_default=True, help='Seconds between refreshes')
+@click.option('--compact', is_flag=True,
+              help='With --datafolder: float32 candles and values, small nullable integer ranks (smaller and faster, ~7 significant digits)')
+@click.option('--vol-regime', type=click.Choice(VOL_REGIME_MODES), default='full', show_default=True,
+              help='With --datafolder: market_vol_regime thresholds: whole sample, or expanding (only bars up to each bar)')
+def serve(timeframe, output, outputfolder, datafolder, metrics, all_metrics, store, host, port, socket_path, interval,
+          compact, vol_regime):
+    """Answer latest/as-of/top-K queries from in-memory indexes.
+
+    Endpoints: /metrics/latest, /metrics/asof?ts=, /ranks/latest?pair=,
+    /ranks/asof?pair=&ts=, /ranks/top?by=&k=&ts=, /health.
+    Use metrex.serve.MetrexClient from Python.
+    """
+    from .serve import serve_outputs
+    from .watch import Watcher
+    if output is None and outputfolder is None:
+        raise click.UsageError('Specify --output and/or --outputfolder')
+    watcher = None
+    if datafolder is not None:
+        metric_names = []
+        if output is not None:
+            if all_metrics:
+                metric_names = all_names()
+            elif metrics:
+                metric_names = [m.strip() for m in metrics.split(',')]
+            else:
+                raise click.UsageError('Specify --metrics or --all-metrics with --datafolder and --output')
+        watcher = Watcher(datafolder, timeframe, metric_names, output=output, outputfolder=outputfolder, store=store,
+                          ctx={} if vol_regime == 'full' else {'vol_regime_mode': vol_regime}, compact=compact)
+    where = socket_path if socket_path is not None else f"http://{host}:{port}"
+    click.echo(f"Serving metrex queries on {where}")
+    try:
+        serve_outputs(timeframe, output, outputfolder, watcher, interval,
+                      host=host, port=port, socket_path=socket_path)
+    except KeyboardInterrupt:
+        pass
+
+@cli.command()
+@click.option('--datafolder', required=True, type=click.Path(exists=True, file_okay=False, dir_okay=True, path_type=Path))
+@click.option('--timeframe', required=True, type=str)
+@click.option('--min-bars', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Only report gaps of at least this many missing bars')
+def gaps(datafolder, timeframe, min_bars):
+    """List missing candles inside each pair's history."""
+    from .io import load_feathers
+    from .timeindex import TimeIndex
+    found = TimeIndex.from_frame(load_feathers(datafolder, timeframe, columns=[])).gaps(timeframe)
+    found = found[found['missing_bars'] >= min_bars]
+    if found.empty:
+        click.echo(f"✅ No gaps in {timeframe} candles")
+        return
+    click.echo(found.to_string(index=False))
+    click.echo(f"{len(found)} gaps, {int(found['missing_bars'].sum())} missing bars "
+               f"in {found['pair'].nunique()} pairs")
+
 @cli.command(name='list')
 def list_metrics():
-    """List available metric names in the registry."""
-    names = all_names()
-    if not names:
+    """List available metric names in the registry (without importing them)."""
+    specs = REGISTRY.specs()
+    if not specs:
         click.echo("No metrics registered.")
-    else:
-        click.echo("Available metrics:\n- " + "\n- ".join(names))
+        return
+    width = max(len(s.name) for s in specs)
+    click.echo("Available metrics:")
+    for s in specs:
+        about = f"(plugin: {s.target})" if s.plugin else s.description
+        click.echo(f"- {s.name:<{width}}  {about}".rstrip())
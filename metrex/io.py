@@ -1,35 +1,288 @@
 """
 IO utilities for metrex: load/save feather/parquet/csv
 """
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Tuple, Union
+import json
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
 from pathlib import Path
+from .options import DEFAULT_BATCH_ROWS, DEFAULT_COMPRESSION_LEVEL
+from .timeutils import as_utc, epoch_ns, to_utc
 
-def load_feathers(datafolder: Path, timeframe: str) -> pd.DataFrame:
-    pattern = f"*-{timeframe}.feather"
-    files = list(Path(datafolder).glob(pattern))
-    dfs = []
-    for f in files:
-        pair = f.stem.split('-')[0]
-        df = pd.read_feather(f)
-        if 'date' not in df.columns:
-            if 'timestamp' in df.columns:
-                df['date'] = pd.to_datetime(df['timestamp'])
-            else:
-                raise ValueError(f"No date/timestamp column in {f}")
-        df['date'] = pd.to_datetime(df['date'])
-        df['pair'] = pair
-        dfs.append(df[['date','pair','open','high','low','close','volume']])
-    if not dfs:
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+# Schema metadata key of the per-batch date index (see `metrex.reader`)
+INDEX_KEY = b'metrex.index'
+
+# Pair names, or a predicate on the pair name
+Pairs = Union[Collection[str], Callable[[str], bool]]
+
+def pair_filter(pairs: Optional[Pairs]) -> Optional[Callable[[str], bool]]:
+    """Predicate selecting `pairs` (None selects every pair)."""
+    if pairs is None or callable(pairs):
+        return pairs
+    return frozenset(pairs).__contains__
+
+def _schema_names(path: Path) -> List[str]:
+    """Column names from the file footer, without reading any data."""
+    try:
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).schema.names
+    except pa.ArrowInvalid:
+        # Feather v1 files are not Arrow IPC files
+        return feather.read_table(path).schema.names
+
+def _bound(ts: Optional[pd.Timestamp], unit: str, upper: bool) -> Optional[int]:
+    """Timestamp bound as an integer in `unit` (naive bounds are taken as UTC)."""
+    if ts is None:
+        return None
+    ns = pd.Timestamp(ts).value
+    per = {'s': 10**9, 'ms': 10**6, 'us': 10**3, 'ns': 1}[unit]
+    return ns // per if upper else -(-ns // per)
+
+def _read_one(path: Path, pair_index: int, dictionary: pa.Array, columns: Sequence[str],
+              start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> pa.Table:
+    names = _schema_names(path)
+    if 'date' in names:
+        date_col = 'date'
+    elif 'timestamp' in names:
+        date_col = 'timestamp'
+    else:
+        raise ValueError(f"No date/timestamp column in {path}")
+    table = feather.read_table(path, columns=[date_col, *columns], memory_map=True)
+    table = table.rename_columns(['date', *columns])
+    dates = table.column('date')
+    if pa.types.is_timestamp(dates.type) and (start is not None or end is not None):
+        # Push the timerange down into the read: filter in Arrow before any pandas conversion
+        raw = dates.cast(pa.int64())
+        mask = None
+        lo, hi = _bound(start, dates.type.unit, False), _bound(end, dates.type.unit, True)
+        if lo is not None:
+            mask = pc.greater_equal(raw, lo)
+        if hi is not None:
+            m = pc.less_equal(raw, hi)
+            mask = m if mask is None else pc.and_(mask, m)
+        table = table.filter(mask)
+    pair = pa.DictionaryArray.from_arrays(np.full(table.num_rows, pair_index, dtype=np.int32), dictionary)
+    return table.add_column(1, 'pair', pair)
+
+def load_feathers(datafolder: Path, timeframe: str, columns: Optional[Sequence[str]] = None,
+                  start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+                  max_workers: Optional[int] = None, files: Optional[Sequence[Path]] = None,
+                  compact: bool = False, pairs: Optional[Pairs] = None) -> pd.DataFrame:
+    """Load every `*-{timeframe}.feather` file (or just `files`) into one long frame.
+
+    Files are memory-mapped and read concurrently; only `columns` (default:
+    OHLCV) are decoded and rows outside [start, end] are dropped in Arrow
+    (after the date conversion for string or integer date columns).
+    The combined table is built in Arrow, with `pair` dictionary-encoded
+    (a pandas categorical), and converted to pandas once. Dates come out in
+    the canonical `datetime64[ns, UTC]` (see `timeutils.to_utc`). With
+    `compact`, OHLCV are cast to float32 in Arrow (about 7 significant digits).
+    `pairs` (names or a predicate) restricts which files are opened at all.
+    """
+    files = feather_files(datafolder, timeframe, pairs) if files is None else sorted(Path(f) for f in files)
+    if not files:
+        scope = '' if pairs is None else ' for the requested pairs'
+        raise ValueError(f"No feather files found for {timeframe} in {datafolder}{scope}")
+    columns = list(OHLCV_COLUMNS if columns is None else columns)
+    pairs = [f.stem.split('-')[0] for f in files]
+    dictionary = pa.array(sorted(set(pairs)))
+    codes = {p: i for i, p in enumerate(dictionary.to_pylist())}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        tables = list(pool.map(lambda fp: _read_one(fp[0], codes[fp[1]], dictionary, columns, start, end),
+                               zip(files, pairs)))
+    schema = tables[0].schema.remove_metadata()
+    # String or integer dates cannot be compared in Arrow; they are filtered once converted
+    pushed = all(pa.types.is_timestamp(t.schema.field('date').type) for t in tables)
+    value_type = pa.float32() if compact else pa.float64()
+    for col in columns:
+        schema = schema.set(schema.get_field_index(col), pa.field(col, value_type))
+    if pa.types.is_timestamp(schema.field('date').type):
+        # Naive timestamps keep their values, i.e. are taken as UTC
+        schema = schema.set(schema.get_field_index('date'), pa.field('date', pa.timestamp('ns', 'UTC')))
+    table = pa.concat_tables([t.select(schema.names).cast(schema) for t in tables])
+    df = table.to_pandas()
+    df['date'] = to_utc(df['date'])
+    if not pushed and (start is not None or end is not None):
+        ns = df['date'].array.asi8
+        keep = np.ones(len(ns), dtype=bool)
+        if start is not None:
+            keep &= ns >= as_utc(start).value
+        if end is not None:
+            keep &= ns <= as_utc(end).value
+        if not keep.all():
+            df = df.loc[keep].reset_index(drop=True)
+    return df
+
+def feather_files(datafolder: Path, timeframe: str, pairs: Optional[Pairs] = None) -> List[Path]:
+    files = sorted(Path(datafolder).glob(f"*-{timeframe}.feather"))
+    keep = pair_filter(pairs)
+    return files if keep is None else [f for f in files if keep(f.stem.split('-')[0])]
+
+def date_extent(datafolder: Path, timeframe: str, pairs: Optional[Pairs] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """First and last candle date over all files (of `pairs`), reading only the
+    first and last record batch of each file (candle files are date-sorted)."""
+    lo, hi = [], []
+    for f in feather_files(datafolder, timeframe, pairs):
+        date_col = 'date' if 'date' in _schema_names(f) else 'timestamp'
+        try:
+            with pa.memory_map(str(f)) as source:
+                reader = pa.ipc.open_file(source)
+                batches = [reader.get_batch(i) for i in {0, reader.num_record_batches - 1}]
+                dates = pa.concat_arrays([b.column(date_col) for b in batches if b.num_rows])
+        except pa.ArrowInvalid:
+            dates = feather.read_table(f, columns=[date_col]).column(date_col).combine_chunks()
+        if len(dates):
+            lo.append(pd.Timestamp(pc.min(dates).as_py()))
+            hi.append(pd.Timestamp(pc.max(dates).as_py()))
+    if not lo:
         raise ValueError(f"No feather files found for {timeframe} in {datafolder}")
-    return pd.concat(dfs, ignore_index=True)
+    return min(lo), max(hi)
+
+def tail_dates(datafolder: Path, timeframe: str, before: pd.Timestamp, bars: int,
+               pairs: Optional[Pairs] = None,
+               to_bars: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """Epoch-ns dates of the last `bars` candles at or before `before` of each
+    pair (of `pairs`), reading only the date column of each file.
+
+    `to_bars` maps candle dates to the dates of the bars they form (e.g.
+    `resample.bucket_starts`), so the tail counts resampled bars instead.
+    """
+    hi = as_utc(before).value
+
+    def tail(path: Path) -> np.ndarray:
+        date_col = 'date' if 'date' in _schema_names(path) else 'timestamp'
+        table = feather.read_table(path, columns=[date_col], memory_map=True)
+        ns = np.sort(epoch_ns(table.column(date_col).to_pandas()))
+        if to_bars is not None:
+            ns = np.unique(to_bars(ns))
+        ns = ns[:np.searchsorted(ns, hi, side='right')]
+        return ns[max(len(ns) - bars, 0):]
+
+    files = feather_files(datafolder, timeframe, pairs)
+    with ThreadPoolExecutor() as pool:
+        tails = list(pool.map(tail, files))
+    return {f.stem.split('-')[0]: t for f, t in zip(files, tails)}
 
-def save(df: pd.DataFrame, output_path: Path):
+def date_index(ns: np.ndarray, batch_rows: int) -> Dict[str, List[int]]:
+    """Row count and min/max of epoch-ns dates `ns` for each `batch_rows` slice."""
+    starts = np.arange(0, len(ns), batch_rows)
+    if not len(starts):
+        return {'column': 'date', 'rows': [], 'min': [], 'max': []}
+    return {'column': 'date',
+            'rows': np.diff(np.r_[starts, len(ns)]).tolist(),
+            'min': np.minimum.reduceat(ns, starts).tolist(),
+            'max': np.maximum.reduceat(ns, starts).tolist()}
+
+def _write_feather(df: pd.DataFrame, path: Path, compression: str, compression_level: Optional[int],
+                   batch_rows: int) -> None:
+    """Feather file in `batch_rows` record batches, with their date index in
+    the schema metadata when the frame has a `date` column."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if 'date' in df.columns and pd.api.types.is_datetime64_any_dtype(df['date']):
+        metadata = dict(table.schema.metadata or {})
+        metadata[INDEX_KEY] = json.dumps(date_index(epoch_ns(df['date']), batch_rows)).encode()
+        table = table.replace_schema_metadata(metadata)
+    feather.write_feather(table, path, compression=compression, compression_level=compression_level,
+                          chunksize=batch_rows)
+
+class ChunkWriter:
+    """Write a frame to `output_path` one chunk at a time.
+
+    Feather output is an lz4 Arrow IPC file of record batches of at most
+    `batch_rows` rows and parquet gets one row group per chunk, so only the
+    current chunk is held in memory. Every chunk is cast to the first chunk's
+    schema. The date index is not known before the last chunk, so these files
+    have none; `metrex.reader` builds it from the `date` column.
+    """
+    def __init__(self, output_path: Path, batch_rows: int = DEFAULT_BATCH_ROWS):
+        self.path = Path(output_path)
+        self.ext = str(output_path).split('.')[-1]
+        if self.ext not in ('feather', 'parquet', 'csv'):
+            raise ValueError(f"Unknown output format: {self.ext}")
+        self._tmp = self.path.with_name(self.path.name + '.tmp')
+        self._tmp.unlink(missing_ok=True)
+        self._writer = None
+        self._schema = None
+        self.batch_rows = batch_rows
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            return
+        if self.ext == 'csv':
+            df.to_csv(self._tmp, index=False, mode='a', header=self.rows == 0)
+        else:
+            table = pa.Table.from_pandas(df.reset_index(drop=True), schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.ext == 'feather':
+                    options = pa.ipc.IpcWriteOptions(compression='lz4')
+                    self._writer = pa.ipc.new_file(str(self._tmp), self._schema, options=options)
+                else:
+                    import pyarrow.parquet as pq
+                    self._writer = pq.ParquetWriter(str(self._tmp), self._schema)
+            self._writer.write_table(table, self.batch_rows)
+        self.rows += len(df)
+
+    def close(self) -> None:
+        """Finish the file and move it over `output_path`."""
+        if self._writer is not None:
+            self._writer.close()
+        if self._tmp.exists():
+            os.replace(self._tmp, self.path)
+
+    def __enter__(self) -> 'ChunkWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            if self._writer is not None:
+                self._writer.close()
+            self._tmp.unlink(missing_ok=True)
+
+def save(df: pd.DataFrame, output_path: Path, compression: str = 'lz4', compression_level: Optional[int] = None,
+         batch_rows: Optional[int] = None):
+    """Write `df` to a temporary file and rename it over `output_path`, so
+    readers never see a partial file. `compression`/`compression_level` apply
+    to feather output ('lz4', 'zstd' or 'uncompressed'; level None =
+    `DEFAULT_COMPRESSION_LEVEL`).
+    Feather and parquet are written in record batches/row groups of
+    `batch_rows` rows (default `DEFAULT_BATCH_ROWS`), and feather files index
+    each batch's dates so `metrex.read` decodes only the batches it needs."""
+    output_path = Path(output_path)
     ext = str(output_path).split('.')[-1]
+    tmp = output_path.with_name(output_path.name + '.tmp')
+    batch_rows = batch_rows or DEFAULT_BATCH_ROWS
+    if ext == 'feather':
+        if compression == 'uncompressed':
+            compression_level = None
+        elif compression_level is None:
+            compression_level = DEFAULT_COMPRESSION_LEVEL
+        _write_feather(df, tmp, compression, compression_level, batch_rows)
+    elif ext == 'parquet':
+        df.reset_index(drop=True).to_parquet(tmp, row_group_size=batch_rows)
+    elif ext == 'csv':
+        df.to_csv(tmp, index=False)
+    else:
+        raise ValueError(f"Unknown output format: {ext}")
+    os.replace(tmp, output_path)
+
+def load(path: Path) -> pd.DataFrame:
+    """Read a frame written by `save` (format chosen by extension)."""
+    ext = str(path).split('.')[-1]
     if ext == 'feather':
-        df.reset_index(drop=True).to_feather(output_path, compression_level=9, compression="lz4")
+        return pd.read_feather(path)
     elif ext == 'parquet':
-        df.reset_index(drop=True).to_parquet(output_path)
+        return pd.read_parquet(path)
     elif ext == 'csv':
-        df.to_csv(output_path, index=False)
+        return pd.read_csv(path, parse_dates=['date'])
     else:
         raise ValueError(f"Unknown output format: {ext}")
@@ -1,17 +1,127 @@
+"""
+Metric registry.
 
-from typing import Dict, List
-from .base import MetricProtocol
+Metrics are declared by name, the module (or `module:object`) implementing
+them and a one-line description. Nothing is imported until a metric is
+looked up, so listing metrics needs neither pandas nor any implementation.
+A built-in module registers its instance with `register` when imported.
 
-REGISTRY: Dict[str, MetricProtocol] = {}
+Other packages add metrics through the `metrex.metrics` entry point group;
+the entry point's name is the metric name and its object is a metric
+instance, or a class or factory called without arguments:
 
-def register(metric: MetricProtocol):
-    REGISTRY[metric.name] = metric
+    [project.entry-points."metrex.metrics"]
+    funding_skew = "my_package.funding:FundingSkew"
 
-def get_selected(names: List[str]) -> List[MetricProtocol]:
+A plugin is imported only when its metric is selected (or with
+`--all-metrics`). Built-in names take precedence over plugins.
+"""
+import importlib
+import warnings
+from typing import TYPE_CHECKING, Dict, Iterator, List, Mapping, NamedTuple
+
+if TYPE_CHECKING:
+    from .base import MetricProtocol
+
+ENTRY_POINT_GROUP = 'metrex.metrics'
+
+
+class MetricSpec(NamedTuple):
+    name: str
+    # Module relative to this package, or an absolute `module:object`
+    target: str
+    description: str = ''
+    plugin: bool = False
+
+
+BUILTIN = [
+    MetricSpec('breadth_sma50', '.breadth_sma50', '% of pairs above their 50-bar SMA'),
+    MetricSpec('btc_trend_slope', '.btc_trend_slope', 'Rolling regression slope of BTC close'),
+    MetricSpec('market_vol_regime', '.market_vol_regime', 'BTC volatility regime (low/medium/high) and z-score'),
+    MetricSpec('adv_decline', '.adv_decline', 'Advancing/declining pair counts and A/D line'),
+    MetricSpec('new_highs_lows', '.new_highs_lows', 'Pairs at 50-bar highs and lows'),
+    MetricSpec('volume_surge_ratio', '.volume_surge_ratio', 'Market volume against its moving average'),
+    MetricSpec('avg_correlation_btc', '.avg_correlation_btc', 'Average rolling correlation of pair returns to BTC'),
+    MetricSpec('market_return_ma', '.market_return_ma', 'Mean pair return and its 20-bar SMA'),
+]
+
+
+def _entry_points():
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=ENTRY_POINT_GROUP)
+    return eps.get(ENTRY_POINT_GROUP, [])  # Python < 3.10
+
+
+def _resolve(target: str):
+    module, _, attr = target.partition(':')
+    obj = importlib.import_module(module, __name__)
+    for part in filter(None, attr.split('.')):
+        obj = getattr(obj, part)
+    return obj
+
+
+class _Registry(Mapping):
+    """Metric name -> instance; implementations are imported on first lookup."""
+
+    def __init__(self, specs: List[MetricSpec]):
+        self._specs: Dict[str, MetricSpec] = {s.name: s for s in specs}
+        self._metrics: Dict[str, 'MetricProtocol'] = {}
+        self._discovered = False
+
+    def specs(self) -> List[MetricSpec]:
+        """Every declared metric, built-ins first, without importing any."""
+        if not self._discovered:
+            self._discovered = True
+            for ep in sorted(_entry_points(), key=lambda e: e.name):
+                if ep.name in self._specs:
+                    warnings.warn(f"Ignoring plugin metric {ep.name!r} ({ep.value}): the name is taken")
+                    continue
+                self._specs[ep.name] = MetricSpec(ep.name, ep.value, plugin=True)
+        return list(self._specs.values())
+
+    def add(self, metric: 'MetricProtocol') -> None:
+        self._metrics[metric.name] = metric
+        if metric.name not in self._specs:
+            doc = (type(metric).__doc__ or '').strip().split('\n')[0]
+            self._specs[metric.name] = MetricSpec(metric.name, type(metric).__module__, doc)
+
+    def __getitem__(self, name: str) -> 'MetricProtocol':
+        if name not in self._metrics:
+            self.specs()
+            spec = self._specs.get(name)
+            if spec is None:
+                raise KeyError(name)
+            obj = _resolve(spec.target)
+            if spec.plugin and name not in self._metrics:
+                metric = obj if hasattr(obj, 'compute') and not isinstance(obj, type) else obj()
+                if metric.name != name:
+                    raise ValueError(f"Plugin {spec.target} provides metric {metric.name!r}, not {name!r}")
+                self.add(metric)
+            if name not in self._metrics:
+                raise ValueError(f"{spec.target} did not register metric {name!r}")
+        return self._metrics[name]
+
+    def __contains__(self, name) -> bool:
+        self.specs()
+        return name in self._specs
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([s.name for s in self.specs()])
+
+    def __len__(self) -> int:
+        return len(self.specs())
+
+
+REGISTRY = _Registry(BUILTIN)
+
+
+def register(metric: 'MetricProtocol'):
+    REGISTRY.add(metric)
+
+def get_selected(names: List[str]) -> List['MetricProtocol']:
     return [REGISTRY[n] for n in names if n in REGISTRY]
 
 def all_names() -> List[str]:
-    return list(REGISTRY.keys())
-
-# Import all metric modules to ensure registration
-from . import breadth_sma50, btc_trend_slope, market_vol_regime, adv_decline, new_highs_lows, volume_surge_ratio, avg_correlation_btc, market_return_ma
+    return list(REGISTRY)
@@ -1,19 +1,30 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
 
-class AdvDecline(MetricProtocol):
+class AdvDecline(PanelMetric):
     name = "adv_decline"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        df = market_df.copy()
-        df = df.sort_values(['date','pair'])
-        df['ret'] = df.groupby('pair')['close'].pct_change()
-        adv = df.groupby('date')['ret'].apply(lambda x: (x > 0).sum())
-        decl = df.groupby('date')['ret'].apply(lambda x: (x < 0).sum())
-        res = pd.DataFrame({'date': adv.index, 'adv_count': adv.values, 'decl_count': decl.values})
+    columns = ['close']
+    lookback = 1
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        ret = panel.returns
+        with np.errstate(invalid='ignore'):
+            adv = (ret > 0).sum(axis=1)
+            decl = (ret < 0).sum(axis=1)
+        res = panel.frame(adv_count=adv, decl_count=decl)
         res['adv_decline_diff'] = res['adv_count'] - res['decl_count']
-        res['adv_decline_line'] = res['adv_decline_diff'].cumsum()
-        return res.sort_values('date')
+        state = ctx.setdefault('state', {}).setdefault(self.name, {})
+        resume_after = ctx.get('resume_after')
+        if resume_after is not None and 'line' in state:
+            # Continue the cumulative line from the checkpoint after the last written row
+            new = res['date'] > resume_after
+            res['adv_decline_line'] = res['adv_decline_diff'].where(new, 0).cumsum() + state['line']
+        else:
+            res['adv_decline_line'] = res['adv_decline_diff'].cumsum()
+        if len(res):
+            state['line'] = int(res['adv_decline_line'].iloc[-1])
+        return res
 
 from . import register
 register(AdvDecline())
@@ -1,30 +1,41 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
+from ..rolling import rolling_corr
 
-class AvgCorrelationBTC(MetricProtocol):
-    name = "avg_correlation_btc"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        btc_names = ['BTC_USDT','BTCUSDT','BTC']
-        btc_df = market_df[market_df['pair'].isin(btc_names)].copy()
-        btc_df = btc_df.sort_values('date')
-        btc_ret = btc_df.set_index('date')['close'].pct_change().rename('btc_ret')
+class AvgCorrelationBTC(PanelMetric):
+    """Cross-sectional average rolling correlation of pair returns to BTC.
 
-        df = market_df.copy()
-        df = df.sort_values(['date','pair'])
-        df['ret'] = df.groupby('pair')['close'].pct_change()
-        # Merge BTC returns per timestamp
-        df = df.merge(btc_ret, left_on='date', right_index=True, how='left')
+    ctx overrides: `btc_corr_window` (default 50) and `btc_corr_beta` (also
+    emit `avg_beta_btc`, the average rolling beta to BTC).
+    """
+    name = "avg_correlation_btc"
+    columns = ['close']
+    def __init__(self, window: int = 50, min_periods: int = 10, beta: bool = False):
+        self.window = window
+        self.min_periods = min_periods
+        self.beta = beta
 
-        # Rolling correlation per pair versus BTC, then average cross-sectionally per date
-        def _corr_vs_btc(g: pd.DataFrame) -> pd.DataFrame:
-            g = g.sort_values('date')
-            g['corr_btc'] = g['ret'].rolling(50, min_periods=10).corr(g['btc_ret'])
-            return g
+    @property
+    def lookback(self) -> int:
+        return self.window + 1
 
-        df = df.groupby('pair', group_keys=False).apply(_corr_vs_btc)
-        avg_corr = df.groupby('date')['corr_btc'].mean().reset_index(name='avg_corr_btc')
-        return avg_corr.sort_values('date')
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        window = int(ctx.get('btc_corr_window', self.window))
+        beta = bool(ctx.get('btc_corr_beta', self.beta))
+        j = panel.btc_column()
+        ret = panel.returns
+        btc_ret = ret[:, j] if j is not None else np.full(panel.shape[0], np.nan)
+        # BTC return at each pair's candle, windows over each pair's own candles
+        x = panel.compress(ret)
+        y = panel.compress(np.broadcast_to(btc_ret[:, None], panel.shape))
+        res = rolling_corr(x, y, window, min_periods=min(self.min_periods, window), beta=beta)
+        # Average cross-sectionally per date
+        out = {'avg_corr_btc': panel.cross_mean(panel.expand(res['corr']))}
+        if beta:
+            out['avg_beta_btc'] = panel.cross_mean(panel.expand(res['beta']))
+        return panel.frame(**out)
 
 from . import register
 register(AvgCorrelationBTC())
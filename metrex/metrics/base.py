@@ -1,11 +1,41 @@
-from typing import Protocol, Dict, Any
+from abc import ABC, abstractmethod
+from typing import Protocol, Dict, Any, Callable, List, Optional, Union
 import pandas as pd
 
 class MetricProtocol(Protocol):
     name: str
+    # Bars of history needed before the first output row to reproduce a full run
+    lookback: int = 0
+    # Pairs the metric reads: names or a predicate on the name (None = whole
+    # market); only these files are loaded and they scope cache keys
+    pairs: Optional[Union[List[str], Callable[[str], bool]]] = None
+    # Candle columns the metric reads (None = all of OHLCV)
+    columns: Optional[List[str]] = None
+    # Bump when the metric's output changes for the same inputs
+    version: int = 1
     def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
         """
         Returns DataFrame with columns: ['date', '<metric_columns...>'] sorted by date.
         No pair column in the result (market-level metrics).
+
+        Metrics with cumulative state keep it in `ctx['state'][name]`; on an
+        incremental run that entry is restored from the checkpoint and
+        `ctx['resume_after']` holds the last date already written.
         """
         ...
+
+class PanelMetric(MetricProtocol, ABC):
+    """Metric computed from a shared `MarketPanel` instead of the long frame.
+
+    `run_metrics` builds the panel once and calls `compute_panel` on every
+    panel metric; `compute` remains available for standalone use. Subclasses
+    must implement `compute_panel`.
+    """
+    name: str
+    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
+        from ..panel import MarketPanel
+        return self.compute_panel(MarketPanel.from_frame(market_df), ctx)
+
+    @abstractmethod
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        ...
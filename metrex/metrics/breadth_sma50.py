@@ -1,18 +1,19 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
 
-class BreadthSMA50(MetricProtocol):
+class BreadthSMA50(PanelMetric):
     name = "breadth_sma50"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        # For each date, % of pairs with close > SMA50
-        df = market_df.copy()
-        df = df.sort_values(['date','pair'])
-        df['sma50'] = df.groupby('pair')['close'].transform(lambda x: x.rolling(50, min_periods=50).mean())
-        df['above_sma50'] = df['close'] > df['sma50']
-        res = df.groupby('date')['above_sma50'].mean().reset_index()
-        res['breadth_above_sma_50'] = res['above_sma50'] * 100
-        return res[['date','breadth_above_sma_50']].sort_values('date')
+    columns = ['close']
+    lookback = 50
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        # For each date, % of pairs with close > SMA50 (denominator: pairs with a candle)
+        sma50 = panel.rolling(panel.close, 50, 'mean', min_periods=50)
+        with np.errstate(invalid='ignore'):
+            above = (panel.close > sma50).sum(axis=1)
+        breadth = above / panel.present.sum(axis=1) * 100
+        return panel.frame(breadth_above_sma_50=breadth)
 
 # Register
 from . import register
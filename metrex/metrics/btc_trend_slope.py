@@ -1,28 +1,38 @@
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
+from ..panel import BTC_NAMES
+from ..rolling import rolling_ols
 
-class BTCTrendSlope(MetricProtocol):
+class BTCTrendSlope(PanelMetric):
+    """Rolling linear-regression slope of BTC close.
+
+    ctx overrides: `btc_trend_window` (default 20) and `btc_trend_fit`
+    (also emit `btc_trend_intercept` and `btc_trend_r2`).
+    """
     name = "btc_trend_slope"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        import numpy as np
-        btc_names = ['BTC_USDT','BTCUSDT','BTC']
-        btc_df = market_df[market_df['pair'].isin(btc_names)].copy()
-        btc_df = btc_df.sort_values('date')
-        def rolling_slope(series, window=20):
-            arr = series.values
-            slopes = np.full(arr.shape, np.nan)
-            for i in range(window-1, len(arr)):
-                y = arr[i-window+1:i+1]
-                x = np.arange(window)
-                if np.any(np.isnan(y)):
-                    continue
-                A = np.vstack([x, np.ones(window)]).T
-                m, _ = np.linalg.lstsq(A, y, rcond=None)[0]
-                slopes[i] = m
-            return pd.Series(slopes, index=series.index)
-        btc_df['btc_trend_slope'] = rolling_slope(btc_df['close'], window=20)
-        return btc_df[['date','btc_trend_slope']].sort_values('date')
+    pairs = BTC_NAMES
+    columns = ['close']
+    def __init__(self, window: int = 20, fit: bool = False):
+        self.window = window
+        self.fit = fit
+
+    @property
+    def lookback(self) -> int:
+        return self.window
+
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        window = int(ctx.get('btc_trend_window', self.window))
+        fit = bool(ctx.get('btc_trend_fit', self.fit))
+        btc_df = panel.btc_frame(['close'])
+        ols = rolling_ols(btc_df['close'].to_numpy(), window=window, fit=fit)
+        btc_df['btc_trend_slope'] = ols['slope']
+        cols = ['date', 'btc_trend_slope']
+        if fit:
+            btc_df['btc_trend_intercept'] = ols['intercept']
+            btc_df['btc_trend_r2'] = ols['r2']
+            cols += ['btc_trend_intercept', 'btc_trend_r2']
+        return btc_df[cols]
 
 from . import register
 register(BTCTrendSlope())
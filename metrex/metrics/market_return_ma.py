@@ -1,17 +1,15 @@
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
 
-class MarketReturnMA(MetricProtocol):
+class MarketReturnMA(PanelMetric):
     name = "market_return_ma"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        df = market_df.copy()
-        df = df.sort_values(['date','pair'])
-        df['ret'] = df.groupby('pair')['close'].pct_change()
-        mkt_ret = df.groupby('date')['ret'].mean().rename('mkt_ret')
-        mkt_ret_sma20 = mkt_ret.rolling(20, min_periods=1).mean().rename('mkt_ret_sma20')
-        res = pd.DataFrame({'date': mkt_ret.index, 'mkt_ret': mkt_ret.values, 'mkt_ret_sma20': mkt_ret_sma20.values})
-        return res.sort_values('date')
+    columns = ['close']
+    lookback = 21
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        mkt_ret = pd.Series(panel.cross_mean(panel.returns))
+        mkt_ret_sma20 = mkt_ret.rolling(20, min_periods=1).mean()
+        return panel.frame(mkt_ret=mkt_ret.values, mkt_ret_sma20=mkt_ret_sma20.values)
 
 from . import register
 register(MarketReturnMA())
@@ -1,25 +1,77 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
+from ..online import P2Quantile, RunningMoments
+from ..options import VOL_REGIME_MODES as MODES
+from ..panel import BTC_NAMES
+from ..timeutils import epoch_ns
 
-class MarketVolRegime(MetricProtocol):
+REGIMES = pd.CategoricalDtype(['low', 'medium', 'high'])
+
+class MarketVolRegime(PanelMetric):
+    """BTC 20-bar volatility classified into low/medium/high terciles, plus its z-score.
+
+    `mode='full'` takes the thresholds and moments from the whole sample (they
+    see future bars). `mode='expanding'` scores each bar against P² quantile
+    estimates and running moments of the volatility up to and including that
+    bar; their state is checkpointed, so a `latest-` run only feeds new bars.
+    ctx override: `vol_regime_mode`.
+    """
     name = "market_vol_regime"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        btc_names = ['BTC_USDT','BTCUSDT','BTC']
-        btc_df = market_df[market_df['pair'].isin(btc_names)].copy()
-        btc_df = btc_df.sort_values('date')
-        btc_df['returns'] = btc_df['close'].pct_change()
+    pairs = BTC_NAMES
+    columns = ['close']
+    lookback = 21
+    def __init__(self, mode: str = 'full', min_periods: int = 20):
+        self.mode = mode
+        self.min_periods = min_periods
+
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        mode = ctx.get('vol_regime_mode', self.mode)
+        if mode not in MODES:
+            raise ValueError(f"Unknown vol_regime_mode: {mode} (expected one of {', '.join(MODES)})")
+        btc_df = panel.btc_frame(['close'])
+        btc_df['returns'] = btc_df['close'].ffill().pct_change(fill_method=None)
         btc_df['vol'] = btc_df['returns'].rolling(20, min_periods=1).std()
-        # Percentile regime
-        vol = btc_df['vol'].dropna()
-        p33, p67 = vol.quantile([0.33,0.67])
-        def regime(v):
-            if v < p33: return 'low'
-            elif v < p67: return 'medium'
-            else: return 'high'
-        btc_df['vol_regime'] = btc_df['vol'].apply(regime)
-        btc_df['vol_zscore'] = (btc_df['vol'] - vol.mean()) / vol.std()
-        return btc_df[['date','vol_regime','vol_zscore']].rename(columns={'vol_regime':'market_vol_regime'}).sort_values('date')
+        vol = btc_df['vol'].to_numpy()
+        # Percentile regime; an incremental run reuses the checkpointed state
+        state = ctx.setdefault('state', {}).setdefault(self.name, {})
+        if ctx.get('resume_after') is None or state.get('mode', 'full') != mode:
+            state.clear()
+        if mode == 'full':
+            if 'p33' not in state:
+                v = btc_df['vol'].dropna()
+                p33, p67 = v.quantile([0.33,0.67])
+                state.update(p33=float(p33), p67=float(p67), mean=float(v.mean()), std=float(v.std()))
+            p33, p67, mean, std = state['p33'], state['p67'], state['mean'], state['std']
+            regime = np.where(vol < p33, 'low', np.where(vol < p67, 'medium', 'high')).astype(object)
+        else:
+            p33, p67, mean, std, seen = self._expanding(btc_df['date'], vol, state)
+            regime = np.where(vol < p33, 'low', np.where(vol < p67, 'medium', 'high')).astype(object)
+            regime[np.isnan(vol) | np.isnan(p33) | (seen < self.min_periods)] = None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            zscore = (vol - mean) / std
+        return pd.DataFrame({'date': btc_df['date'], 'market_vol_regime': pd.Categorical(regime, dtype=REGIMES),
+                             'vol_zscore': zscore})
+
+    def _expanding(self, dates: pd.Series, vol: np.ndarray, state: Dict[str, Any]):
+        """Per-bar thresholds/moments from bars up to each one; feeds only bars after `state['last']`."""
+        state['mode'] = 'expanding'
+        q33 = P2Quantile.from_state(state.get('q33'), 0.33)
+        q67 = P2Quantile.from_state(state.get('q67'), 0.67)
+        moments = RunningMoments.from_state(state.get('moments'))
+        ns = epoch_ns(dates)
+        # Bars already in the state (the lookback carried into a `latest-` run) are not scored
+        new = ns > state['last'] if 'last' in state else np.ones(len(ns), dtype=bool)
+        p33, p67, mean, std = (np.full(len(vol), np.nan) for _ in range(4))
+        seen = np.zeros(len(vol), dtype=np.int64)
+        seen[new] = q33.count + np.cumsum(~np.isnan(vol[new]))
+        p33[new] = q33.update_many(vol[new])
+        p67[new] = q67.update_many(vol[new])
+        mean[new], std[new] = moments.update_many(vol[new])
+        if new.any():
+            state.update(last=int(ns[new][-1]), q33=q33.to_state(), q67=q67.to_state(), moments=moments.to_state())
+        return p33, p67, mean, std, seen
 
 from . import register
 register(MarketVolRegime())
@@ -1,17 +1,17 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
-from .base import MetricProtocol
+from .base import PanelMetric
 
-class VolumeSurgeRatio(MetricProtocol):
+class VolumeSurgeRatio(PanelMetric):
     name = "volume_surge_ratio"
-    def compute(self, market_df: pd.DataFrame, ctx: Dict[str, Any]) -> pd.DataFrame:
-        df = market_df.copy()
-        df = df.sort_values(['date','pair'])
-        df['vol_sma20'] = df.groupby('pair')['volume'].transform(lambda x: x.rolling(20, min_periods=1).mean())
-        df['vol_surge'] = df['volume'] / df['vol_sma20']
-        res = df.groupby('date')['vol_surge'].mean().reset_index()
-        res = res.rename(columns={'vol_surge':'volume_surge_ratio'})
-        return res.sort_values('date')
+    columns = ['volume']
+    lookback = 20
+    def compute_panel(self, panel, ctx: Dict[str, Any]) -> pd.DataFrame:
+        vol_sma20 = panel.rolling(panel.volume, 20, 'mean', min_periods=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_surge = panel.volume / vol_sma20
+        return panel.frame(volume_surge_ratio=panel.cross_mean(vol_surge))
 
 from . import register
 register(VolumeSurgeRatio())
@@ -0,0 +1,135 @@
+"""
+Streaming estimators with small, JSON-serializable state.
+
+`P2Quantile` tracks one quantile with the P² algorithm (Jain & Chlamtac,
+1985): five markers whose heights are adjusted with piecewise-parabolic
+interpolation, so each observation costs O(1) time and the state has a fixed
+size regardless of how many values were seen. `RunningMoments` keeps the
+count, mean and sum of squared deviations and updates them for a whole batch
+at once.
+
+Both expose `to_state()`/`from_state()` so metrics can checkpoint them in
+`ctx['state']` and score new bars without revisiting history.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class P2Quantile:
+    """Running estimate of the `p` quantile of the values seen so far."""
+
+    def __init__(self, p: float):
+        if not 0 < p < 1:
+            raise ValueError(f"Quantile must be in (0, 1), got {p}")
+        self.p = p
+        self.count = 0
+        # Marker heights, actual and desired positions (1-based as in the paper)
+        self.q: List[float] = []
+        self.n = [1, 2, 3, 4, 5]
+        self.np = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    @property
+    def value(self) -> float:
+        """Current estimate (exact up to five values, NaN before any)."""
+        if self.count > 5:
+            return self.q[2]
+        if not self.count:
+            return float('nan')
+        return float(np.quantile(self.q, self.p))
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        q = self.q
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        n, np_ = self.n, self.np
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            np_[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = np_[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    # Parabolic step would break monotonicity; fall back to linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def update_many(self, values: np.ndarray) -> np.ndarray:
+        """Feed `values` in order; returns the estimate after each (NaNs are skipped)."""
+        out = np.empty(len(values))
+        for i, x in enumerate(values.tolist()):
+            if x == x:
+                self.update(x)
+            out[i] = self.value
+        return out
+
+    def to_state(self) -> Dict[str, Any]:
+        return {'p': self.p, 'count': self.count, 'q': list(self.q), 'n': list(self.n), 'np': list(self.np)}
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]], p: float) -> 'P2Quantile':
+        """Restore an estimator, or start a new one for `p` when `state` is empty."""
+        est = cls(state['p'] if state else p)
+        if state:
+            est.count = int(state['count'])
+            est.q = [float(v) for v in state['q']]
+            est.n = [int(v) for v in state['n']]
+            est.np = [float(v) for v in state['np']]
+        return est
+
+
+class RunningMoments:
+    """Count, mean and sample standard deviation of the values seen so far."""
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update_many(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Feed `values` in order; returns (mean, std) after each (NaNs are skipped)."""
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        # Deviations from the previous mean (the first value when there is none
+        # yet) keep the sums small, so s2 - s1²/count does not cancel
+        shift = self.mean
+        if not self.count and valid.any():
+            shift = self.mean = float(values[valid][0])
+        d = np.where(valid, values - shift, 0.0)
+        count = self.count + np.cumsum(valid)
+        s1, s2 = np.cumsum(d), np.cumsum(d * d)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = shift + s1 / count
+            m2 = self.m2 + s2 - s1 * s1 / count
+            std = np.sqrt(np.maximum(m2, 0.0) / (count - 1))
+        mean[count == 0] = np.nan
+        std[count < 2] = np.nan
+        if len(values) and count[-1]:
+            self.count, self.mean, self.m2 = int(count[-1]), float(mean[-1]), float(m2[-1])
+        return mean, std
+
+    def to_state(self) -> Dict[str, Any]:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict[str, Any]]) -> 'RunningMoments':
+        return cls(**state) if state else cls()
@@ -0,0 +1,23 @@
+"""
+Choices and defaults of CLI options.
+
+Kept free of numpy/pandas imports so the CLI can build its options (and
+`metrex --help` or `metrex list` can run) without loading them; the
+modules implementing each option import the names they use from here.
+"""
+import os
+
+# Rank output layouts (`store.open_store`)
+STORES = ('feather', 'partitioned')
+# Codecs of rank output files
+COMPRESSIONS = ('lz4', 'zstd', 'uncompressed')
+# Codec level of saved feather outputs, lz4 or zstd (`io.save`, both stores)
+DEFAULT_COMPRESSION_LEVEL = 9
+# Writes wait on disk as much as on the CPU, so use a few more threads than cores
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) + 4)
+# Rows per record batch (feather) or row group (parquet) of saved outputs
+DEFAULT_BATCH_ROWS = 65536
+# `metrex serve` TCP port
+DEFAULT_PORT = 8765
+# `market_vol_regime` threshold modes
+VOL_REGIME_MODES = ('full', 'expanding')
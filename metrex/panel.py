@@ -0,0 +1,226 @@
+"""
+Wide date x pair market panel shared by all metrics in a run.
+
+The long-format frame from `io.load_feathers` is pivoted once into aligned
+(T, N) NumPy arrays (T dates, N pairs). Cells for which a pair has no candle
+are NaN and flagged False in `present`. Derived arrays (e.g. per-pair returns)
+are computed lazily and cached, so every metric reuses the same work.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import json
+import numpy as np
+import pandas as pd
+from .rolling import rolling_stats
+
+BTC_NAMES = ['BTC_USDT', 'BTCUSDT', 'BTC']
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class MarketPanel:
+    """Date x pair arrays built from a long `date, pair, ohlcv` frame."""
+
+    def __init__(self, dates: pd.Index, pairs: pd.Index, arrays: Dict[str, np.ndarray], present: np.ndarray):
+        self.dates = dates
+        self.pairs = pairs
+        self.arrays = arrays
+        self.present = present
+        self._cache: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, market_df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> 'MarketPanel':
+        """Pivot a long frame into a panel without sorting or copying the frame.
+
+        Duplicate (date, pair) rows keep the last occurrence.
+        """
+        if columns is None:
+            columns = [c for c in PRICE_COLUMNS if c in market_df.columns]
+        d_codes, dates = pd.factorize(market_df['date'], sort=True)
+        p_codes, pairs = pd.factorize(market_df['pair'], sort=True)
+        shape = (len(dates), len(pairs))
+        present = np.zeros(shape, dtype=bool)
+        present[d_codes, p_codes] = True
+        arrays = {}
+        for col in columns:
+            arr = np.full(shape, np.nan)
+            arr[d_codes, p_codes] = market_df[col].to_numpy(dtype=float)
+            arrays[col] = arr
+        return cls(pd.Index(dates, name='date'), pd.Index(pairs, name='pair'), arrays, present)
+
+    def save(self, folder: Path) -> None:
+        """Spill the panel to `folder` as .npy files that `open` memory-maps."""
+        folder = Path(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+        tz = getattr(self.dates, 'tz', None)
+        dates = self.dates.tz_convert('UTC').tz_localize(None) if tz is not None else self.dates
+        np.save(folder / 'dates.npy', dates.values)
+        np.save(folder / 'present.npy', self.present)
+        for name, arr in self.arrays.items():
+            np.save(folder / f'{name}.npy', arr)
+        meta = {'tz': None if tz is None else str(tz), 'pairs': [str(p) for p in self.pairs], 'arrays': list(self.arrays)}
+        (folder / 'panel.json').write_text(json.dumps(meta))
+
+    @classmethod
+    def open(cls, folder: Path) -> 'MarketPanel':
+        """Read-only panel whose arrays are memory-mapped from `save` output."""
+        folder = Path(folder)
+        meta = json.loads((folder / 'panel.json').read_text())
+        dates = pd.DatetimeIndex(np.load(folder / 'dates.npy'), name='date')
+        if meta['tz'] is not None:
+            dates = dates.tz_localize('UTC').tz_convert(meta['tz'])
+        arrays = {name: np.load(folder / f'{name}.npy', mmap_mode='r') for name in meta['arrays']}
+        present = np.load(folder / 'present.npy', mmap_mode='r')
+        return cls(dates, pd.Index(meta['pairs'], name='pair'), arrays, present)
+
+    @property
+    def shape(self):
+        return self.present.shape
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.arrays[column]
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.arrays['close']
+
+    @property
+    def high(self) -> np.ndarray:
+        return self.arrays['high']
+
+    @property
+    def low(self) -> np.ndarray:
+        return self.arrays['low']
+
+    @property
+    def volume(self) -> np.ndarray:
+        return self.arrays['volume']
+
+    def cached(self, key: str, fn) -> np.ndarray:
+        """Return `fn()` memoized on this panel under `key`."""
+        if key not in self._cache:
+            self._cache[key] = fn()
+        return self._cache[key]
+
+    @property
+    def returns(self) -> np.ndarray:
+        """Per-pair close-to-close returns over each pair's own candles.
+
+        Matches `groupby('pair')['close'].pct_change()` on the long frame:
+        gaps are skipped and NaN closes are padded with the last valid close.
+        """
+        return self.cached('returns', lambda: self._pct_change(self.close))
+
+    def _pct_change(self, arr: np.ndarray) -> np.ndarray:
+        filled = _ffill(arr)
+        prev = np.empty_like(filled)
+        prev[0] = np.nan
+        prev[1:] = filled[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = filled / prev - 1
+        out[~self.present] = np.nan
+        return out
+
+    # Per-pair rolling windows run over each pair's own candles, not over panel
+    # rows, so a listing gap does not shorten the window.
+
+    def pack(self, arr: np.ndarray) -> np.ndarray:
+        """Flatten present cells pair-major (each pair's candles in date order)."""
+        return arr.T[self.present.T]
+
+    def unpack(self, flat: np.ndarray) -> np.ndarray:
+        """Inverse of `pack`; absent cells become NaN."""
+        out = np.full(self.shape[::-1], np.nan, dtype=np.result_type(flat.dtype, float))
+        out[self.present.T] = flat
+        return out.T
+
+    @property
+    def group_ids(self) -> np.ndarray:
+        """Pair code of every packed cell."""
+        return self.cached('group_ids', lambda: np.repeat(np.arange(self.shape[1]), self.present.sum(axis=0)))
+
+    @property
+    def _compressed_index(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """Flat panel positions of present cells, their flat positions in the
+        compressed layout, and its row count."""
+        def build():
+            src = np.flatnonzero(self.present)
+            ordinal = np.cumsum(self.present, axis=0) - 1
+            n_pairs = self.shape[1]
+            dst = ordinal.ravel()[src] * n_pairs + src % n_pairs
+            return src, dst, int(self.present.sum(axis=0).max(initial=0))
+        return self.cached('compressed_index', build)
+
+    def compress(self, arr: np.ndarray) -> np.ndarray:
+        """(L, N) array holding each pair's candles top-aligned, L = longest history.
+
+        Windows running down axis 0 of the result span each pair's own
+        candles; rows past a pair's history are NaN.
+        """
+        src, dst, rows = self._compressed_index
+        out = np.full((rows, self.shape[1]), np.nan)
+        out.ravel()[dst] = np.ravel(arr)[src]
+        return out
+
+    def expand(self, comp: np.ndarray) -> np.ndarray:
+        """Inverse of `compress`; absent cells become NaN."""
+        src, dst, _ = self._compressed_index
+        out = np.full(self.shape, np.nan)
+        out.ravel()[src] = np.ravel(comp)[dst]
+        return out
+
+    def rolling_stats(self, arr: np.ndarray, windows: Iterable[int], stats: Iterable[str],
+                      min_periods: Optional[int] = None) -> Dict[Tuple[str, int], np.ndarray]:
+        """Per-pair rolling `stats` for several windows in one pass, keyed by (stat, window)."""
+        res = rolling_stats(self.compress(arr), windows, stats, min_periods)
+        return {k: self.expand(v) for k, v in res.items()}
+
+    def rolling(self, arr: np.ndarray, window: int, how: str, min_periods: Optional[int] = None) -> np.ndarray:
+        """Per-pair rolling `how` ('mean', 'sum', 'std', 'max', 'min') of a panel array."""
+        return self.rolling_stats(arr, [window], [how], min_periods)[(how, window)]
+
+    def btc_column(self) -> Optional[int]:
+        """Column index of the BTC pair, if any."""
+        for name in BTC_NAMES:
+            if name in self.pairs:
+                return self.pairs.get_loc(name)
+        return None
+
+    def btc_frame(self, columns: Iterable[str] = ('close',)) -> pd.DataFrame:
+        """BTC candles as a date-sorted frame (empty when BTC is absent)."""
+        j = self.btc_column()
+        if j is None:
+            return pd.DataFrame({'date': self.dates[:0], **{c: np.array([]) for c in columns}})
+        rows = self.present[:, j]
+        data = {'date': self.dates[rows]}
+        for c in columns:
+            data[c] = self.arrays[c][rows, j]
+        return pd.DataFrame(data)
+
+    def cross_mean(self, arr: np.ndarray) -> np.ndarray:
+        """Per-date mean over pairs, skipping NaN (NaN when nothing is valid)."""
+        valid = ~np.isnan(arr)
+        count = valid.sum(axis=1)
+        total = np.where(valid, arr, 0.0).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(count > 0, total / count, np.nan)
+
+    def to_long(self, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Long `date, pair, ...` frame of the present cells, pair-major and
+        date-sorted within each pair (the inverse of `from_frame`)."""
+        d_idx = self.pack(np.broadcast_to(np.arange(self.shape[0])[:, None], self.shape))
+        data = {'date': self.dates[d_idx], 'pair': self.pairs[self.group_ids]}
+        for name, arr in arrays.items():
+            data[name] = self.pack(np.broadcast_to(arr, self.shape))
+        return pd.DataFrame(data)
+
+    def frame(self, **columns) -> pd.DataFrame:
+        """Market-level result frame with a `date` column plus `columns`."""
+        return pd.DataFrame({'date': self.dates, **columns})
+
+
+def _ffill(arr: np.ndarray) -> np.ndarray:
+    """Forward-fill NaN down axis 0 of a 2-D array."""
+    idx = np.where(~np.isnan(arr), np.arange(arr.shape[0])[:, None], 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    out = arr[idx, np.arange(arr.shape[1])]
+    return out
@@ -0,0 +1,51 @@
+"""
+Process-pool execution of independent metrics.
+
+The parent spills the shared inputs once to a temporary directory: the
+`MarketPanel` as memory-mapped .npy arrays and, only if a legacy long-frame
+metric is selected, the market frame as an uncompressed Arrow IPC file.
+Workers map those files instead of receiving pickled copies and return only
+their small market-level frame and checkpoint state. Each worker receives
+the metric instance itself (pickled), so instance parameters and metrics
+registered at runtime work like in a serial run. Results are collected
+in metric order, so the merged output matches a serial run exactly.
+"""
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+import pyarrow.feather as feather
+from .metrics.base import PanelMetric
+from .panel import MarketPanel
+
+
+def _run_one(spill: str, metric, ctx: Dict[str, Any]) -> Tuple[pd.DataFrame, Optional[Dict[str, Any]]]:
+    folder = Path(spill)
+    if isinstance(metric, PanelMetric):
+        frame = metric.compute_panel(MarketPanel.open(folder / 'panel'), ctx)
+    else:
+        df = feather.read_table(folder / 'market.arrow', memory_map=True).to_pandas()
+        frame = metric.compute(df, ctx)
+    return frame, ctx.get('state', {}).get(metric.name)
+
+
+def compute_parallel(metrics: List, df: pd.DataFrame, panel: Optional[MarketPanel], ctx: Dict[str, Any],
+                     jobs: int) -> Dict[str, pd.DataFrame]:
+    """Compute `metrics` on `jobs` worker processes; checkpoint state is merged into `ctx`."""
+    with tempfile.TemporaryDirectory(prefix='metrex-') as spill:
+        if panel is not None:
+            panel.save(Path(spill) / 'panel')
+        if any(not isinstance(m, PanelMetric) for m in metrics):
+            feather.write_feather(df, Path(spill) / 'market.arrow', compression='uncompressed')
+        mp = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=mp) as pool:
+            futures = [pool.submit(_run_one, spill, m, ctx) for m in metrics]
+            results = [f.result() for f in futures]
+    frames = {}
+    for m, (frame, state) in zip(metrics, results):
+        frames[m.name] = frame
+        if state is not None:
+            ctx.setdefault('state', {})[m.name] = state
+    return frames
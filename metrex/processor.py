@@ -2,31 +2,402 @@
 Processor orchestrates: load -> filter -> run metrics -> merge -> save
 """
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import Callable, List, Dict, Any, NamedTuple, Optional, Tuple, Union
+import json
+import numpy as np
 import pandas as pd
-from .io import load_feathers, save
-from .timeutils import filter_timerange
+from .cache import DEFAULT_MAX_BYTES, MetricCache
+from .chunking import chunk_ends, chunk_span
+from .io import (DEFAULT_BATCH_ROWS, OHLCV_COLUMNS, ChunkWriter, Pairs, date_extent, feather_files, load_feathers,
+                 load, pair_filter, save, tail_dates)
+from .timeindex import TimeIndex
+from .timeutils import as_utc, epoch_ns, parse_date, timeframe_to_timedelta, to_utc
 from .metrics import get_selected, all_names, REGISTRY
+from .metrics.base import PanelMetric
+from .panel import PRICE_COLUMNS, MarketPanel
+from .parallel import compute_parallel
+from .profiling import stage
+from .ranking import LOOKBACK, compute_ranks
+from .resample import timeframe_key, bucket_ends, bucket_starts, resample_ohlcv
+from .store import open_store
+from .writer import DEFAULT_WORKERS, PairWriter
 
-def load_market(datafolder: Path, timeframe: str) -> pd.DataFrame:
-    return load_feathers(datafolder, timeframe)
+def load_market(datafolder: Path, timeframe: str, start: Optional[pd.Timestamp] = None,
+                end: Optional[pd.Timestamp] = None, compact: bool = False,
+                columns: Optional[List[str]] = None, pairs: Optional[Pairs] = None) -> pd.DataFrame:
+    with stage('load_feathers') as st:
+        df = load_feathers(datafolder, timeframe, columns=columns, start=start, end=end, compact=compact,
+                           pairs=pairs)
+        st['rows'] = len(df)
+    return df
 
-def run_metrics(df: pd.DataFrame, metric_names: List[str], ctx: Dict[str, Any]) -> pd.DataFrame:
+class LoadPlan(NamedTuple):
+    """Candle data a set of metrics reads (see `plan_load`)."""
+    # Predicate on the pair name (None: every pair)
+    pairs: Optional[Callable[[str], bool]]
+    columns: List[str]
+    lookback: int
+
+def plan_load(metric_names: List[str]) -> LoadPlan:
+    """Union of the `pairs`, `columns` and `lookback` the selected metrics declare.
+
+    A metric without `pairs` needs the whole market and one without `columns`
+    all of OHLCV, so a BTC-only selection reads one file and the broad
+    metrics read only the columns they use.
+    """
     metrics = get_selected(metric_names)
-    metric_frames = [m.compute(df, ctx) for m in metrics]
-    # Outer join on date, then ffill, dropna(how='all') on metric columns
-    result = metric_frames[0].set_index('date')
-    for mf in metric_frames[1:]:
-        result = result.join(mf.set_index('date'), how='outer')
-    result = result.sort_index().ffill().dropna(how='all')
-    result = result.reset_index()
+    filters = [pair_filter(getattr(m, 'pairs', None)) for m in metrics]
+    pairs = None
+    if filters and all(f is not None for f in filters):
+        pairs = filters[0] if len(filters) == 1 else lambda pair: any(f(pair) for f in filters)
+    needed = set()
+    for m in metrics:
+        needed.update(getattr(m, 'columns', None) or OHLCV_COLUMNS)
+    return LoadPlan(pairs, [c for c in OHLCV_COLUMNS if c in needed], lookback_bars(metric_names))
+
+def _metric_inputs(metric, inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache inputs restricted to the files of the pairs a metric reads."""
+    keep = pair_filter(getattr(metric, 'pairs', None))
+    if keep is None or 'files' not in inputs:
+        return inputs
+    files = {f: fp for f, fp in inputs['files'].items() if keep(f.split('-')[0])}
+    return {**inputs, 'files': files}
+
+def run_metrics(df: Union[pd.DataFrame, Callable[[], pd.DataFrame]], metric_names: List[str], ctx: Dict[str, Any],
+                cache: Optional[MetricCache] = None, cache_inputs: Optional[Dict[str, Any]] = None,
+                jobs: int = 1, float32: bool = False) -> pd.DataFrame:
+    """Compute the selected metrics and join them on date (see `join_metric_frames`).
+
+    With a `cache`, each metric's frame (and its checkpoint state) is looked
+    up by `MetricCache.key` over `cache_inputs` first and only the misses are
+    computed. `df` may be a zero-argument loader, called only on a miss.
+    With `jobs > 1` the missing metrics run concurrently in a process pool
+    (see `metrex.parallel`); the output is identical to a serial run.
+    """
+    metrics = get_selected(metric_names)
+    frames: Dict[str, pd.DataFrame] = {}
+    keys: Dict[str, str] = {}
+    if cache is not None:
+        with stage('cache_lookup'):
+            # Keys are taken before any metric runs so they see the incoming state
+            for m in metrics:
+                keys[m.name] = cache.key(m, ctx, _metric_inputs(m, cache_inputs or {}))
+            for m in metrics:
+                hit = cache.get(keys[m.name])
+                if hit is not None:
+                    frames[m.name], state = hit
+                    if state is not None:
+                        ctx.setdefault('state', {})[m.name] = state
+    missing = [m for m in metrics if m.name not in frames]
+    if missing:
+        if callable(df):
+            df = df()
+        panel = None
+        if any(isinstance(m, PanelMetric) for m in missing):
+            # Pivot the long frame once; panel metrics share it and its cached arrays
+            with stage('panel', rows=len(df)):
+                panel = MarketPanel.from_frame(df)
+        if jobs > 1 and len(missing) > 1:
+            with stage('parallel', rows=len(df)):
+                frames.update(compute_parallel(missing, df, panel, ctx, jobs))
+        else:
+            for m in missing:
+                with stage(f'metric:{m.name}', rows=len(df)):
+                    frames[m.name] = m.compute_panel(panel, ctx) if isinstance(m, PanelMetric) else m.compute(df, ctx)
+        if cache is not None:
+            with stage('cache_store'):
+                for m in missing:
+                    cache.put(keys[m.name], frames[m.name], ctx.get('state', {}).get(m.name))
+    with stage('join') as st:
+        result = join_metric_frames([frames[m.name] for m in metrics], float32=float32)
+        st['rows'] = len(result)
     return result
 
-def process(datafolder: Path, timeframe: str, timerange: str, metric_names: List[str], output: Path, ctx: Dict[str, Any] = {}):
-    df = load_market(datafolder, timeframe)
-    df = filter_timerange(df, timerange)
-    result = run_metrics(df, metric_names, ctx)
-    save(result, output)
+def _ffill_index(valid: np.ndarray) -> np.ndarray:
+    """For every row, the position of the last valid row at or before it (0 if none)."""
+    return np.maximum.accumulate(np.where(valid, np.arange(len(valid)), 0))
+
+def _align_column(values: pd.Series, pos: Optional[np.ndarray], n: int, float32: bool):
+    """One metric column placed at `pos` of an `n`-row date union and forward-filled.
+
+    `pos=None` means the column already has one value per union date. Dtypes
+    follow an outer join: int columns become float when rows are added.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        if pos is not None:
+            full = np.full(n, -1, dtype=codes.dtype)
+            full[pos] = codes
+            codes = full
+        codes = codes[_ffill_index(codes >= 0)]
+        return pd.Categorical.from_codes(codes, dtype=values.dtype)
+    arr = values.to_numpy()
+    kind = arr.dtype.kind
+    if pos is not None:
+        full = np.full(n, np.nan, dtype=float if kind in 'iuf' else object)
+        full[pos] = arr
+        arr = full
+    if kind in 'iu' and pos is None:
+        return arr
+    arr = arr[_ffill_index(~pd.isna(arr))]
+    if float32 and arr.dtype == np.float64:
+        arr = arr.astype(np.float32)
+    return arr
+
+def _union_dates(stamps: List[np.ndarray]) -> np.ndarray:
+    """Sorted unique union of epoch-ns date arrays."""
+    distinct: List[np.ndarray] = []
+    for ns in stamps:
+        if not any(len(ns) == len(u) and np.array_equal(ns, u) for u in distinct):
+            distinct.append(ns)
+    if len(distinct) == 1 and (np.diff(distinct[0]) > 0).all():
+        return distinct[0]
+    # Metric outputs are date-sorted runs, which a stable (merge) sort combines cheaply
+    dates = np.sort(np.concatenate(distinct), kind='stable')
+    return dates[np.r_[True, dates[1:] != dates[:-1]]]
+
+def join_metric_frames(metric_frames: List[pd.DataFrame], float32: bool = False) -> pd.DataFrame:
+    """Align metric frames on the union of their dates, forward-fill, and drop
+    the leading rows where no metric has a value yet.
+
+    Same result as an outer join on date followed by `ffill()` and
+    `dropna(how='all')`, but the union is computed once and every frame is
+    placed into it with a sorted search instead of a hash join per frame.
+    Categorical columns keep their dictionary encoding; `float32` narrows
+    float columns after filling.
+    """
+    stamps = [epoch_ns(mf['date']) for mf in metric_frames]
+    dates = metric_frames[0]['date']
+    union = _union_dates(stamps)
+    if union is not stamps[0]:
+        utc = pd.Series(union.view('datetime64[ns]'))
+        if isinstance(dates.dtype, pd.DatetimeTZDtype):
+            utc = utc.dt.tz_localize('UTC')
+        dates = utc.astype(dates.dtype)
+    n = len(union)
+    columns: Dict[str, Any] = {}
+    for mf, ns in zip(metric_frames, stamps):
+        pos = None if len(ns) == n and np.array_equal(ns, union) else np.searchsorted(union, ns)
+        for col in mf.columns:
+            if col == 'date':
+                continue
+            if col in columns:
+                raise ValueError(f"Metric column {col!r} is produced by more than one metric")
+            columns[col] = _align_column(mf[col], pos, n, float32)
+    # After filling, only rows before the first value of every column are empty
+    first = n if columns else 0
+    for c in columns.values():
+        valid = ~pd.isna(c)
+        if valid.any():
+            first = min(first, int(np.argmax(valid)))
+    return pd.DataFrame({'date': dates.array[first:], **{col: c[first:] for col, c in columns.items()}})
+
+def _state_path(output: Path) -> Path:
+    """Checkpoint of cumulative metric state written next to the output file."""
+    output = Path(output)
+    return output.with_name(output.name + '.state.json')
+
+def _read_state(output: Path) -> Optional[Dict[str, Any]]:
+    path = _state_path(output)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+def _write_state(output: Path, metric_names: List[str], last_date: pd.Timestamp, state: Dict[str, Any]) -> None:
+    payload = {'metrics': list(metric_names), 'last_date': last_date.isoformat(), 'state': state}
+    _state_path(output).write_text(json.dumps(payload, indent=2))
+
+def lookback_bars(metric_names: List[str]) -> int:
+    """Largest history (in bars) required by the selected metrics."""
+    return max((int(getattr(m, 'lookback', 0)) for m in get_selected(metric_names)), default=0)
+
+def process(datafolder: Path, timeframe: str, timerange: str, metric_names: List[str], output: Path,
+            ctx: Optional[Dict[str, Any]] = None, cache_dir: Optional[Path] = None,
+            cache_max_bytes: int = DEFAULT_MAX_BYTES, jobs: int = 1,
+            max_memory: Optional[int] = None, chunk: Optional[str] = None,
+            market: Optional[pd.DataFrame] = None, float32: bool = False, compact: bool = False,
+            batch_rows: Optional[int] = None):
+    """Compute metrics over `timerange` and save them to `output`.
+
+    With `latest-YYYYMMDD`, only bars after the last date in `output` are
+    computed and appended. Each pair's last `lookback` bars before that date
+    are reloaded to warm up rolling windows (see `lookback_start`), and
+    cumulative state is restored from the `<output>.state.json` checkpoint. Without a usable output/checkpoint
+    for the same metric list, the run starts at the first available input date.
+
+    With `cache_dir`, per-metric results are reused from a `MetricCache` keyed
+    on the input file fingerprints; a fully cached run does not load any data.
+
+    With `max_memory` (bytes) or `chunk` (e.g. '30D') the run streams over
+    time chunks, see `_process_streaming`.
+
+    `market` is an already loaded (e.g. resampled) long frame to use instead
+    of reading `datafolder`; it cannot be combined with the cache or streaming.
+
+    `float32` stores float metric columns as float32 (about 7 significant digits).
+    `compact` also loads the candles as float32 (see `load_feathers`).
+
+    `batch_rows` sets the rows per indexed record batch of the output (see
+    `io.save` and `metrex.reader`).
+
+    Only the pairs and columns the metrics declare are read (see `plan_load`).
+    """
+    float32 = float32 or compact
+    if market is not None and (cache_dir is not None or max_memory is not None or chunk is not None):
+        raise ValueError('A preloaded market cannot be combined with the cache or streaming')
+    ctx = dict(ctx or {})
+    output = Path(output)
+    start_raw, end_raw = _parse_timerange_bounds(timerange)
+    end = parse_date(end_raw)
+    plan = plan_load(metric_names)
+
+    existing = None
+    start: Optional[pd.Timestamp] = None
+    if start_raw.lower() == 'latest':
+        checkpoint = _read_state(output)
+        if output.exists() and checkpoint and checkpoint.get('metrics') == list(metric_names):
+            existing = load(output)
+        if existing is not None and not existing.empty:
+            resume_after = pd.Timestamp(existing['date'].max())
+            if market is not None:
+                tails = TimeIndex.from_frame(market).tail(plan.lookback, resume_after)
+            else:
+                tails = tail_dates(datafolder, timeframe, resume_after, plan.lookback, plan.pairs)
+            start = lookback_start(tails, plan.lookback, resume_after)
+            ctx['resume_after'] = resume_after
+            ctx['state'] = checkpoint.get('state', {})
+        else:
+            existing = None
+    else:
+        start = parse_date(start_raw)
+
+    cache = None
+    if cache_dir is not None:
+        cache = MetricCache(cache_dir, cache_max_bytes)
+    if max_memory is not None or chunk is not None:
+        _process_streaming(datafolder, timeframe, metric_names, output, ctx, start, end, existing,
+                           cache, jobs, max_memory, chunk, float32, compact, plan, batch_rows)
+        return
+
+    # The timerange, pairs and columns are pushed down into the loader; nothing else is materialized
+    def loader() -> pd.DataFrame:
+        if market is not None:
+            return _slice_market(market, start, end)
+        return load_market(datafolder, timeframe, start=start, end=end, compact=compact,
+                           columns=plan.columns, pairs=plan.pairs)
+
+    cache_inputs = None
+    if cache is not None:
+        files = feather_files(datafolder, timeframe, plan.pairs)
+        cache_inputs = {'timeframe': timeframe, 'start': start, 'end': end, 'files': cache.fingerprints(files)}
+    with stage('run_metrics'):
+        result = run_metrics(loader, metric_names, ctx, cache=cache, cache_inputs=cache_inputs, jobs=jobs,
+                             float32=float32)
+    if existing is not None:
+        result = result[result['date'] > ctx['resume_after']]
+        if result.empty:
+            return
+        result = pd.concat([existing, result], ignore_index=True)
+    with stage('save', rows=len(result)):
+        save(result, output, batch_rows=batch_rows)
+    if not result.empty:
+        _write_state(output, metric_names, pd.Timestamp(result['date'].max()), ctx.get('state', {}))
+
+def lookback_start(tails: Dict[str, np.ndarray], bars: int, before: pd.Timestamp) -> pd.Timestamp:
+    """First candle a run resuming after `before` has to reload.
+
+    `tails` are each pair's last `bars` candle dates up to `before` (see
+    `io.tail_dates`). As in `_carry_rows`, the run starts at the oldest of
+    them among pairs still trading in the last `bars` market dates, so the
+    history counts bars per pair, across gaps and recent listings.
+    """
+    tails = [t for t in tails.values() if len(t)]
+    if bars <= 0 or not tails:
+        return as_utc(before)
+    market = np.unique(np.concatenate(tails))
+    recent = market[max(len(market) - bars, 0)]
+    return pd.Timestamp(int(min(t[0] for t in tails if t[-1] >= recent)), tz='UTC')
+
+def _carry_rows(df: pd.DataFrame, bars: int) -> pd.DataFrame:
+    """Rows of `df` the next chunk needs as history.
+
+    That is the last `bars` candles of every pair plus, for cross-pair inputs
+    such as BTC returns, every row since the oldest of those candles among
+    pairs still trading in the last `bars` market dates.
+    """
+    # Input files are date-sorted per pair, so tail() keeps each pair's latest candles
+    tail = df.groupby('pair', observed=True, sort=False).tail(bars)
+    dates = pd.DatetimeIndex(df['date'].unique()).sort_values()
+    recent = dates[-bars] if len(dates) >= bars else dates[0]
+    span = tail.groupby('pair', observed=True)['date'].agg(['min', 'max'])
+    active = span.loc[span['max'] >= recent, 'min']
+    keep = np.zeros(len(df), dtype=bool)
+    if len(active):
+        keep |= (df['date'] >= active.min()).to_numpy()
+    keep[df.index.get_indexer(tail.index)] = True
+    return df.loc[keep]
+
+def _process_streaming(datafolder: Path, timeframe: str, metric_names: List[str], output: Path,
+                       ctx: Dict[str, Any], start: Optional[pd.Timestamp], end: pd.Timestamp,
+                       existing: Optional[pd.DataFrame], cache: Optional[MetricCache], jobs: int,
+                       max_memory: Optional[int], chunk: Optional[str], float32: bool = False,
+                       compact: bool = False, plan: Optional[LoadPlan] = None,
+                       batch_rows: Optional[int] = None) -> None:
+    """Compute metrics chunk by chunk so only one chunk of candles is in memory.
+
+    Each chunk reads only its own bars and is prefixed with the last
+    `lookback` candles of every pair from the previous chunk, so per-pair
+    rolling windows see exactly the history a full run would, gaps included.
+    Cumulative state resumes exactly like a `latest-` run, and rows are
+    written to the output as each chunk finishes. The vol-regime thresholds
+    are taken from the first chunk.
+    """
+    plan = plan or plan_load(metric_names)
+    files = feather_files(datafolder, timeframe, plan.pairs)
+    bars = plan.lookback
+    lookback = bars * timeframe_to_timedelta(timeframe)
+    span = chunk_span(len(files), timeframe, lookback, max_memory, chunk)
+    lo = as_utc(start if start is not None else date_extent(datafolder, timeframe, plan.pairs)[0])
+    fingerprints = cache.fingerprints(files) if cache is not None else None
+    last = ctx.get('resume_after')
+    carry = None
+    prev_end = None
+    with ChunkWriter(output, batch_rows or DEFAULT_BATCH_ROWS) as writer:
+        if existing is not None:
+            writer.write(existing)
+        for chunk_end in chunk_ends(lo, as_utc(end), span):
+            df = load_market(datafolder, timeframe, start=lo if prev_end is None else prev_end, end=chunk_end,
+                             compact=compact, columns=plan.columns, pairs=plan.pairs)
+            if prev_end is not None:
+                df = df[df['date'] > prev_end]
+            prev_end = chunk_end
+            if carry is not None:
+                df = pd.concat([carry, df], ignore_index=True)
+            if df.empty:
+                continue
+            carry = _carry_rows(df, bars)
+
+            cache_inputs = None
+            if cache is not None:
+                cache_inputs = {'timeframe': timeframe, 'start': df['date'].min(), 'end': chunk_end,
+                                'files': fingerprints}
+            ctx['resume_after'] = last
+            with stage('run_metrics'):
+                result = run_metrics(df, metric_names, ctx, cache=cache, cache_inputs=cache_inputs, jobs=jobs,
+                                     float32=float32)
+            del df
+            if last is not None:
+                result = result[result['date'] > last]
+            if result.empty:
+                continue
+            with stage('save', rows=len(result)):
+                writer.write(result)
+            last = pd.Timestamp(result['date'].max())
+    if last is not None:
+        _write_state(output, metric_names, last, ctx.get('state', {}))
 
 def _parse_timerange_bounds(timerange: str) -> Tuple[str, str]:
     """Return raw start,end strings (may include 'latest')."""
@@ -34,7 +405,92 @@ def _parse_timerange_bounds(timerange: str) -> Tuple[str, str]:
         raise ValueError(f"Invalid timerange format: {timerange}")
     return tuple(timerange.split('-', 1))  # type: ignore
 
-def rank_pairs(datafolder: Path, timeframe: str, timerange: str, outputfolder: Path) -> None:
+def _rank_panel(df: pd.DataFrame, existing_last: Dict[str, pd.Timestamp]) -> Optional[MarketPanel]:
+    """Panel of the rows a rank run needs (None when nothing is left to rank)."""
+    # A no-op for frames from load_feathers, whose dates are already canonical
+    df['date'] = to_utc(df['date'])
+
+    # In latest mode each pair restarts 24h before its last written date so the
+    # rolling 24h columns are complete; rows <= that date are dropped on write.
+    if existing_last:
+        rows = TimeIndex.from_frame(df).since({p: last - LOOKBACK for p, last in existing_last.items()})
+        if len(rows) < len(df):
+            df = df.iloc[rows]
+    if df.empty:
+        return None
+    return MarketPanel.from_frame(df)
+
+def latest_rank_start(datafolder: Path, timeframe: str, pairs: List[str], existing_last: Dict[str, pd.Timestamp],
+                      market: Optional[pd.DataFrame] = None) -> Optional[pd.Timestamp]:
+    """First candle a `latest-` rank run of `pairs` has to load (None: all history).
+
+    That is 24h before the oldest last written date; pairs without output
+    yet (new listings) are ranked from their first candle, found in `market`
+    or from the first record batch of their files.
+    """
+    if not existing_last:
+        return None
+    start = min(existing_last.values()) - LOOKBACK
+    new = set(pairs) - set(existing_last)
+    if new:
+        first = (TimeIndex.from_frame(market).first() if market is not None
+                 else dict.fromkeys(new, date_extent(datafolder, timeframe, new)[0]))
+        start = min([start, *(as_utc(first[p]) for p in new)])
+    return start
+
+def _rank_frame(df: pd.DataFrame, existing_last: Dict[str, pd.Timestamp],
+                compact: bool = False) -> Optional[Tuple[MarketPanel, pd.DataFrame]]:
+    """Rank one (possibly chunked) market frame; returns the panel and the
+    pair-major long output frame, or None when nothing is left to rank."""
+    panel = _rank_panel(df, existing_last)
+    del df
+    if panel is None:
+        return None
+    columns = {c: panel[c] for c in ['open', 'high', 'low', 'close', 'volume']}
+    columns.update(compute_ranks(panel))
+    out = panel.to_long(columns)
+    out['pairsCount'] = out['pairsCount'].astype('int64')
+    if compact:
+        out = compact_ranks(out)
+    return panel, out
+
+def compact_ranks(out: pd.DataFrame) -> pd.DataFrame:
+    """Rank output with float32 values, nullable int16 ranks and an int16 pairsCount."""
+    columns = {}
+    for col in out.columns:
+        values = out[col]
+        if col.endswith('Rank'):
+            arr = values.to_numpy(dtype=float)
+            missing = np.isnan(arr)
+            columns[col] = pd.arrays.IntegerArray(np.where(missing, 0, arr).astype(np.int16), missing)
+        elif col == 'pairsCount':
+            columns[col] = values.to_numpy().astype(np.int16)
+        elif values.dtype == np.float64:
+            columns[col] = values.to_numpy().astype(np.float32)
+        else:
+            columns[col] = values
+    return pd.DataFrame(columns, index=out.index)
+
+def _write_ranks(panel: MarketPanel, out: pd.DataFrame, writer: PairWriter, existing_last: Dict[str, pd.Timestamp],
+                 after: Optional[pd.Timestamp] = None) -> None:
+    """Queue each pair's rows (newer than its existing output and `after`) on the writer."""
+    bounds = np.concatenate([[0], np.cumsum(panel.present.sum(axis=0))])
+    for j, pair in enumerate(panel.pairs):
+        g_out = out.iloc[bounds[j]:bounds[j + 1]].drop(columns=['pair']).reset_index(drop=True)
+        # If latest mode with existing file, drop rows with date <= last existing date
+        if pair in existing_last:
+            g_out = g_out[g_out['date'] > existing_last[pair]]
+        if after is not None:
+            g_out = g_out[g_out['date'] > after]
+        if g_out.empty:
+            continue
+        writer.submit(pair, g_out)
+
+def rank_pairs(datafolder: Path, timeframe: str, timerange: str, outputfolder: Path, store: str = 'feather',
+               max_memory: Optional[int] = None, chunk: Optional[str] = None,
+               market: Optional[pd.DataFrame] = None, compact: bool = False,
+               write_workers: int = DEFAULT_WORKERS, compression: Optional[str] = None,
+               compression_level: Optional[int] = None, batch_rows: Optional[int] = None) -> None:
     """Generate per-pair feather files with cross-sectional ranks and stats.
 
     Output columns per pair:
@@ -47,171 +503,187 @@ def rank_pairs(datafolder: Path, timeframe: str, timerange: str, outputfolder: P
     - volumeInCurrency24: rolling 24h sum of volumeInCurrency (time-based)
     - topVolumeRank: rank by volumeInCurrency24 desc (1 = largest)
     - bottomVolumeRank: rank by volumeInCurrency24 asc (1 = smallest)
+
+    The market is pivoted once into a date x pair `MarketPanel` and all
+    columns are computed by `ranking.compute_ranks` in vectorized passes.
+
+    `store` selects the output layout (see `metrex.store`): 'feather' rewrites
+    one file per pair, 'partitioned' appends date-range segments.
+
+    With `max_memory` (bytes) or `chunk` (e.g. '30D') the range is processed
+    in time chunks that each reload the previous 24h, writing as they go.
+
+    `market` is an already loaded (e.g. resampled) long frame to rank instead
+    of reading `datafolder` (single pass only).
+
+    `compact` loads float32 candles and writes float32 values, nullable int16
+    ranks and an int16 pairsCount (see `compact_ranks`).
+
+    Pair files are written by `write_workers` threads (see `metrex.writer`);
+    when streaming, one chunk is written while the next is loaded and
+    ranked. `compression`/`compression_level` override the store's codec and
+    `batch_rows` its rows per indexed record batch.
     """
+    if market is not None and (max_memory is not None or chunk is not None):
+        raise ValueError('A preloaded market cannot be combined with streaming')
     outputfolder = Path(outputfolder)
     outputfolder.mkdir(parents=True, exist_ok=True)
+    out_store = open_store(store, outputfolder, timeframe, compression, compression_level, batch_rows)
+    with PairWriter(out_store, write_workers) as writer:
+        _rank_pairs(datafolder, timeframe, timerange, out_store, writer, max_memory, chunk, market, compact)
 
+def _rank_pairs(datafolder: Path, timeframe: str, timerange: str, out_store, writer: PairWriter,
+                max_memory: Optional[int], chunk: Optional[str], market: Optional[pd.DataFrame],
+                compact: bool) -> None:
+    """Body of `rank_pairs`: ranks the requested range and queues the writes."""
     # Determine timerange handling (supports 'latest-YYYYMMDD')
     start_raw, end_raw = _parse_timerange_bounds(timerange)
-    df_all = load_market(Path(datafolder), timeframe)
-
-    # If start_raw == 'latest', we will compute per-pair dynamic start dates based on existing outputs.
     use_latest = start_raw.lower() == 'latest'
-    end_bound = end_raw
-
-    # Precompute parsed end timestamp (timezone-naive normalized to UTC at midnight)
-    end_ts = pd.to_datetime(end_bound, format='%Y%m%d')
-    end_ts = end_ts.tz_localize('UTC') if end_ts.tzinfo is None else end_ts
-
-    # Normalize date column
-    df_all['date'] = pd.to_datetime(df_all['date'])
-    # If any rows are tz-aware, convert all to UTC; else localize to UTC for uniformity
-    if df_all['date'].dt.tz is not None:
-        df_all['date'] = df_all['date'].dt.tz_convert('UTC')
-    else:
-        df_all['date'] = df_all['date'].dt.tz_localize('UTC')
+    end_ts = pd.to_datetime(end_raw, format='%Y%m%d').tz_localize('UTC')
+    load_start = None if use_latest else pd.to_datetime(start_raw, format='%Y%m%d').tz_localize('UTC')
 
-    # Build per-pair start date map
-    pair_start_map: Dict[str, pd.Timestamp] = {}
-    lookback_hours = 24
-    lookback_delta = pd.Timedelta(hours=lookback_hours)
+    existing_last = {}
     if use_latest:
-        # For each pair, inspect existing output file (if any) to find last date
-        for pair in df_all['pair'].unique():
-            out_file = outputfolder / f"{pair}-{timeframe}.feather"
-            if out_file.exists():
-                try:
-                    existing = pd.read_feather(out_file)
-                    if 'date' not in existing.columns or existing.empty:
-                        continue
-                    existing['date'] = pd.to_datetime(existing['date'])
-                    # Normalize existing to UTC
-                    if existing['date'].dt.tz is None:
-                        existing['date'] = existing['date'].dt.tz_localize('UTC')
-                    else:
-                        existing['date'] = existing['date'].dt.tz_convert('UTC')
-                    last_date = existing['date'].max()
-                    # Start from (last_date - lookback) to compute correct rolling metrics; we'll drop <= last_date later
-                    pair_start_map[pair] = last_date - lookback_delta
-                except Exception:
-                    continue
-        # If file missing, we set later to first available date per pair
-    else:
-        start_ts = pd.to_datetime(start_raw, format='%Y%m%d')
-        start_ts = start_ts.tz_localize('UTC') if start_ts.tzinfo is None else start_ts
-        for pair in df_all['pair'].unique():
-            pair_start_map[pair] = start_ts
-
-    # Filter df_all into df respecting per-pair starts
-    filtered_frames = []
-    for pair, g in df_all.groupby('pair'):
-        if use_latest:
-            start_ts = pair_start_map.get(pair)
-            if start_ts is None:
-                start_ts = g['date'].min()
-                pair_start_map[pair] = start_ts
+        if market is not None:
+            pairs = [str(p) for p in market['pair'].unique()]
         else:
-            start_ts = pair_start_map[pair]
-        # Ensure same tz
-        if start_ts.tzinfo is None:
-            start_ts = start_ts.tz_localize('UTC')
-        mask = (g['date'] >= start_ts) & (g['date'] <= end_ts)
-        sub = g.loc[mask]
-        if not sub.empty:
-            filtered_frames.append(sub)
-    if not filtered_frames:
-        return  # Nothing new to process
-    df = pd.concat(filtered_frames, ignore_index=True)
+            pairs = [f.stem.split('-')[0] for f in feather_files(datafolder, timeframe)]
+        existing_last = out_store.last_dates(pairs)
+        load_start = latest_rank_start(datafolder, timeframe, pairs, existing_last, market)
 
-    if df.empty:
-        raise ValueError("No data after filtering by timerange.")
-
-    # Ensure proper dtypes and sorting
-    df = df.copy()
-    df['date'] = pd.to_datetime(df['date'])
-    if df['date'].dt.tz is None:
-        df['date'] = df['date'].dt.tz_localize('UTC')
-    df = df.sort_values(['date', 'pair']).reset_index(drop=True)
-
-    # pairsCount per date
-    pairs_count_map = df.groupby('date')['pair'].nunique()
-    df['pairsCount'] = df['date'].map(pairs_count_map)
-
-    # 24h change: compute prior close exactly 24h earlier via self-merge
-    close_prev = df[['pair', 'date', 'close']].copy()
-    close_prev['date'] = close_prev['date'] + pd.Timedelta(hours=24)
-    close_prev = close_prev.rename(columns={'close': 'close_prev_24h'})
-    df = df.merge(close_prev, on=['pair', 'date'], how='left')
-    df['changePercentage24h'] = ((df['close'] - df['close_prev_24h']) / df['close_prev_24h']) * 100.0
-
-    # Volume in currency and its 24h rolling sum per pair (time-based window)
-    df['volumeInCurrency'] = df['volume'] * df['close']
-
-    def _calc_vic24(g: pd.DataFrame) -> pd.DataFrame:
-        g = g.sort_values('date').set_index('date')
-        # Use time-based window to cover any timeframe (1h/4h/1d)
-        vic24 = g['volumeInCurrency'].rolling('24H').sum()
-        g['volumeInCurrency24'] = vic24
-        return g.reset_index()
-
-    df = df.groupby('pair', group_keys=False).apply(_calc_vic24)
-
-    # Cross-sectional ranks per date
-    # Rank by changePercentage24h
-    df['topGainerRank'] = df.groupby('date')['changePercentage24h'].rank(ascending=False, method='min')
-    df['topLooserRank'] = df.groupby('date')['changePercentage24h'].rank(ascending=True, method='min')
-
-    # Rank by volumeInCurrency24
-    df['topVolumeRank'] = df.groupby('date')['volumeInCurrency24'].rank(ascending=False, method='min')
-    df['bottomVolumeRank'] = df.groupby('date')['volumeInCurrency24'].rank(ascending=True, method='min')
-
-    # Select and order columns
-    out_cols = [
-        'date', 'pair', 'open', 'high', 'low', 'close', 'volume',
-        'pairsCount', 'changePercentage24h', 'topGainerRank', 'topLooserRank',
-        'volumeInCurrency', 'volumeInCurrency24', 'topVolumeRank', 'bottomVolumeRank'
-    ]
-    df = df[out_cols]
-
-    # Write per-pair outputs (append logic, avoiding duplicates)
-    for pair, g in df.groupby('pair'):
-        out_path = outputfolder / f"{pair}-{timeframe}.feather"
-        g_out = g.drop(columns=['pair']).copy()
-        # If latest mode with existing file, drop rows with date <= last existing date
-        if use_latest:
-            existing_last: Optional[pd.Timestamp] = None
-            if (pair in pair_start_map) and (pair_start_map[pair] is not None):
-                # pair_start_map[pair] stored (last_existing - lookback) for latest case, so recover last_existing
-                existing_last = pair_start_map[pair] + lookback_delta
-            if existing_last is not None:
-                g_out = g_out[g_out['date'] > existing_last]
-                if g_out.empty:
-                    continue
-        if out_path.exists():
-            try:
-                existing = pd.read_feather(out_path)
-                if 'date' in existing.columns:
-                    existing['date'] = pd.to_datetime(existing['date'])
-                    if existing['date'].dt.tz is None:
-                        existing['date'] = existing['date'].dt.tz_localize('UTC')
-                    else:
-                        existing['date'] = existing['date'].dt.tz_convert('UTC')
-                    g_out['date'] = pd.to_datetime(g_out['date'])
-                    if g_out['date'].dt.tz is None:
-                        g_out['date'] = g_out['date'].dt.tz_localize('UTC')
-                    else:
-                        g_out['date'] = g_out['date'].dt.tz_convert('UTC')
-                    # Exclude any rows in g_out with dates already present
-                    existing_dates = set(existing['date'].astype('int64'))
-                    g_out = g_out[~g_out['date'].astype('int64').isin(existing_dates)]
-                    if g_out.empty:
-                        continue
-                    combined = pd.concat([existing, g_out], ignore_index=True)
-                    combined = combined.drop_duplicates(subset=['date']).sort_values('date')
-                else:
-                    combined = g_out
-            except Exception:
-                combined = g_out
-            save(combined, out_path)
+    if max_memory is None and chunk is None:
+        if market is not None:
+            df = _slice_market(market, load_start, end_ts)
         else:
-            save(g_out, out_path)
+            df = load_market(Path(datafolder), timeframe, start=load_start, end=end_ts, compact=compact)
+        with stage('rank', rows=len(df)):
+            ranked = _rank_frame(df, existing_last, compact)
+        del df
+        if ranked is None:
+            return  # Nothing new to process
+        with stage('write', rows=len(ranked[1])):
+            _write_ranks(*ranked, writer, existing_last)
+            writer.wait()
+            out_store.flush()
+        return
+
+    files = feather_files(datafolder, timeframe)
+    lo = as_utc(load_start if load_start is not None else date_extent(datafolder, timeframe)[0])
+    span = chunk_span(len(files), timeframe, LOOKBACK, max_memory, chunk)
+    last = None
+    for chunk_end in chunk_ends(lo, end_ts, span):
+        load_lo = lo if last is None else max(lo, last - LOOKBACK)
+        df = load_market(Path(datafolder), timeframe, start=load_lo, end=chunk_end, compact=compact)
+        with stage('rank', rows=len(df)):
+            ranked = _rank_frame(df, existing_last, compact)
+        del df
+        if ranked is not None:
+            with stage('write', rows=len(ranked[1])):
+                # The previous chunk was written while this one was loaded and ranked
+                writer.wait()
+                out_store.flush()
+                _write_ranks(*ranked, writer, existing_last, after=last)
+        last = chunk_end
+    with stage('write'):
+        writer.wait()
+        out_store.flush()
+
+def _slice_market(market: pd.DataFrame, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> pd.DataFrame:
+    """Copy of the rows of a preloaded market within [start, end]."""
+    return market.iloc[TimeIndex.from_frame(market).between(start, end)].reset_index(drop=True)
+
+# Multi-timeframe runs: base candles are loaded once and resampled
+
+def timeframe_output(output: Path, timeframe: str) -> Path:
+    """Per-timeframe output path: `{timeframe}` in `output` is filled in,
+    otherwise `-{timeframe}` is added before the extension."""
+    output = Path(output)
+    if '{timeframe}' in str(output):
+        return Path(str(output).format(timeframe=timeframe))
+    return output.with_name(f"{output.stem}-{timeframe}{output.suffix}")
+
+def load_resampled(datafolder: Path, base_timeframe: str, timeframes: List[str],
+                   start: Optional[pd.Timestamp] = None, end: Optional[pd.Timestamp] = None,
+                   compact: bool = False, plan: Optional[LoadPlan] = None) -> Dict[str, pd.DataFrame]:
+    """Load `base_timeframe` candles once and resample them to each of `timeframes`.
+
+    The base range is widened to whole candles of the largest timeframe, so
+    the first and last target candles inside [start, end] are complete. A
+    `plan` restricts the pairs and columns read.
+    """
+    widest = max(timeframes, key=timeframe_key)
+    if start is not None:
+        ns = np.array([as_utc(start).value])
+        start = pd.Timestamp(int(bucket_starts(ns, widest)[0]), tz='UTC')
+    if end is not None:
+        ns = np.array([as_utc(end).value])
+        end = pd.Timestamp(int(bucket_ends(bucket_starts(ns, widest), widest)[0]), tz='UTC')
+        end -= timeframe_to_timedelta(base_timeframe)
+    columns, pairs = (None, None) if plan is None else (plan.columns, plan.pairs)
+    df = load_market(datafolder, base_timeframe, start=start, end=end, compact=compact, columns=columns, pairs=pairs)
+    with stage('resample', rows=len(df)):
+        frames = resample_ohlcv(df, base_timeframe, timeframes)
+    if compact:
+        for frame in frames.values():
+            for col in frame.columns.intersection(PRICE_COLUMNS):
+                frame[col] = frame[col].astype(np.float32)
+    return frames
+
+def _metrics_resume_start(datafolder: Path, base_timeframe: str, output: Path, metric_names: List[str],
+                          timeframe: str) -> Optional[pd.Timestamp]:
+    """First candle a `latest-` run of `process` will read (None: all history)."""
+    checkpoint = _read_state(output)
+    if not (Path(output).exists() and checkpoint and checkpoint.get('metrics') == list(metric_names)):
+        return None
+    last = pd.Timestamp(checkpoint['last_date'])
+    plan = plan_load(metric_names)
+    tails = tail_dates(datafolder, base_timeframe, last, plan.lookback, plan.pairs,
+                       to_bars=lambda ns: bucket_starts(ns, timeframe))
+    return lookback_start(tails, plan.lookback, last)
+
+def process_timeframes(datafolder: Path, base_timeframe: str, timeframes: List[str], timerange: str,
+                       metric_names: List[str], output: Path, ctx: Optional[Dict[str, Any]] = None,
+                       jobs: int = 1, float32: bool = False, compact: bool = False,
+                       batch_rows: Optional[int] = None) -> Dict[str, Path]:
+    """`process` for several timeframes derived from one load of base candles.
+
+    Outputs go to `timeframe_output(output, tf)`; returns them by timeframe.
+    """
+    outputs = {tf: timeframe_output(output, tf) for tf in timeframes}
+    start_raw, end_raw = _parse_timerange_bounds(timerange)
+    if start_raw.lower() == 'latest':
+        starts = [_metrics_resume_start(datafolder, base_timeframe, outputs[tf], metric_names, tf) for tf in timeframes]
+        start = None if any(s is None for s in starts) else min(starts)
+    else:
+        start = parse_date(start_raw)
+    frames = load_resampled(datafolder, base_timeframe, timeframes, start, parse_date(end_raw), compact,
+                            plan_load(metric_names))
+    for tf in timeframes:
+        with stage(f'timeframe:{tf}'):
+            process(datafolder, tf, timerange, metric_names, outputs[tf], ctx=ctx, jobs=jobs, market=frames.pop(tf),
+                    float32=float32, compact=compact, batch_rows=batch_rows)
+    return outputs
+
+def rank_timeframes(datafolder: Path, base_timeframe: str, timeframes: List[str], timerange: str,
+                    outputfolder: Path, store: str = 'feather', compact: bool = False,
+                    write_workers: int = DEFAULT_WORKERS, compression: Optional[str] = None,
+                    compression_level: Optional[int] = None, batch_rows: Optional[int] = None) -> None:
+    """`rank_pairs` for several timeframes derived from one load of base candles.
+
+    Each timeframe's files carry its own suffix, so they share `outputfolder`.
+    """
+    start_raw, end_raw = _parse_timerange_bounds(timerange)
+    start = None
+    if start_raw.lower() != 'latest':
+        start = parse_date(start_raw)
+    else:
+        pairs = [f.stem.split('-')[0] for f in feather_files(datafolder, base_timeframe)]
+        lasts = [open_store(store, Path(outputfolder), tf).last_dates(pairs) for tf in timeframes]
+        if all(len(last) == len(set(pairs)) for last in lasts):
+            start = min(min(last.values()) for last in lasts) - LOOKBACK
+    frames = load_resampled(datafolder, base_timeframe, timeframes, start, parse_date(end_raw), compact)
+    for tf in timeframes:
+        with stage(f'timeframe:{tf}'):
+            rank_pairs(datafolder, tf, timerange, outputfolder, store=store, market=frames.pop(tf), compact=compact,
+                       write_workers=write_workers, compression=compression, compression_level=compression_level,
+                       batch_rows=batch_rows)
@@ -0,0 +1,131 @@
+"""
+Per-stage profiling of metrics and rank runs.
+
+Pipeline code marks its stages with `stage(name)`; this is a no-op unless a
+`Profiler` is active (see `profile`). Each stage records wall and CPU time,
+rows processed and the process's peak RSS when it finished; nested stages
+are named by their path (e.g. `run_metrics/metric:adv_decline`). Stages
+matching a `cprofile` pattern are also run under cProfile, and their stats
+are dumped as `.prof` files.
+
+    with profile('run.json', cprofile=['run_metrics/metric:*']):
+        process(...)
+"""
+import cProfile
+import fnmatch
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active: Optional['Profiler'] = None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of this process's resident set size, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+class Profiler:
+    """Collects stage records; optionally cProfiles stages matching `cprofile`."""
+
+    def __init__(self, cprofile: Sequence[str] = (), cprofile_dir: Optional[Path] = None):
+        self.cprofile = list(cprofile)
+        self.cprofile_dir = Path(cprofile_dir) if cprofile_dir is not None else Path('.')
+        self.records: List[Dict[str, Any]] = []
+        self._stack: List[str] = []
+        self._profiling = False
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Time the enclosed block; set `record['rows']` inside it if not known upfront."""
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        record: Dict[str, Any] = {'stage': path, 'rows': rows}
+        prof = None
+        # cProfile cannot nest, so only the outermost matching stage is profiled
+        if not self._profiling and any(fnmatch.fnmatchcase(path, p) for p in self.cprofile):
+            prof = cProfile.Profile()
+            self._profiling = True
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            if prof is not None:
+                prof.enable()
+            yield record
+        finally:
+            if prof is not None:
+                prof.disable()
+            record['start_s'] = wall - self._start
+            record['wall_s'] = time.perf_counter() - wall
+            record['cpu_s'] = time.process_time() - cpu
+            record['peak_rss_mb'] = peak_rss_mb()
+            if prof is not None:
+                self._profiling = False
+                self.cprofile_dir.mkdir(parents=True, exist_ok=True)
+                out = self.cprofile_dir / (path.replace('/', '.').replace(':', '-') + f'.{len(self.records)}.prof')
+                prof.dump_stats(out)
+                record['cprofile'] = str(out)
+            self.records.append(record)
+            self._stack.pop()
+
+    def totals(self) -> Dict[str, Dict[str, Any]]:
+        """Records summed by stage path (stages repeat when streaming chunks)."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for r in self.records:
+            t = out.setdefault(r['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0})
+            t['count'] += 1
+            t['wall_s'] += r['wall_s']
+            t['cpu_s'] += r['cpu_s']
+            t['rows'] += r['rows'] or 0
+        return out
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'wall_s': time.perf_counter() - self._start,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': sorted(self.records, key=lambda r: r['start_s']),
+            'totals': self.totals(),
+        }
+
+    def write(self, path: Path) -> None:
+        Path(path).write_text(json.dumps(self.report(), indent=2))
+
+
+@contextmanager
+def profile(output: Optional[Path] = None, cprofile: Sequence[str] = ()) -> Iterator[Profiler]:
+    """Activate a `Profiler` for the enclosed block; write its JSON report to `output`.
+
+    cProfile dumps go next to `output` (or the working directory).
+    """
+    global _active
+    prof_dir = Path(output).parent if output is not None else None
+    profiler = Profiler(cprofile, prof_dir)
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+        if output is not None:
+            profiler.write(output)
+
+
+@contextmanager
+def stage(name: str, rows: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Record a stage on the active profiler (a no-op without one)."""
+    if _active is None:
+        yield {}
+        return
+    with _active.stage(name, rows) as record:
+        yield record
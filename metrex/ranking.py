@@ -0,0 +1,153 @@
+"""
+Vectorized cross-sectional ranking engine used by `processor.rank_pairs`.
+
+Everything runs on a `MarketPanel` (date x pair arrays): the 24h lag is a
+row offset into the date grid, rolling 24h sums are differences of
+cumulative sums, and all ranks come from a single row-wise sort.
+
+Only the ranks and `pairsCount` are cross-sectional; `pair_features` depend
+on each pair's own candles. `gather_ranks` computes the cross-sectional
+columns from long per-row features instead, which is what sharded runs
+(`metrex.sharding`) use after computing features per subset of pairs.
+"""
+from typing import Dict
+import numpy as np
+import pandas as pd
+from .panel import MarketPanel
+
+LOOKBACK = pd.Timedelta(hours=24)
+
+# Output column order after date/OHLCV
+RANK_COLUMNS = [
+    'pairsCount', 'changePercentage24h', 'topGainerRank', 'topLooserRank',
+    'volumeInCurrency', 'volumeInCurrency24', 'topVolumeRank', 'bottomVolumeRank',
+]
+
+
+def lag_rows(dates: pd.Index, delta: pd.Timedelta, side: str) -> np.ndarray:
+    """Row index of `date - delta` in a sorted date grid.
+
+    With side='left' this is the row exactly `delta` earlier (or -1 when that
+    date is not on the grid); with side='right' it is the first row strictly
+    after `date - delta`. On a gap-free grid both equal a fixed shift of
+    delta / timeframe rows.
+    """
+    target = dates - delta
+    idx = dates.searchsorted(target, side=side)
+    if side == 'left':
+        hit = idx < len(dates)
+        hit[hit] = dates[idx[hit]] == target[hit]
+        idx = np.where(hit, idx, -1)
+    return idx
+
+
+def rowwise_min_rank(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """Ascending and descending `method='min'` ranks along the last axis.
+
+    Accepts a stack of (T, N) matrices so several quantities are ranked in one
+    sort. NaN stays NaN, matching `groupby('date').rank(method='min')`.
+    """
+    order = np.argsort(values, axis=-1, kind='stable')
+    s = np.take_along_axis(values, order, axis=-1)
+    n = values.shape[-1]
+    pos = np.broadcast_to(np.arange(n), s.shape)
+    # First/last sorted position of each run of equal values
+    new_run = np.ones(s.shape, dtype=bool)
+    new_run[..., 1:] = s[..., 1:] != s[..., :-1]
+    first = np.maximum.accumulate(np.where(new_run, pos, 0), axis=-1)
+    end_run = np.ones(s.shape, dtype=bool)
+    end_run[..., :-1] = s[..., :-1] != s[..., 1:]
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(end_run, pos, n), axis=-1), axis=-1), axis=-1)
+    n_valid = (~np.isnan(values)).sum(axis=-1, keepdims=True)
+    asc = np.empty(values.shape)
+    desc = np.empty(values.shape)
+    np.put_along_axis(asc, order, first + 1.0, axis=-1)
+    np.put_along_axis(desc, order, (n_valid - last).astype(float), axis=-1)
+    nan = np.isnan(values)
+    asc[nan] = np.nan
+    desc[nan] = np.nan
+    return {'asc': asc, 'desc': desc}
+
+
+def rolling_time_sum(panel: MarketPanel, arr: np.ndarray, window: pd.Timedelta) -> np.ndarray:
+    """Per-pair sum over (date - window, date], like `rolling('24h').sum()`.
+
+    Uses cumulative sums in extended precision to keep window differences
+    accurate on long histories. Windows without any valid value are NaN.
+    """
+    valid = ~np.isnan(arr)
+    zero = np.zeros((1, arr.shape[1]))
+    cs = np.concatenate([zero, np.cumsum(np.where(valid, arr, 0.0), axis=0, dtype=np.longdouble)])
+    cnt = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    start = lag_rows(panel.dates, window, side='right')
+    end = np.arange(1, len(panel.dates) + 1)
+    total = (cs[end] - cs[start]).astype(float)
+    count = cnt[end] - cnt[start]
+    total[count == 0] = np.nan
+    total[~panel.present] = np.nan
+    return total
+
+
+def pair_features(panel: MarketPanel) -> Dict[str, np.ndarray]:
+    """Per-pair columns (24h change, volume in currency and its 24h sum) as
+    (T, N) arrays; each pair's values depend only on its own candles."""
+    close = panel.close
+    out: Dict[str, np.ndarray] = {}
+    lag = lag_rows(panel.dates, LOOKBACK, side='left')
+    prev = np.full(panel.shape, np.nan)
+    has_lag = lag >= 0
+    prev[has_lag] = close[lag[has_lag]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = ((close - prev) / prev) * 100.0
+    vic = panel.volume * close
+    vic24 = rolling_time_sum(panel, vic, LOOKBACK)
+    out['changePercentage24h'] = change
+    out['volumeInCurrency'] = vic
+    out['volumeInCurrency24'] = vic24
+    return out
+
+
+def compute_ranks(panel: MarketPanel) -> Dict[str, np.ndarray]:
+    """All rank output columns as (T, N) arrays aligned to `panel`."""
+    out = pair_features(panel)
+    out['pairsCount'] = np.broadcast_to(panel.present.sum(axis=1)[:, None], panel.shape)
+    ranks = rowwise_min_rank(np.stack([out['changePercentage24h'], out['volumeInCurrency24']]))
+    out['topGainerRank'] = ranks['desc'][0]
+    out['topLooserRank'] = ranks['asc'][0]
+    out['topVolumeRank'] = ranks['desc'][1]
+    out['bottomVolumeRank'] = ranks['asc'][1]
+    return {c: out[c] for c in RANK_COLUMNS}
+
+
+def gather_ranks(dates: np.ndarray, change: np.ndarray, vic24: np.ndarray,
+                 block: int = 4096) -> Dict[str, np.ndarray]:
+    """`pairsCount` and the four ranks for long rows with epoch-ns `dates`.
+
+    Equal to `compute_ranks` for the same rows, whichever order or process
+    they come from: every row present at a date counts and is ranked. Each
+    `block` of dates is scattered into a (date, slot) grid padded with NaN
+    and ranked with `rowwise_min_rank`, like a panel, so the sort's scratch
+    memory does not grow with the history.
+    """
+    _, row, counts = np.unique(dates, return_inverse=True, return_counts=True)
+    by_date = np.argsort(row, kind='stable')
+    starts = np.r_[0, np.cumsum(counts)]
+    # Slot of each row among the rows of its date
+    slot = np.empty(len(row), dtype=np.int64)
+    slot[by_date] = np.arange(len(row)) - np.repeat(starts[:-1], counts)
+    out = {'pairsCount': counts[row].astype(np.int64)}
+    for c in ('topGainerRank', 'topLooserRank', 'topVolumeRank', 'bottomVolumeRank'):
+        out[c] = np.empty(len(row))
+    for lo in range(0, len(counts), block):
+        hi = min(lo + block, len(counts))
+        rows = by_date[starts[lo]:starts[hi]]
+        r, k = row[rows] - lo, slot[rows]
+        grid = np.full((2, hi - lo, counts[lo:hi].max()), np.nan)
+        grid[0, r, k] = change[rows]
+        grid[1, r, k] = vic24[rows]
+        ranks = rowwise_min_rank(grid)
+        out['topGainerRank'][rows] = ranks['desc'][0][r, k]
+        out['topLooserRank'][rows] = ranks['asc'][0][r, k]
+        out['topVolumeRank'][rows] = ranks['desc'][1][r, k]
+        out['bottomVolumeRank'][rows] = ranks['asc'][1][r, k]
+    return out
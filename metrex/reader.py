@@ -0,0 +1,244 @@
+"""
+Indexed random-access reads of metric and rank outputs.
+
+Feather outputs are Arrow IPC files written in record batches (`io.save`,
+`--batch-rows`) whose row counts and min/max dates are kept in the schema
+metadata. `read` consults that index, memory-maps the file and decodes only
+the batches overlapping the query, and only the requested columns:
+
+    import metrex
+    metrex.read('results/market_metrics.feather', start='2024-03-01', end='2024-03-07')
+    metrex.read('results', pair='BTC_USDT', timeframe='1m', last=500)
+    metrex.read('results', pair='BTC_USDT', timeframe='1m', asof='2024-03-01 12:00')
+
+Feather files without the index (outputs of older releases or of streamed
+`--chunk` runs) are indexed on the fly from their `date` column alone.
+Parquet row groups are chosen from their date statistics; csv is read whole.
+Partitioned rank outputs first pick segments from the manifest. Outputs are
+date-sorted, as metrex writes them; `last` relies on that.
+"""
+import json
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .io import INDEX_KEY, load
+from .store import FeatherStore, PartitionedStore
+from .timeutils import as_utc, epoch_ns
+
+Date = Union[None, str, pd.Timestamp]
+
+
+class BatchIndex(NamedTuple):
+    """Rows and min/max epoch-ns date of each record batch (or row group)."""
+    rows: np.ndarray
+    lo: np.ndarray
+    hi: np.ndarray
+
+    def select(self, start: Optional[int], end: Optional[int]) -> np.ndarray:
+        """Batches that can hold dates in [start, end]."""
+        keep = self.rows > 0
+        if start is not None:
+            keep &= self.hi >= start
+        if end is not None:
+            keep &= self.lo <= end
+        return np.flatnonzero(keep)
+
+
+def _ns(ts: Date) -> Optional[int]:
+    return None if ts is None else as_utc(pd.Timestamp(ts)).value
+
+
+def _date_ns(column: Union[pa.Array, pa.ChunkedArray]) -> np.ndarray:
+    # Naive dates are taken as UTC, like everywhere else
+    return epoch_ns(column.to_pandas())
+
+
+class _File:
+    """An open output file; closes its handle when used as a context manager."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class _FeatherFile(_File):
+    def __init__(self, path: Path):
+        self.source = pa.memory_map(str(path))
+        try:
+            self.reader = pa.ipc.open_file(self.source)
+        except Exception:
+            self.source.close()
+            raise
+        self.schema = self.reader.schema
+
+    def close(self) -> None:
+        # Tables read from the map keep its pages alive until they are freed
+        self.source.close()
+
+    def index(self) -> BatchIndex:
+        meta = (self.schema.metadata or {}).get(INDEX_KEY)
+        if meta is not None:
+            index = json.loads(meta)
+            if len(index['rows']) == self.reader.num_record_batches:
+                return BatchIndex(*(np.asarray(index[k], dtype=np.int64) for k in ('rows', 'min', 'max')))
+        # No stored index: decode only the date column of every batch
+        dates = pa.ipc.open_file(self.source, options=pa.ipc.IpcReadOptions(
+            included_fields=[self.schema.get_field_index('date')]))
+        rows, lo, hi = [], [], []
+        for i in range(dates.num_record_batches):
+            ns = _date_ns(dates.get_batch(i).column(0))
+            rows.append(len(ns))
+            lo.append(ns.min() if len(ns) else 0)
+            hi.append(ns.max() if len(ns) else 0)
+        return BatchIndex(np.asarray(rows, dtype=np.int64), np.asarray(lo, dtype=np.int64),
+                          np.asarray(hi, dtype=np.int64))
+
+    def batches(self, ids: Sequence[int], columns: Optional[List[str]]) -> pa.Table:
+        reader = self.reader
+        if columns is not None:
+            fields = [self.schema.get_field_index(c) for c in columns]
+            reader = pa.ipc.open_file(self.source, options=pa.ipc.IpcReadOptions(included_fields=sorted(fields)))
+        schema = reader.schema if len(ids) else self.schema
+        table = pa.Table.from_batches([reader.get_batch(int(i)) for i in ids], schema=schema)
+        return table if columns is None else table.select(columns)
+
+
+class _ParquetFile(_File):
+    def __init__(self, path: Path):
+        import pyarrow.parquet as pq
+        self.file = pq.ParquetFile(str(path))
+        self.schema = self.file.schema_arrow
+
+    def close(self) -> None:
+        self.file.close()
+
+    def index(self) -> BatchIndex:
+        meta = self.file.metadata
+        col = self.schema.get_field_index('date')
+        rows, lo, hi = [], [], []
+        for i in range(meta.num_row_groups):
+            group = meta.row_group(i)
+            stats = group.column(col).statistics
+            rows.append(group.num_rows)
+            if stats is not None and stats.has_min_max:
+                lo.append(_ns(stats.min))
+                hi.append(_ns(stats.max))
+            else:
+                # No statistics: never skipped
+                lo.append(np.iinfo(np.int64).min)
+                hi.append(np.iinfo(np.int64).max)
+        return BatchIndex(np.asarray(rows, dtype=np.int64), np.asarray(lo, dtype=np.int64),
+                          np.asarray(hi, dtype=np.int64))
+
+    def batches(self, ids: Sequence[int], columns: Optional[List[str]]) -> pa.Table:
+        return self.file.read_row_groups([int(i) for i in ids], columns=columns)
+
+
+def _open(path: Path):
+    ext = str(path).split('.')[-1]
+    if ext == 'feather':
+        return _FeatherFile(path)
+    if ext == 'parquet':
+        return _ParquetFile(path)
+    return None
+
+
+def _filter(table: pa.Table, start: Optional[int], end: Optional[int]) -> pa.Table:
+    ns = _date_ns(table.column('date'))
+    keep = np.ones(len(ns), dtype=bool)
+    if start is not None:
+        keep &= ns >= start
+    if end is not None:
+        keep &= ns <= end
+    return table if keep.all() else table.filter(pa.array(keep))
+
+
+def _tail(table: pa.Table, last: Optional[int]) -> pa.Table:
+    return table.slice(len(table) - last) if last is not None and len(table) > last else table
+
+
+def _read_file(path: Path, start: Optional[int], end: Optional[int], last: Optional[int],
+               columns: Optional[List[str]]) -> pa.Table:
+    """Rows of one file with start <= date <= end (the newest `last` of them)."""
+    f = _open(path)
+    if f is None:
+        table = pa.Table.from_pandas(load(path), preserve_index=False)
+        return _tail(_filter(table if columns is None else table.select(columns), start, end), last)
+    with f:
+        ids = f.index().select(start, end)
+        if last is None:
+            return _filter(f.batches(ids, columns), start, end)
+        # Newest batches first, until `last` rows in range are found
+        tables, rows = [], 0
+        for i in ids[::-1]:
+            if rows >= last:
+                break
+            tables.append(_filter(f.batches([i], columns), start, end))
+            rows += len(tables[-1])
+        if not tables:
+            return f.batches([], columns)
+        return _tail(pa.concat_tables(tables[::-1]), last)
+
+
+def read(path: Path, start: Date = None, end: Date = None, *, last: Optional[int] = None,
+         asof: Date = None, columns: Optional[Sequence[str]] = None, pair: Optional[str] = None,
+         timeframe: Optional[str] = None) -> pd.DataFrame:
+    """Rows of a metrics or rank output with `start <= date <= end`.
+
+    `path` is an output file, or a rank output folder together with `pair`
+    and `timeframe` (either store layout). `last` keeps only the newest
+    `last` rows of the range; `asof` is the single newest row at or before
+    that date (empty if there is none). `columns` limits the columns read
+    (`date` is always included). Naive dates are taken as UTC.
+    """
+    if asof is not None:
+        if end is not None or last is not None:
+            raise ValueError('asof cannot be combined with end or last')
+        end, last = asof, 1
+    if last is not None and last < 0:
+        raise ValueError(f"last must not be negative, got {last}")
+    if columns is not None:
+        columns = ['date'] + [c for c in columns if c != 'date']
+    lo, hi = _ns(start), _ns(end)
+    path = Path(path)
+    if path.is_dir():
+        if pair is None or timeframe is None:
+            raise ValueError('Reading a rank output folder needs pair and timeframe')
+        table = _read_pair(path, pair, timeframe, lo, hi, last, columns)
+    else:
+        table = _read_file(path, lo, hi, last, columns)
+    # Copies out of the memory maps, which are unmapped once `table` is freed
+    return table.to_pandas()
+
+
+def _read_pair(folder: Path, pair: str, timeframe: str, start: Optional[int], end: Optional[int],
+               last: Optional[int], columns: Optional[List[str]]) -> pa.Table:
+    store = PartitionedStore(folder, timeframe)
+    if pair not in store.manifest:
+        path = FeatherStore(folder, timeframe).path(pair)
+        if not path.exists():
+            raise FileNotFoundError(f"No {timeframe} rank output for {pair} in {folder}")
+        return _read_file(path, start, end, last, columns)
+    segments = [s for s in store.segments(pair)
+                if (start is None or _ns(s['end']) >= start) and (end is None or _ns(s['start']) <= end)]
+    if not segments or last == 0:
+        # Nothing to read: any segment gives the empty frame its columns
+        return _read_file(store.pair_dir(pair) / store.segments(pair)[0]['file'], start, end, last, columns)
+    segments.sort(key=lambda s: _ns(s['end']), reverse=True)
+    tables, rows = [], 0
+    for s in segments:
+        if last is not None and rows >= last:
+            break
+        tables.append(_read_file(store.pair_dir(pair) / s['file'], start, end, last, columns))
+        rows += len(tables[-1])
+    # Segments written with and without --compact differ in numeric types
+    table = pa.concat_tables(tables[::-1], promote_options='permissive')
+    order = np.argsort(_date_ns(table.column('date')), kind='stable')
+    return _tail(table.take(pa.array(order)), last)
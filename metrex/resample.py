@@ -0,0 +1,145 @@
+"""
+OHLCV resampling from base candles to higher timeframes.
+
+`resample_ohlcv` turns one long `date, pair, ohlcv` frame (as returned by
+`io.load_feathers`) into frames for several target timeframes at once. Every
+target is aggregated with `reduceat` over bucket boundaries of all pairs in
+one vectorized pass, and from the largest already-built timeframe that tiles
+it (1h from 5m rather than from 1m), so the cost shrinks with each level.
+
+Buckets follow exchange conventions: minutes/hours/days are aligned to the
+Unix epoch, weeks start on Monday 00:00 UTC and months on the 1st. As in a
+pandas `resample().agg(first/max/min/last/sum)`, NaN values are skipped. A
+pair's trailing bucket that its base candles do not yet cover completely is
+dropped unless `partial=True`.
+"""
+from typing import Dict, Iterable, Tuple
+import re
+import numpy as np
+import pandas as pd
+from .panel import PRICE_COLUMNS
+from .timeutils import UTC_DTYPE, epoch_ns, timeframe_to_timedelta
+
+_DAY = pd.Timedelta(days=1).value
+_WEEK = pd.Timedelta(weeks=1).value
+# 1970-01-01 was a Thursday; the first Monday is 4 days later
+_MONDAY = 4 * _DAY
+
+
+def _unit(timeframe: str) -> str:
+    m = re.fullmatch(r'(\d+)([mhdwM])', timeframe)
+    if not m:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    return m.group(2)
+
+
+def bucket_starts(dates: np.ndarray, timeframe: str) -> np.ndarray:
+    """Open time (epoch ns) of the `timeframe` candle containing each date (epoch ns)."""
+    unit = _unit(timeframe)
+    if unit == 'M':
+        n = int(timeframe[:-1])
+        months = dates.astype('datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+        return (months - months % n).astype('datetime64[M]').astype('datetime64[ns]').astype(np.int64)
+    width = timeframe_to_timedelta(timeframe).value
+    offset = _MONDAY if unit == 'w' else 0
+    return (dates - offset) // width * width + offset
+
+
+def bucket_ends(starts: np.ndarray, timeframe: str) -> np.ndarray:
+    """Close time (epoch ns) of candles opening at `starts`."""
+    if _unit(timeframe) == 'M':
+        n = int(timeframe[:-1])
+        months = starts.astype('datetime64[ns]').astype('datetime64[M]')
+        return (months + n).astype('datetime64[ns]').astype(np.int64)
+    return starts + timeframe_to_timedelta(timeframe).value
+
+
+def _tiles(src: str, dst: str) -> bool:
+    """Whether every `dst` bucket boundary is also a `src` boundary."""
+    s = timeframe_to_timedelta(src).value
+    if _unit(dst) in ('w', 'M'):
+        return _unit(src) in ('m', 'h', 'd') and _DAY % s == 0 or src == dst
+    if _unit(src) in ('w', 'M'):
+        return False
+    return timeframe_to_timedelta(dst).value % s == 0
+
+
+class _Candles:
+    """Pair-major, date-sorted candle arrays (`codes` are pair codes)."""
+
+    def __init__(self, codes: np.ndarray, dates: np.ndarray, arrays: Dict[str, np.ndarray]):
+        self.codes = codes
+        self.dates = dates
+        self.arrays = arrays
+
+    def aggregate(self, timeframe: str) -> '_Candles':
+        starts = bucket_starts(self.dates, timeframe)
+        new = np.ones(len(starts), dtype=bool)
+        new[1:] = (starts[1:] != starts[:-1]) | (self.codes[1:] != self.codes[:-1])
+        idx = np.flatnonzero(new)
+        if not len(idx):
+            return _Candles(self.codes[:0], starts[:0], {k: v[:0] for k, v in self.arrays.items()})
+        arrays = {}
+        pos = np.arange(len(starts))
+        for col, arr in self.arrays.items():
+            valid = ~np.isnan(arr)
+            if col == 'open':
+                first = np.minimum.reduceat(np.where(valid, pos, len(pos)), idx)
+                arrays[col] = np.where(first < len(pos), arr[np.minimum(first, len(pos) - 1)], np.nan)
+            elif col == 'close':
+                last = np.maximum.reduceat(np.where(valid, pos, -1), idx)
+                arrays[col] = np.where(last >= 0, arr[np.maximum(last, 0)], np.nan)
+            elif col == 'high':
+                arrays[col] = np.fmax.reduceat(arr, idx)
+            elif col == 'low':
+                arrays[col] = np.fmin.reduceat(arr, idx)
+            else:
+                total = np.add.reduceat(np.where(valid, arr, 0.0), idx)
+                arrays[col] = np.where(np.add.reduceat(valid, idx) > 0, total, np.nan)
+        return _Candles(self.codes[idx], starts[idx], arrays)
+
+
+def resample_ohlcv(df: pd.DataFrame, base_timeframe: str, timeframes: Iterable[str],
+                   partial: bool = False) -> Dict[str, pd.DataFrame]:
+    """Frames for each of `timeframes` built from `base_timeframe` candles in `df`."""
+    timeframes = list(dict.fromkeys(timeframes))
+    base_td = timeframe_to_timedelta(base_timeframe)
+    for tf in timeframes:
+        if not _tiles(base_timeframe, tf):
+            raise ValueError(f"Cannot build {tf} candles from {base_timeframe} candles")
+    columns = [c for c in PRICE_COLUMNS if c in df.columns]
+    pair = df['pair']
+    codes, pairs = pd.factorize(pair, sort=True)
+    dates = epoch_ns(df['date'])
+    order = np.lexsort((dates, codes))
+    if (np.diff(order) != 1).any():
+        codes, dates = codes[order], dates[order]
+    else:
+        order = slice(None)
+    base = _Candles(codes, dates, {c: df[c].to_numpy(dtype=float)[order] for c in columns})
+    # Each pair's candles cover base time up to the close of its last base candle
+    last = np.flatnonzero(np.r_[codes[1:] != codes[:-1], True]) if len(codes) else np.array([], dtype=int)
+    covered = np.full(len(pairs), np.iinfo(np.int64).min)
+    covered[codes[last]] = dates[last] + base_td.value
+
+    built: Dict[str, _Candles] = {base_timeframe: base}
+    out: Dict[str, pd.DataFrame] = {}
+    for tf in sorted(timeframes, key=timeframe_key):
+        if tf == base_timeframe:
+            out[tf] = df
+            continue
+        src = max((s for s in built if _tiles(s, tf)), key=timeframe_key)
+        c = built[tf] = built[src].aggregate(tf)
+        keep = slice(None) if partial else bucket_ends(c.dates, tf) <= covered[c.codes]
+        frame = pd.DataFrame({
+            'date': pd.Series(c.dates[keep].view('datetime64[ns]')).dt.tz_localize('UTC').astype(UTC_DTYPE),
+            'pair': pd.Categorical.from_codes(c.codes[keep], categories=pairs),
+            **{col: v[keep] for col, v in c.arrays.items()},
+        })
+        out[tf] = frame
+    return {tf: out[tf] for tf in timeframes}
+
+
+def timeframe_key(timeframe: str) -> Tuple[int, int]:
+    """Sort key ordering timeframes by length (months after every fixed length)."""
+    return (_unit(timeframe) == 'M', timeframe_to_timedelta(timeframe).value)
@@ -0,0 +1,197 @@
+"""
+Vectorized rolling-window kernels shared by metrics.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+import warnings
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Relative rounding error of a variance taken as a difference of float64 sums
+_ROUNDING = 64 * np.finfo(float).eps
+
+
+def _nan_window_count(arr: np.ndarray, window: int) -> np.ndarray:
+    """Number of NaN values in each trailing window (aligned to the window end)."""
+    cs = np.concatenate([[0], np.cumsum(np.isnan(arr), dtype=np.int64)])
+    return cs[window:] - cs[:-window]
+
+
+def rolling_ols(y: np.ndarray, window: int = 20, fit: bool = False) -> Dict[str, np.ndarray]:
+    """Rolling least-squares fit of `y` against x = 0..window-1.
+
+    Returns {'slope'} (plus 'intercept' and 'r2' when `fit`), aligned to the
+    window end; the first `window-1` values and every window containing a NaN
+    are NaN, and so is the R² of a constant window. Window sums run over the
+    `window` columns of a strided view of `y`, one vectorized pass per
+    column: O(n * window) time and O(n) memory. Each window is summed
+    directly around its own mean, so results do not depend on the rest of
+    the history (a `latest-` run gets the same values as a full one) and
+    precision does not degrade on long histories the way prefix sums do.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    out = {'slope': np.full(n, np.nan)}
+    if fit:
+        out['intercept'] = np.full(n, np.nan)
+        out['r2'] = np.full(n, np.nan)
+    if n < window:
+        return out
+    x = np.arange(window, dtype=float)
+    xc = x - x.mean()
+    sxx = (xc * xc).sum()
+    valid = _nan_window_count(y, window) == 0
+    win = sliding_window_view(np.nan_to_num(y, nan=0.0), window)
+    ybar = np.zeros(len(win))
+    for j in range(window):
+        ybar += win[:, j]
+    ybar /= window
+    # Deviations from each window's mean keep the products small
+    sxy = np.zeros(len(win))
+    syy = np.zeros(len(win)) if fit else None
+    for j in range(window):
+        d = win[:, j] - ybar
+        sxy += xc[j] * d
+        if fit:
+            syy += d * d
+    slope = np.where(valid, sxy / sxx, np.nan)
+    out['slope'][window - 1:] = slope
+    if fit:
+        out['intercept'][window - 1:] = np.where(valid, ybar - slope * x.mean(), np.nan)
+        # Deviations within rounding of the level are those of a constant window
+        flat = syy <= window * (_ROUNDING * ybar) ** 2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r2 = np.where(valid & ~flat, sxy * sxy / (sxx * syy), np.nan)
+        out['r2'][window - 1:] = r2
+    return out
+
+
+# Multi-window rolling statistics over the columns of a 2-D array.
+#
+# Each column is an independent series (a pair's candles in order, see
+# `MarketPanel.compress`) and windows run down axis 0. NaN values are skipped
+# and a window needs `min_periods` valid values (default: the window), like
+# pandas `rolling`. Sums, means and std share one set of cumulative sums for
+# all windows; max/min use the van Herk/Gil-Werman block scan, the vectorized
+# O(n) counterpart of a monotonic deque, with one pass per window.
+
+STATS = ('sum', 'mean', 'std', 'max', 'min')
+
+
+def _pad_top(values: np.ndarray, rows: int, fill: float) -> np.ndarray:
+    pad = np.full((rows,) + values.shape[1:], fill, dtype=values.dtype)
+    return np.concatenate([pad, values])
+
+
+def _running(values: np.ndarray, power: int) -> np.ndarray:
+    """Cumulative sums (with a leading zero row) of values**power, NaN as 0.
+
+    power=0 counts valid values exactly in integers; sums use extended precision.
+    """
+    nan = np.isnan(values)
+    zero = np.zeros((1,) + values.shape[1:], dtype=np.int64 if power == 0 else np.longdouble)
+    if power == 0:
+        return np.concatenate([zero, np.cumsum(~nan, axis=0, dtype=np.int64)])
+    v = np.where(nan, 0.0, values)
+    if power == 2:
+        v *= v
+    return np.concatenate([zero, np.cumsum(v, axis=0, dtype=np.longdouble)])
+
+
+def _window_diff(cs: np.ndarray, window: int) -> np.ndarray:
+    """Trailing-window totals from `_running` sums (shorter windows at the top)."""
+    out = cs[1:].copy()
+    if window < len(out):
+        out[window:] -= cs[1:len(cs) - window]
+    return out.astype(float)
+
+
+def rolling_extreme(values: np.ndarray, window: int, how: str) -> np.ndarray:
+    """Rolling max/min down axis 0 ignoring NaN (-inf/+inf where nothing is valid)."""
+    fill = -np.inf if how == 'max' else np.inf
+    op = np.maximum if how == 'max' else np.minimum
+    n = len(values)
+    padded = _pad_top(np.where(np.isnan(values), fill, values), window - 1, fill)
+    blocks = -(-len(padded) // window)
+    padded = np.concatenate([padded, np.full((blocks * window - len(padded),) + values.shape[1:], fill)])
+    b = padded.reshape((blocks, window) + values.shape[1:])
+    prefix = op.accumulate(b, axis=1).reshape(padded.shape)
+    suffix = np.flip(op.accumulate(np.flip(b, axis=1), axis=1), axis=1).reshape(padded.shape)
+    ends = np.arange(window - 1, window - 1 + n)
+    return op(suffix[ends - window + 1], prefix[ends])
+
+
+def rolling_stats(values: np.ndarray, windows: Iterable[int], stats: Iterable[str],
+                  min_periods: Optional[int] = None) -> Dict[Tuple[str, int], np.ndarray]:
+    """Rolling `stats` for every window in `windows`, keyed by (stat, window)."""
+    stats = list(stats)
+    unknown = set(stats) - set(STATS)
+    if unknown:
+        raise ValueError(f"Unknown rolling stats: {sorted(unknown)}")
+    values = np.asarray(values, dtype=float)
+    out: Dict[Tuple[str, int], np.ndarray] = {}
+    count_cs = _running(values, 0)
+    if {'sum', 'mean', 'std'} & set(stats):
+        # Centering each column keeps the running sums small on long histories
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            center = np.nan_to_num(np.nanmean(values, axis=0))
+        centered = values - center
+        sum_cs = _running(centered, 1)
+        sq_cs = _running(centered, 2) if 'std' in stats else None
+    for w in windows:
+        count = _window_diff(count_cs, w)
+        enough = count >= (w if min_periods is None else min_periods)
+        for stat in stats:
+            if stat in ('max', 'min'):
+                res = rolling_extreme(values, w, stat)
+            else:
+                s = _window_diff(sum_cs, w)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    if stat == 'sum':
+                        res = s + count * center
+                    elif stat == 'mean':
+                        res = s / count + center
+                    else:
+                        sq = _window_diff(sq_cs, w)
+                        var = (sq - s * s / count) / (count - 1)
+                        res = np.sqrt(np.maximum(var, 0.0))
+                        res[count < 2] = np.nan
+            out[(stat, w)] = np.where(enough, res, np.nan)
+    return out
+
+
+def rolling_corr(x: np.ndarray, y: np.ndarray, window: int, min_periods: Optional[int] = None,
+                 beta: bool = False) -> Dict[str, np.ndarray]:
+    """Rolling correlation of `x` with `y` down axis 0 (plus 'beta' = cov/var(y)).
+
+    Only rows where both are valid count, and a window needs `min_periods` of
+    them (default: the window), like pandas `rolling(...).corr`. One set of
+    running sums of x, y, x², y² and xy serves both outputs; windows where
+    either side is constant are NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.broadcast_to(np.asarray(y, dtype=float), x.shape)
+    both = ~(np.isnan(x) | np.isnan(y))
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        xc = np.where(both, x, np.nan)
+        yc = np.where(both, y, np.nan)
+        xc -= np.nan_to_num(np.nanmean(xc, axis=0))
+        yc -= np.nan_to_num(np.nanmean(yc, axis=0))
+    n = _window_diff(_running(xc, 0), window)
+    sx = _window_diff(_running(xc, 1), window)
+    sy = _window_diff(_running(yc, 1), window)
+    sxx = _window_diff(_running(xc, 2), window)
+    syy = _window_diff(_running(yc, 2), window)
+    sxy = _window_diff(_running(xc * yc, 1), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        # Variances within rounding of the sums of squares are those of constant windows
+        ok = ((n >= (window if min_periods is None else min_periods)) & (n >= 2)
+              & (vx > _ROUNDING * sxx) & (vy > _ROUNDING * syy))
+        out = {'corr': np.where(ok, np.clip(cov / np.sqrt(vx * vy), -1.0, 1.0), np.nan)}
+        if beta:
+            out['beta'] = np.where(ok, cov / vy, np.nan)
+    return out
@@ -0,0 +1,409 @@
+"""
+Local query server for the latest metrics and ranks (`metrex serve`).
+
+The metrics output and the per-pair rank outputs are loaded once into
+in-memory indexes (`QueryIndex`) and served as JSON over localhost HTTP or a
+Unix socket, so many bot processes can share one computation:
+
+    GET /metrics/latest                 newest metrics row
+    GET /metrics/asof?ts=...            last metrics row at or before ts
+    GET /ranks/latest?pair=...          newest rank row of a pair
+    GET /ranks/asof?pair=...&ts=...     last rank row of a pair at or before ts
+    GET /ranks/top?by=...&k=...&ts=...  k best pairs by a rank column at the
+                                        last date at or before ts
+    GET /health                         newest dates and pair count
+
+The index is kept current either by an embedded `Watcher` (when a
+datafolder is given) or by reloading output files whose mtime changed.
+`MetrexClient` is a thin keep-alive client for these endpoints.
+"""
+import http.client
+import json
+import socket
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlencode, urlparse
+import numpy as np
+import pandas as pd
+from .io import load
+from .options import DEFAULT_PORT
+from .ranking import RANK_COLUMNS
+from .store import read_pair, stored_pairs
+from .timeutils import as_utc, epoch_ns
+
+TOP_COLUMNS = [c for c in RANK_COLUMNS if c.endswith('Rank')]
+
+
+def _ns(ts: Union[str, pd.Timestamp]) -> int:
+    """UTC epoch nanoseconds of a timestamp (naive values are taken as UTC)."""
+    return as_utc(pd.Timestamp(ts)).value
+
+
+def _record(row: pd.Series) -> Dict[str, Any]:
+    """JSON-ready row: ISO dates, Python numbers and None for NaN/NaT/NA."""
+    out = {}
+    for k, v in row.items():
+        if pd.api.types.is_scalar(v) and pd.isna(v):
+            # Includes the pd.NA of nullable (--compact) rank columns
+            v = None
+        elif isinstance(v, pd.Timestamp):
+            v = v.isoformat()
+        elif isinstance(v, (np.integer, np.floating, np.bool_)):
+            v = v.item()
+        out[k] = v
+    return out
+
+
+class _Series:
+    """A date-sorted frame with its dates as int64 ns for as-of lookups."""
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.sort_values('date', kind='stable').reset_index(drop=True)
+        self.df = df
+        self.dates = epoch_ns(df['date'])
+
+    def append(self, rows: pd.DataFrame) -> '_Series':
+        rows = rows[epoch_ns(rows['date']) > (self.dates[-1] if len(self.dates) else np.iinfo(np.int64).min)]
+        return _Series(pd.concat([self.df, rows], ignore_index=True)) if len(rows) else self
+
+    def asof(self, ts: Optional[int] = None) -> Optional[int]:
+        """Row position of the last date <= ts (the newest row without ts)."""
+        if not len(self.dates):
+            return None
+        i = len(self.dates) - 1 if ts is None else int(np.searchsorted(self.dates, ts, side='right')) - 1
+        return i if i >= 0 else None
+
+
+class QueryIndex:
+    """In-memory indexes over a metrics frame and per-pair rank frames."""
+
+    def __init__(self):
+        self.metrics: Optional[_Series] = None
+        self.ranks: Dict[str, _Series] = {}
+        self._dates = np.array([], dtype=np.int64)  # union of rank dates
+        self._cross: Dict[int, pd.DataFrame] = {}
+        self._ranked: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+
+    # Loading
+
+    def set_metrics(self, df: pd.DataFrame) -> None:
+        with self._lock:
+            self.metrics = _Series(df)
+
+    def add_metrics(self, rows: pd.DataFrame) -> None:
+        with self._lock:
+            self.metrics = _Series(rows) if self.metrics is None else self.metrics.append(rows)
+
+    def set_ranks(self, frames: Dict[str, pd.DataFrame]) -> None:
+        """Replace the rank rows of the given pairs."""
+        with self._lock:
+            for pair, df in frames.items():
+                self.ranks[pair] = _Series(df.drop(columns=['pair'], errors='ignore'))
+            self._reindex()
+
+    def add_ranks(self, rows: pd.DataFrame) -> None:
+        """Append a long `date, pair, ...` frame of new rank rows."""
+        with self._lock:
+            for pair, g in rows.groupby('pair', sort=False, observed=True):
+                g = g.drop(columns=['pair'])
+                pair = str(pair)
+                self.ranks[pair] = self.ranks[pair].append(g) if pair in self.ranks else _Series(g)
+            self._reindex()
+
+    def _reindex(self) -> None:
+        dates = [s.dates for s in self.ranks.values()]
+        self._dates = np.unique(np.concatenate(dates)) if dates else np.array([], dtype=np.int64)
+        self._cross.clear()
+        self._ranked.clear()
+
+    # Queries
+
+    def latest_metrics(self) -> Optional[Dict[str, Any]]:
+        return self.metrics_asof(None)
+
+    def metrics_asof(self, ts: Optional[int]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            m = self.metrics
+            i = m.asof(ts) if m is not None else None
+            return None if i is None else _record(m.df.iloc[i])
+
+    def rank_asof(self, pair: str, ts: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            s = self.ranks.get(pair)
+            i = s.asof(ts) if s is not None else None
+            return None if i is None else {'pair': pair, **_record(s.df.iloc[i])}
+
+    def _date_asof(self, ts: Optional[int]) -> Optional[int]:
+        if not len(self._dates):
+            return None
+        i = len(self._dates) - 1 if ts is None else int(np.searchsorted(self._dates, ts, side='right')) - 1
+        return int(self._dates[i]) if i >= 0 else None
+
+    def cross_section(self, ts: Optional[int] = None) -> pd.DataFrame:
+        """Rank rows of every pair at the last date <= ts (cached per date)."""
+        with self._lock:
+            d = self._date_asof(ts)
+            if d is None:
+                return pd.DataFrame()
+            if d not in self._cross:
+                rows, pairs = [], []
+                for pair, s in self.ranks.items():
+                    j = int(np.searchsorted(s.dates, d))
+                    if j < len(s.dates) and s.dates[j] == d:
+                        rows.append(j)
+                        pairs.append(pair)
+                frames = [self.ranks[p].df.iloc[[j]] for p, j in zip(pairs, rows)]
+                cross = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+                cross.insert(0, 'pair', pairs)
+                self._cross[d] = cross
+            return self._cross[d]
+
+    def top(self, by: str = 'topVolumeRank', k: int = 10, ts: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The `k` pairs ranked best (rank 1 first) by column `by`."""
+        if by not in TOP_COLUMNS:
+            raise ValueError(f"Unknown rank column: {by} (one of {', '.join(TOP_COLUMNS)})")
+        with self._lock:
+            d = self._date_asof(ts)
+            if d is None:
+                return []
+            if (d, by) not in self._ranked:
+                cross = self.cross_section(ts)
+                best = cross.dropna(subset=[by]).sort_values([by, 'pair'], kind='stable')
+                self._ranked[(d, by)] = [_record(r) for _, r in best.iterrows()]
+            return self._ranked[(d, by)][:k]
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            last_metrics = self.metrics.df['date'].iloc[-1] if self.metrics is not None and len(self.metrics.dates) else None
+            last_rank = int(self._dates[-1]) if len(self._dates) else None
+            return {
+                'metrics_last': None if last_metrics is None else pd.Timestamp(last_metrics).isoformat(),
+                'ranks_last': None if last_rank is None else pd.Timestamp(last_rank, tz='UTC').isoformat(),
+                'pairs': len(self.ranks),
+            }
+
+
+class OutputReloader:
+    """Keeps a `QueryIndex` in sync with output files by their mtime/size."""
+
+    def __init__(self, index: QueryIndex, output: Optional[Path], outputfolder: Optional[Path], timeframe: str):
+        self.index = index
+        self.output = Path(output) if output is not None else None
+        self.outputfolder = Path(outputfolder) if outputfolder is not None else None
+        self.timeframe = timeframe
+        self._seen: Dict[Path, Tuple[int, int]] = {}
+
+    def _changed(self, path: Path) -> bool:
+        if not path.exists():
+            return False
+        st = path.stat()
+        sig = (st.st_mtime_ns, st.st_size)
+        changed = self._seen.get(path) != sig
+        self._seen[path] = sig
+        return changed
+
+    def refresh(self) -> None:
+        if self.output is not None and self._changed(self.output):
+            self.index.set_metrics(load(self.output))
+        if self.outputfolder is None:
+            return
+        manifest = self.outputfolder / f"manifest-{self.timeframe}.json"
+        manifest_changed = self._changed(manifest)
+        frames = {}
+        for pair in stored_pairs(self.outputfolder, self.timeframe):
+            legacy = self.outputfolder / f"{pair}-{self.timeframe}.feather"
+            if self._changed(legacy) or manifest_changed:
+                frames[pair] = read_pair(self.outputfolder, pair, self.timeframe)
+        if frames:
+            self.index.set_ranks(frames)
+
+
+def _make_handler(index: QueryIndex):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes; Nagle + delayed ACK would add ~40ms
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                ts = _ns(q['ts']) if q.get('ts') else None
+                if url.path == '/metrics/latest':
+                    body = index.latest_metrics()
+                elif url.path == '/metrics/asof':
+                    body = index.metrics_asof(ts)
+                elif url.path == '/ranks/latest':
+                    body = index.rank_asof(q['pair'])
+                elif url.path == '/ranks/asof':
+                    body = index.rank_asof(q['pair'], ts)
+                elif url.path == '/ranks/top':
+                    body = index.top(q.get('by', 'topVolumeRank'), int(q.get('k', 10)), ts)
+                elif url.path == '/health':
+                    body = index.health()
+                else:
+                    return self._send(404, {'error': f"Unknown endpoint: {url.path}"})
+            except (KeyError, ValueError) as e:
+                return self._send(400, {'error': str(e)})
+            except Exception as e:
+                # Answer instead of dropping the kept-alive connection
+                traceback.print_exc()
+                return self._send(500, {'error': f"{type(e).__name__}: {e}"})
+            self._send(200, body)
+
+        def _send(self, status: int, body: Any) -> None:
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def address_string(self) -> str:
+            return str(self.client_address[0]) if self.client_address else 'unix'
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    return Handler
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(index: QueryIndex, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                socket_path: Optional[Path] = None):
+    """HTTP server answering queries from `index` (on `socket_path` if given)."""
+    handler = _make_handler(index)
+    if socket_path is not None:
+        Path(socket_path).unlink(missing_ok=True)
+        unix_handler = type('UnixHandler', (handler,), {'disable_nagle_algorithm': False})
+        return UnixHTTPServer(str(socket_path), unix_handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(index: QueryIndex, refresh, interval: float = 5.0, host: str = '127.0.0.1',
+          port: int = DEFAULT_PORT, socket_path: Optional[Path] = None) -> None:
+    """Serve `index` until interrupted, calling `refresh()` every `interval` seconds."""
+    server = make_server(index, host, port, socket_path)
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            t0 = time.monotonic()
+            try:
+                refresh()
+            except Exception:
+                # Keep answering from the last good index; retry next interval
+                traceback.print_exc()
+            stop.wait(max(0.0, interval - (time.monotonic() - t0)))
+    refresher = threading.Thread(target=loop, daemon=True)
+    refresher.start()
+    try:
+        server.serve_forever()
+    finally:
+        stop.set()
+        server.server_close()
+        if socket_path is not None:
+            Path(socket_path).unlink(missing_ok=True)
+
+
+def serve_outputs(timeframe: str, output: Optional[Path] = None, outputfolder: Optional[Path] = None,
+                  watcher=None, interval: float = 5.0, **server_kw) -> None:
+    """Serve metrics `output` and rank `outputfolder`.
+
+    With a `metrex.watch.Watcher`, the server also computes: each refresh runs
+    `watcher.update()` and appends the rows it wrote to the index. Otherwise
+    the index reloads output files that another process rewrote.
+    """
+    index = QueryIndex()
+    reloader = OutputReloader(index, output, outputfolder, timeframe)
+    reloader.refresh()
+    if watcher is None:
+        refresh = reloader.refresh
+    else:
+        def refresh():
+            watcher.update()
+            if watcher.new_metrics is not None:
+                index.add_metrics(watcher.new_metrics)
+            if watcher.new_ranks is not None:
+                index.add_ranks(watcher.new_ranks)
+    serve(index, refresh, interval, **server_kw)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class MetrexClient:
+    """Keep-alive client for `metrex serve`."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 socket_path: Optional[Path] = None, timeout: float = 5.0):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.socket_path = None if socket_path is None else str(socket_path)
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            if self.socket_path is not None:
+                self._conn = _UnixConnection(self.socket_path, self.timeout)
+            else:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def _get(self, path: str, **params) -> Any:
+        params = {k: (v.isoformat() if isinstance(v, pd.Timestamp) else v) for k, v in params.items() if v is not None}
+        url = path + ('?' + urlencode(params) if params else '')
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request('GET', url)
+                resp = conn.getresponse()
+                body = json.loads(resp.read())
+                break
+            except (ConnectionError, http.client.HTTPException, OSError):
+                # Server closed the kept-alive connection: reconnect once
+                self.close()
+                if attempt:
+                    raise
+        if resp.status != 200:
+            raise ValueError(body.get('error', f"HTTP {resp.status}"))
+        return body
+
+    def latest_metrics(self) -> Optional[Dict[str, Any]]:
+        return self._get('/metrics/latest')
+
+    def metrics_asof(self, ts) -> Optional[Dict[str, Any]]:
+        return self._get('/metrics/asof', ts=pd.Timestamp(ts))
+
+    def latest_rank(self, pair: str) -> Optional[Dict[str, Any]]:
+        return self._get('/ranks/latest', pair=pair)
+
+    def rank_asof(self, pair: str, ts) -> Optional[Dict[str, Any]]:
+        return self._get('/ranks/asof', pair=pair, ts=pd.Timestamp(ts))
+
+    def top(self, by: str = 'topVolumeRank', k: int = 10, ts=None) -> List[Dict[str, Any]]:
+        return self._get('/ranks/top', by=by, k=k, ts=None if ts is None else pd.Timestamp(ts))
+
+    def health(self) -> Dict[str, Any]:
+        return self._get('/health')
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,185 @@
+"""
+Sharded rank computation.
+
+Only `pairsCount` and the four ranks are cross-sectional; every other rank
+output column depends on one pair's own candles. A sharded run therefore
+splits the pairs into disjoint shards and works in three steps through a
+folder every worker can reach:
+
+1. `compute_shard` (once per shard): load the shard's pairs and save their
+   date, OHLCV and per-pair features (`ranking.pair_features`) as
+   `shard-{i}.arrow`, plus a `shard-{i}.json` descriptor written last.
+2. `gather_shards`: memory-map only `date`, `changePercentage24h` and
+   `volumeInCurrency24` of every shard, rank them per date
+   (`ranking.gather_ranks`) and save each shard's rows as `ranks-{i}.arrow`.
+3. `write_shard` (once per shard): join the shard with its ranks and append
+   every pair to the output store.
+
+`rank_sharded` runs all steps on a local process pool; `metrex shard ...`
+runs them one at a time, e.g. on separate hosts sharing a filesystem. The
+output is the same as a single-process `rank_pairs` run.
+"""
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from .io import feather_files
+from .panel import PRICE_COLUMNS
+from .processor import _parse_timerange_bounds, _rank_panel, compact_ranks, latest_rank_start, load_market
+from .profiling import stage
+from .ranking import RANK_COLUMNS, gather_ranks, pair_features
+from .store import open_store
+from .timeindex import TimeIndex
+from .timeutils import UTC_DTYPE, as_utc, parse_date
+from .writer import DEFAULT_WORKERS, PairWriter
+
+FEATURES = ['changePercentage24h', 'volumeInCurrency', 'volumeInCurrency24']
+
+
+def shard_pairs(datafolder: Path, timeframe: str, shards: int) -> List[List[str]]:
+    """Pairs of each shard: sorted pair names dealt round-robin, so every host
+    listing the same folder gets the same split."""
+    if shards < 1:
+        raise ValueError(f"Need at least one shard, got {shards}")
+    pairs = sorted({f.stem.split('-')[0] for f in feather_files(datafolder, timeframe)})
+    return [pairs[i::shards] for i in range(shards)]
+
+
+def _write_table(df: pd.DataFrame, path: Path) -> None:
+    # Uncompressed, so later steps can memory-map single columns
+    tmp = path.with_name(path.name + '.tmp')
+    feather.write_feather(df.reset_index(drop=True), tmp, compression='uncompressed')
+    os.replace(tmp, path)
+
+
+def _read_meta(workdir: Path, index: int) -> Dict[str, Any]:
+    path = Path(workdir) / f"shard-{index}.json"
+    if not path.exists():
+        raise ValueError(f"Shard {index} has not been computed in {workdir}")
+    return json.loads(path.read_text())
+
+
+def compute_shard(datafolder: Path, timeframe: str, timerange: str, outputfolder: Path, workdir: Path,
+                  shards: int, index: int, store: str = 'feather', compact: bool = False) -> int:
+    """Step 1: per-pair columns of shard `index`; returns its row count."""
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    pairs = shard_pairs(datafolder, timeframe, shards)[index]
+    start_raw, end_raw = _parse_timerange_bounds(timerange)
+    use_latest = start_raw.lower() == 'latest'
+    start = None if use_latest else as_utc(parse_date(start_raw))
+    existing_last = {}
+    if use_latest:
+        existing_last = open_store(store, Path(outputfolder), timeframe).last_dates(pairs)
+        start = latest_rank_start(datafolder, timeframe, pairs, existing_last)
+    panel = None
+    if pairs:
+        df = load_market(datafolder, timeframe, start=start, end=as_utc(parse_date(end_raw)), compact=compact,
+                         pairs=pairs)
+        panel = _rank_panel(df, existing_last)
+        del df
+    if panel is None:
+        frame = pd.DataFrame({'date': pd.Series(dtype=UTC_DTYPE), 'pair': pd.Series(dtype=str),
+                              **{c: np.empty(0) for c in PRICE_COLUMNS + FEATURES}})
+    else:
+        columns = {c: panel[c] for c in PRICE_COLUMNS}
+        columns.update(pair_features(panel))
+        frame = panel.to_long(columns)
+    _write_table(frame, workdir / f"shard-{index}.arrow")
+    meta = {'shards': shards, 'index': index, 'pairs': pairs, 'rows': len(frame), 'timeframe': timeframe,
+            'outputfolder': str(outputfolder), 'store': store, 'compact': compact,
+            'existing_last': {p: t.isoformat() for p, t in existing_last.items()}}
+    (workdir / f"shard-{index}.json").write_text(json.dumps(meta, indent=2))
+    return len(frame)
+
+
+def gather_shards(workdir: Path) -> int:
+    """Step 2: cross-sectional ranks over all shards; returns the rows ranked."""
+    workdir = Path(workdir)
+    shards = _read_meta(workdir, 0)['shards']
+    metas = [_read_meta(workdir, i) for i in range(shards)]
+    if any(m['shards'] != shards for m in metas):
+        raise ValueError(f"Shards in {workdir} come from runs with different shard counts")
+    tables = [feather.read_table(workdir / f"shard-{i}.arrow", memory_map=True,
+                                 columns=['date', 'changePercentage24h', 'volumeInCurrency24'])
+              for i in range(shards)]
+
+    def column(name: str) -> np.ndarray:
+        return np.concatenate([t.column(name).to_numpy() for t in tables])
+    dates = np.concatenate([t.column('date').cast(pa.int64()).to_numpy() for t in tables])
+    ranks = gather_ranks(dates, column('changePercentage24h'), column('volumeInCurrency24'))
+    bounds = np.cumsum([0] + [t.num_rows for t in tables])
+    for i in range(shards):
+        _write_table(pd.DataFrame({c: v[bounds[i]:bounds[i + 1]] for c, v in ranks.items()}),
+                     workdir / f"ranks-{i}.arrow")
+    return len(dates)
+
+
+def write_shard(workdir: Path, index: int, write_workers: int = DEFAULT_WORKERS,
+                compression: Optional[str] = None, compression_level: Optional[int] = None,
+                batch_rows: Optional[int] = None) -> int:
+    """Step 3: append shard `index` with its ranks to the output store; returns the rows written."""
+    workdir = Path(workdir)
+    meta = _read_meta(workdir, index)
+    ranks_path = workdir / f"ranks-{index}.arrow"
+    if not ranks_path.exists():
+        raise ValueError(f"Shards in {workdir} have not been gathered")
+    shard = feather.read_table(workdir / f"shard-{index}.arrow", memory_map=True).to_pandas()
+    ranks = feather.read_table(ranks_path, memory_map=True).to_pandas()
+    out = pd.concat([shard[['date', 'pair'] + PRICE_COLUMNS], ranks, shard[FEATURES]], axis=1)
+    out = out[['date', 'pair'] + PRICE_COLUMNS + RANK_COLUMNS]
+    del shard, ranks
+    if meta['compact']:
+        out = compact_ranks(out)
+    existing_last = {p: pd.Timestamp(t) for p, t in meta['existing_last'].items()}
+    outputfolder = Path(meta['outputfolder'])
+    outputfolder.mkdir(parents=True, exist_ok=True)
+    out_store = open_store(meta['store'], outputfolder, meta['timeframe'],
+                           compression, compression_level, batch_rows)
+    written = 0
+    with PairWriter(out_store, write_workers) as writer:
+        # Shard frames are pair-major, so each pair is one block of rows
+        layout = TimeIndex.from_frame(out)
+        for pair, lo, hi in zip(layout.pairs, layout.bounds[:-1], layout.bounds[1:]):
+            g_out = out.iloc[lo:hi].drop(columns=['pair']).reset_index(drop=True)
+            if pair in existing_last:
+                g_out = g_out[g_out['date'] > existing_last[pair]]
+            if g_out.empty:
+                continue
+            writer.submit(pair, g_out)
+            written += len(g_out)
+        writer.wait()
+    out_store.flush()
+    return written
+
+
+def rank_sharded(datafolder: Path, timeframe: str, timerange: str, outputfolder: Path, shards: int,
+                 store: str = 'feather', jobs: Optional[int] = None, compact: bool = False,
+                 write_workers: int = DEFAULT_WORKERS, compression: Optional[str] = None,
+                 compression_level: Optional[int] = None, workdir: Optional[Path] = None,
+                 batch_rows: Optional[int] = None) -> None:
+    """`rank_pairs` over `shards` pair subsets on `jobs` local processes (default:
+    one per shard). Peak memory per process shrinks with the shard size; only
+    the gather step sees every pair, and only three columns of it."""
+    mp = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='metrex-shards-') as tmp:
+        work = Path(workdir) if workdir is not None else Path(tmp)
+        with ProcessPoolExecutor(max_workers=jobs or shards, mp_context=mp) as pool:
+            with stage('shard:features'):
+                futures = [pool.submit(compute_shard, datafolder, timeframe, timerange, outputfolder, work,
+                                       shards, i, store, compact) for i in range(shards)]
+                for f in futures:
+                    f.result()
+            with stage('shard:gather') as st:
+                st['rows'] = pool.submit(gather_shards, work).result()
+            with stage('shard:write') as st:
+                futures = [pool.submit(write_shard, work, i, write_workers, compression, compression_level, batch_rows)
+                           for i in range(shards)]
+                st['rows'] = sum(f.result() for f in futures)
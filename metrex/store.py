@@ -0,0 +1,250 @@
+"""
+Output stores for per-pair rank results.
+
+- `FeatherStore`: one `{pair}-{timeframe}.feather` per pair, rewritten on
+  every append (read, merge, dedupe, rewrite).
+- `PartitionedStore`: append-only date-range segments under
+  `{pair}-{timeframe}/` plus a `manifest-{timeframe}.json` recording each
+  pair's segments and last date. Appending costs O(new rows); `compact`
+  merges small segments into one segment per month.
+
+Both write files atomically (temporary file plus rename) and can be
+appended to from several threads at once, one pair per thread (see
+`metrex.writer`). `compression` is 'lz4', 'zstd' or 'uncompressed';
+`compression_level` None means `options.DEFAULT_COMPRESSION_LEVEL`; files are written in
+indexed record batches of `batch_rows` rows (see `io.save`). Several processes
+(e.g. the writers of a sharded run) may append disjoint pairs to one
+partitioned store: each manifest flush merges only the pairs it changed.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from .io import save
+from .options import COMPRESSIONS
+from .timeutils import epoch_ns, to_utc
+
+
+@contextmanager
+def _file_lock(path: Path, timeout: float = 60.0):
+    """Exclusive lock held by creating `path` (O_EXCL also works on shared filesystems)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{path} is held by another writer (remove it if none is running)")
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.unlink(path)
+
+
+class FeatherStore:
+    """One feather file per pair (the original output layout)."""
+
+    def __init__(self, folder: Path, timeframe: str, compression: str = 'lz4',
+                 compression_level: Optional[int] = None, batch_rows: Optional[int] = None):
+        self.folder = Path(folder)
+        self.timeframe = timeframe
+        self.compression = compression
+        self.compression_level = compression_level
+        self.batch_rows = batch_rows
+
+    def path(self, pair: str) -> Path:
+        return self.folder / f"{pair}-{self.timeframe}.feather"
+
+    def last_dates(self, pairs: Iterable[str]) -> Dict[str, pd.Timestamp]:
+        """Last date (UTC) already written for each pair that has output."""
+        last: Dict[str, pd.Timestamp] = {}
+        for pair in pairs:
+            out_file = self.path(pair)
+            if out_file.exists():
+                try:
+                    # Files are written date-sorted: only the last record batch is read
+                    with pa.memory_map(str(out_file)) as source:
+                        reader = pa.ipc.open_file(source)
+                        if not reader.num_record_batches:
+                            continue
+                        dates = reader.get_batch(reader.num_record_batches - 1).column('date').to_pandas()
+                    if dates.empty:
+                        continue
+                    last[pair] = to_utc(dates).max()
+                except Exception:
+                    continue
+        return last
+
+    def append(self, pair: str, g_out: pd.DataFrame) -> None:
+        """Append rows for one pair, skipping dates already present."""
+        out_path = self.path(pair)
+        if out_path.exists():
+            try:
+                existing = pd.read_feather(out_path)
+                if 'date' in existing.columns:
+                    existing['date'] = to_utc(existing['date'])
+                    # Exclude any rows in g_out with dates already present
+                    g_out = g_out[~np.isin(epoch_ns(g_out['date']), epoch_ns(existing['date']))]
+                    if g_out.empty:
+                        return
+                    combined = pd.concat([existing, g_out], ignore_index=True)
+                    combined = combined.drop_duplicates(subset=['date']).sort_values('date')
+                    # The file takes the dtypes of the run writing it (e.g. --compact)
+                    combined = combined.astype(g_out.dtypes.to_dict())
+                else:
+                    combined = g_out
+            except Exception:
+                combined = g_out
+        else:
+            combined = g_out
+        save(combined, out_path, self.compression, self.compression_level, self.batch_rows)
+
+    def read(self, pair: str) -> pd.DataFrame:
+        return pd.read_feather(self.path(pair))
+
+    def flush(self) -> None:
+        pass
+
+
+class PartitionedStore:
+    """Append-only per-pair segments with a JSON manifest."""
+
+    def __init__(self, folder: Path, timeframe: str, compression: str = 'lz4',
+                 compression_level: Optional[int] = None, batch_rows: Optional[int] = None):
+        self.folder = Path(folder)
+        self.timeframe = timeframe
+        self.compression = compression
+        self.compression_level = None if compression == 'uncompressed' else compression_level
+        self.batch_rows = batch_rows
+        # Guards the manifest; segment files of different pairs are written concurrently
+        self._lock = threading.Lock()
+        self.manifest_path = self.folder / f"manifest-{timeframe}.json"
+        self.manifest: Dict[str, Dict] = {}
+        if self.manifest_path.exists():
+            self.manifest = json.loads(self.manifest_path.read_text())
+        # Pairs changed since the last flush
+        self._touched = set()
+
+    def pair_dir(self, pair: str) -> Path:
+        return self.folder / f"{pair}-{self.timeframe}"
+
+    def segments(self, pair: str) -> List[Dict]:
+        return self.manifest.get(pair, {}).get('segments', [])
+
+    def last_dates(self, pairs: Iterable[str]) -> Dict[str, pd.Timestamp]:
+        """Last date per pair, straight from the manifest (no data files read)."""
+        return {p: pd.Timestamp(self.manifest[p]['last_date']) for p in pairs if p in self.manifest}
+
+    def _read_segments(self, pair: str, segments: List[Dict]) -> pd.DataFrame:
+        d = self.pair_dir(pair)
+        tables = [feather.read_table(d / s['file'], memory_map=True) for s in segments]
+        if not tables:
+            return pd.DataFrame()
+        # Segments written with and without --compact differ in numeric types
+        return pa.concat_tables(tables, promote_options='permissive').to_pandas()
+
+    def _write_segment(self, pair: str, df: pd.DataFrame) -> Dict:
+        d = self.pair_dir(pair)
+        d.mkdir(parents=True, exist_ok=True)
+        start, end = df['date'].iloc[0], df['date'].iloc[-1]
+        name = f"{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}.feather"
+        save(df, d / name, self.compression, self.compression_level, self.batch_rows)
+        return {'file': name, 'start': start.isoformat(), 'end': end.isoformat(), 'rows': len(df)}
+
+    def append(self, pair: str, g_out: pd.DataFrame) -> None:
+        """Write new rows as a segment; only segments overlapping them are read."""
+        g_out = g_out.sort_values('date')
+        g_out = g_out.assign(date=to_utc(g_out['date']))
+        lo, hi = g_out['date'].iloc[0], g_out['date'].iloc[-1]
+        overlapping = [s for s in self.segments(pair)
+                       if pd.Timestamp(s['start']) <= hi and pd.Timestamp(s['end']) >= lo]
+        if overlapping:
+            existing = self._read_segments(pair, overlapping)
+            g_out = g_out[~np.isin(epoch_ns(g_out['date']), epoch_ns(existing['date']))]
+            if g_out.empty:
+                return
+        segment = self._write_segment(pair, g_out)
+        with self._lock:
+            entry = self.manifest.setdefault(pair, {'segments': []})
+            entry['segments'].append(segment)
+            last = max(pd.Timestamp(s['end']) for s in entry['segments'])
+            entry['last_date'] = last.isoformat()
+            self._touched.add(pair)
+
+    def read(self, pair: str) -> pd.DataFrame:
+        """All rows for a pair as one date-sorted frame."""
+        df = self._read_segments(pair, self.segments(pair))
+        if df.empty:
+            return df
+        return df.drop_duplicates(subset=['date']).sort_values('date').reset_index(drop=True)
+
+    def compact(self, pairs: Optional[Iterable[str]] = None) -> None:
+        """Rewrite each pair's segments as one segment per calendar month."""
+        for pair in list(pairs if pairs is not None else self.manifest):
+            old = self.segments(pair)
+            if not old:
+                continue
+            df = self.read(pair)
+            months = df['date'].dt.tz_localize(None).dt.to_period('M')
+            new = [self._write_segment(pair, g) for _, g in df.groupby(months, sort=True)]
+            keep = {s['file'] for s in new}
+            for s in old:
+                if s['file'] not in keep:
+                    (self.pair_dir(pair) / s['file']).unlink(missing_ok=True)
+            self.manifest[pair]['segments'] = new
+            self._touched.add(pair)
+        self.flush()
+
+    def flush(self) -> None:
+        """Atomically persist the changed pairs into the manifest on disk."""
+        with self._lock:
+            if not self._touched:
+                return
+            self.folder.mkdir(parents=True, exist_ok=True)
+            with _file_lock(self.manifest_path.with_suffix('.json.lock')):
+                # Entries other writers flushed meanwhile are kept
+                manifest = json.loads(self.manifest_path.read_text()) if self.manifest_path.exists() else {}
+                manifest.update({p: self.manifest[p] for p in self._touched})
+                tmp = self.manifest_path.with_suffix('.json.tmp')
+                tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+                os.replace(tmp, self.manifest_path)
+            self.manifest = manifest
+            self._touched.clear()
+
+
+def open_store(kind: str, folder: Path, timeframe: str, compression: Optional[str] = None,
+               compression_level: Optional[int] = None, batch_rows: Optional[int] = None):
+    """Store of `kind`; without `compression` each store keeps its default codec and level."""
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression} (expected one of {', '.join(COMPRESSIONS)})")
+    options = {} if compression is None else {'compression': compression, 'compression_level': compression_level}
+    options['batch_rows'] = batch_rows
+    if kind == 'feather':
+        return FeatherStore(folder, timeframe, **options)
+    elif kind == 'partitioned':
+        return PartitionedStore(folder, timeframe, **options)
+    raise ValueError(f"Unknown store: {kind}")
+
+
+def stored_pairs(folder: Path, timeframe: str) -> List[str]:
+    """Pairs with rank output in `folder`, in either layout."""
+    pairs = set(PartitionedStore(folder, timeframe).manifest)
+    pairs.update(f.name[:-len(f"-{timeframe}.feather")] for f in Path(folder).glob(f"*-{timeframe}.feather"))
+    return sorted(pairs)
+
+
+def read_pair(folder: Path, pair: str, timeframe: str) -> pd.DataFrame:
+    """Load a pair's rank output as one frame, whichever layout was used."""
+    store = PartitionedStore(folder, timeframe)
+    if pair in store.manifest:
+        return store.read(pair)
+    return FeatherStore(folder, timeframe).read(pair)
@@ -0,0 +1,116 @@
+"""
+Per-pair sorted time index over a long `date, pair, ...` frame.
+
+Dates are taken once as UTC epoch nanoseconds (`timeutils.epoch_ns`, free for
+the canonical dates `io.load_feathers` returns) and each pair's rows become a
+sorted segment. Timerange slicing, per-pair lookback starts and last-date
+lookups are then binary searches within those segments instead of datetime
+comparisons over the whole frame, and bar gaps are found from the differences
+of neighbouring dates.
+
+    index = TimeIndex.from_frame(df)
+    df.iloc[index.between(start, end)]
+    index.gaps('1h')
+"""
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+from .timeutils import as_utc, epoch_ns, timeframe_to_timedelta
+
+Bound = Union[None, int, pd.Timestamp]
+
+
+def _ns(ts: Bound) -> Optional[int]:
+    if ts is None or isinstance(ts, (int, np.integer)):
+        return ts
+    return as_utc(pd.Timestamp(ts)).value
+
+
+def _ranges(lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(lo[i], hi[i]) over i."""
+    sizes = np.maximum(hi - lo, 0)
+    if not sizes.sum():
+        return np.array([], dtype=np.int64)
+    starts = np.repeat(lo - np.r_[0, np.cumsum(sizes)[:-1]], sizes)
+    return starts + np.arange(sizes.sum())
+
+
+class TimeIndex:
+    """Pair-major sorted epoch-ns dates with each pair's [start, stop) bounds."""
+
+    def __init__(self, pairs: List[str], bounds: np.ndarray, ns: np.ndarray, rows: Optional[np.ndarray] = None):
+        self.pairs = list(pairs)
+        self.bounds = bounds
+        self.ns = ns
+        # Frame row of each index position (None: the frame is already pair-major and sorted)
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'TimeIndex':
+        ns = epoch_ns(df['date'])
+        codes, uniques = pd.factorize(df['pair'])
+        rows = None
+        if len(ns) > 1:
+            # Loaded frames are already grouped by pair and date-sorted within each pair
+            ordered = (np.diff(ns) > 0) | (codes[1:] != codes[:-1])
+            grouped = np.count_nonzero(codes[1:] != codes[:-1]) == len(uniques) - 1
+            if not (ordered.all() and grouped):
+                rows = np.lexsort((ns, codes))
+                ns, codes = ns[rows], codes[rows]
+        if not len(ns):
+            return cls([], np.zeros(1, dtype=np.int64), ns, rows)
+        bounds = np.r_[0, np.flatnonzero(codes[1:] != codes[:-1]) + 1, len(ns)]
+        return cls([str(uniques[codes[b]]) for b in bounds[:-1]], bounds, ns, rows)
+
+    def _frame_rows(self, pos: np.ndarray) -> np.ndarray:
+        return pos if self.rows is None else np.sort(self.rows[pos])
+
+    def _search(self, ts: Optional[int], side: str, default: np.ndarray) -> np.ndarray:
+        if ts is None:
+            return default
+        return np.array([lo + np.searchsorted(self.ns[lo:hi], ts, side=side)
+                         for lo, hi in zip(self.bounds[:-1], self.bounds[1:])], dtype=np.int64)
+
+    def between(self, start: Bound = None, end: Bound = None) -> np.ndarray:
+        """Frame rows (in frame order) with start <= date <= end."""
+        lo = self._search(_ns(start), 'left', self.bounds[:-1])
+        hi = self._search(_ns(end), 'right', self.bounds[1:])
+        return self._frame_rows(_ranges(lo, hi))
+
+    def since(self, starts: Dict[str, Bound]) -> np.ndarray:
+        """Frame rows with date >= `starts[pair]` (every row of pairs not in `starts`)."""
+        lo = self.bounds[:-1].copy()
+        for i, pair in enumerate(self.pairs):
+            ts = _ns(starts.get(pair))
+            if ts is not None:
+                lo[i] += np.searchsorted(self.ns[self.bounds[i]:self.bounds[i + 1]], ts, side='left')
+        return self._frame_rows(_ranges(lo, self.bounds[1:]))
+
+    def tail(self, bars: int, before: Bound = None) -> Dict[str, np.ndarray]:
+        """Epoch-ns dates of each pair's last `bars` candles at or before `before`."""
+        hi = self._search(_ns(before), 'right', self.bounds[1:])
+        lo = np.maximum(hi - bars, self.bounds[:-1])
+        return {p: self.ns[a:b] for p, a, b in zip(self.pairs, lo, hi)}
+
+    def first(self) -> Dict[str, pd.Timestamp]:
+        return {p: pd.Timestamp(int(self.ns[b]), tz='UTC') for p, b in zip(self.pairs, self.bounds[:-1])}
+
+    def last(self) -> Dict[str, pd.Timestamp]:
+        return {p: pd.Timestamp(int(self.ns[b - 1]), tz='UTC') for p, b in zip(self.pairs, self.bounds[1:])}
+
+    def gaps(self, timeframe: str) -> pd.DataFrame:
+        """Missing bars inside each pair's history: one row per gap with the
+        last candle before it, the first candle after it and the bars missing."""
+        step = timeframe_to_timedelta(timeframe).value
+        diff = np.diff(self.ns)
+        # Differences across pair boundaries are not gaps
+        inside = np.ones(len(diff), dtype=bool)
+        inside[self.bounds[1:-1] - 1] = False
+        at = np.flatnonzero(inside & (diff > step))
+        pair_of = np.searchsorted(self.bounds, at, side='right') - 1
+        return pd.DataFrame({
+            'pair': pd.Categorical([self.pairs[i] for i in pair_of], categories=self.pairs),
+            'last_before': pd.to_datetime(self.ns[at], utc=True),
+            'first_after': pd.to_datetime(self.ns[at + 1], utc=True),
+            'missing_bars': diff[at] // step - 1,
+        })
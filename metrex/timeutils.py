@@ -3,8 +3,12 @@ Time utilities for metrex: timerange parsing, timezone handling
 """
 from datetime import datetime
 from typing import Tuple
+import re
+import numpy as np
 import pandas as pd
 
+_TF_UNITS = {'m': 'min', 'h': 'h', 'd': 'D', 'w': 'W'}
+
 def parse_timerange(timerange: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
     if '-' not in timerange:
         raise ValueError(f"Invalid timerange format: {timerange}")
@@ -13,11 +17,56 @@ def parse_timerange(timerange: str) -> Tuple[pd.Timestamp, pd.Timestamp]:
     end = pd.Timestamp(datetime.strptime(end_str, '%Y%m%d'))
     return start, end
 
+def parse_date(value: str) -> pd.Timestamp:
+    """Parse a `YYYYMMDD` timerange bound."""
+    return pd.Timestamp(datetime.strptime(value, '%Y%m%d'))
+
+def timeframe_to_timedelta(timeframe: str) -> pd.Timedelta:
+    """Freqtrade timeframe string ('5m', '1h', '1d', '1w', '1M') to a Timedelta.
+
+    Months are approximated as 30 days.
+    """
+    m = re.fullmatch(r'(\d+)([mhdwM])', timeframe)
+    if not m:
+        raise ValueError(f"Unsupported timeframe: {timeframe}")
+    n, unit = int(m.group(1)), m.group(2)
+    if unit == 'M':
+        return pd.Timedelta(days=30 * n)
+    return pd.Timedelta(n, unit=_TF_UNITS[unit])
+
+def as_utc(ts: pd.Timestamp) -> pd.Timestamp:
+    """UTC-aware copy of `ts` (naive timestamps are taken as UTC)."""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+# Canonical in-memory date type: UTC epoch nanoseconds (an int64 view is free)
+UTC_DTYPE = pd.DatetimeTZDtype('ns', 'UTC')
+
+def to_utc(dates: pd.Series) -> pd.Series:
+    """Dates as `datetime64[ns, UTC]` (naive values are taken as UTC); returned
+    unchanged when already canonical, so repeated calls cost nothing."""
+    if dates.dtype == UTC_DTYPE:
+        return dates
+    dates = pd.to_datetime(dates)
+    dates = dates.dt.tz_localize('UTC') if dates.dt.tz is None else dates.dt.tz_convert('UTC')
+    return dates.astype(UTC_DTYPE)
+
+def epoch_ns(dates: pd.Series) -> np.ndarray:
+    """UTC epoch nanoseconds of a date column (a view for canonical dates)."""
+    return to_utc(dates).array.asi8
+
+def align_tz(ts: pd.Timestamp, dates: pd.Series) -> pd.Timestamp:
+    """Make `ts` comparable with a date column (UTC if the column is tz-aware)."""
+    if isinstance(dates.dtype, pd.DatetimeTZDtype):
+        return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert(dates.dt.tz)
+    return ts.tz_convert('UTC').tz_localize(None) if ts.tzinfo is not None else ts
+
+def filter_dates(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Rows with start <= date <= end (naive dates and bounds are taken as UTC)."""
+    ns = epoch_ns(df['date'])
+    mask = (ns >= as_utc(start).value) & (ns <= as_utc(end).value)
+    return df.loc[mask].copy()
+
 def filter_timerange(df: pd.DataFrame, timerange: str) -> pd.DataFrame:
     start, end = parse_timerange(timerange)
-    # Align tz-awareness: if df['date'] is tz-aware, localize start/end to UTC
-    if pd.api.types.is_datetime64tz_dtype(df['date']):
-        start = start.tz_localize('UTC') if start.tzinfo is None else start
-        end = end.tz_localize('UTC') if end.tzinfo is None else end
-    mask = (df['date'] >= start) & (df['date'] <= end)
-    return df.loc[mask].copy()
+    return filter_dates(df, start, end)
@@ -0,0 +1,204 @@
+"""
+Long-running incremental updates (`metrex watch`).
+
+A `Watcher` loads the market once, then polls the datafolder for
+`*-{timeframe}.feather` files whose mtime/size changed and reads only the
+candles newer than those it already holds (the date filter is pushed down
+into Arrow). New candles are appended to a resident frame that keeps just
+the history the next update needs: each metric's `lookback` candles per pair
+and the last 24h of every pair for the rank columns. Metrics and ranks are
+then updated exactly like a `latest-` run of `process`/`rank_pairs`, without
+re-reading outputs: the metrics frame, cumulative state and each pair's last
+ranked date stay in memory. Only new rank rows are handed to the store; the
+metrics file is rewritten from the resident metrics frame on every update.
+"""
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+from .io import feather_files, load, load_feathers, save, tail_dates
+from .processor import (_carry_rows, _rank_frame, _read_state, _write_ranks, _write_state, load_market,
+                        lookback_bars, lookback_start, plan_load, run_metrics)
+from .profiling import stage
+from .ranking import LOOKBACK
+from .store import open_store
+from .timeindex import TimeIndex
+from .writer import DEFAULT_WORKERS, PairWriter
+
+
+class Watcher:
+    """Keeps the market resident and updates metrics/rank outputs as candles arrive."""
+
+    def __init__(self, datafolder: Path, timeframe: str, metric_names: Sequence[str] = (),
+                 output: Optional[Path] = None, outputfolder: Optional[Path] = None,
+                 store: str = 'feather', ctx: Optional[Dict[str, Any]] = None, compact: bool = False,
+                 write_workers: int = DEFAULT_WORKERS):
+        if output is None and outputfolder is None:
+            raise ValueError('Nothing to watch: give a metrics output and/or a rank output folder')
+        if output is not None and not metric_names:
+            raise ValueError('A metrics output needs at least one metric')
+        self.datafolder = Path(datafolder)
+        self.timeframe = timeframe
+        self.metric_names = list(metric_names)
+        self.output = Path(output) if output is not None else None
+        self.compact = compact
+        self.bars = max(lookback_bars(self.metric_names), 1)
+        self.ctx: Dict[str, Any] = dict(ctx or {})
+        self.market: Optional[pd.DataFrame] = None
+        self.metrics: Optional[pd.DataFrame] = None
+        self.store = None
+        self.writer: Optional[PairWriter] = None
+        self.rank_last: Dict[str, pd.Timestamp] = {}
+        # Rows written by the latest update (for consumers such as `metrex serve`)
+        self.new_metrics: Optional[pd.DataFrame] = None
+        self.new_ranks: Optional[pd.DataFrame] = None
+        self._seen: Dict[Path, Tuple[int, int]] = {}
+        self._last_candle: Dict[str, pd.Timestamp] = {}
+
+        if self.output is not None:
+            checkpoint = _read_state(self.output)
+            if self.output.exists() and checkpoint and checkpoint.get('metrics') == self.metric_names:
+                existing = load(self.output)
+                if not existing.empty:
+                    self.metrics = existing
+                    self.ctx['resume_after'] = pd.Timestamp(existing['date'].max())
+                    self.ctx['state'] = checkpoint.get('state', {})
+        if outputfolder is not None:
+            Path(outputfolder).mkdir(parents=True, exist_ok=True)
+            self.store = open_store(store, Path(outputfolder), timeframe)
+            self.writer = PairWriter(self.store, write_workers)
+            self.rank_last = self.store.last_dates(self._pairs(feather_files(self.datafolder, timeframe)))
+        # Ranks need every pair's OHLCV; metrics alone only what they declare
+        plan = plan_load(self.metric_names)
+        self.pairs = plan.pairs if self.store is None else None
+        self.columns = plan.columns if self.store is None else None
+
+    @staticmethod
+    def _pairs(files: Sequence[Path]) -> List[str]:
+        return [f.stem.split('-')[0] for f in files]
+
+    def _history_start(self) -> Optional[pd.Timestamp]:
+        """Earliest candle the first update needs (None: the whole history)."""
+        starts = []
+        if self.output is not None:
+            if self.metrics is None:
+                return None
+            before = self.ctx['resume_after']
+            tails = tail_dates(self.datafolder, self.timeframe, before, self.bars, self.pairs)
+            starts.append(lookback_start(tails, self.bars, before))
+        if self.store is not None:
+            pairs = set(self._pairs(feather_files(self.datafolder, self.timeframe)))
+            if not pairs <= set(self.rank_last):
+                return None
+            starts.append(min(self.rank_last.values()) - LOOKBACK)
+        return min(starts)
+
+    def poll(self) -> List[Path]:
+        """Candle files that are new or changed since the last poll."""
+        changed = []
+        for f in feather_files(self.datafolder, self.timeframe, self.pairs):
+            st = f.stat()
+            sig = (st.st_mtime_ns, st.st_size)
+            if self._seen.get(f) != sig:
+                self._seen[f] = sig
+                changed.append(f)
+        return changed
+
+    def _read_new(self, files: List[Path]) -> pd.DataFrame:
+        frames = []
+        for f in files:
+            last = self._last_candle.get(f.stem.split('-')[0])
+            df = load_feathers(self.datafolder, self.timeframe, columns=self.columns, start=last, files=[f],
+                               compact=self.compact)
+            if last is not None:
+                df = df[df['date'] > last]
+            frames.append(df)
+        new = pd.concat(frames, ignore_index=True)
+        new['pair'] = new['pair'].astype(str)
+        return new
+
+    def update(self) -> int:
+        """Read new candles and update the outputs; returns the number of new candles."""
+        self.new_metrics = self.new_ranks = None
+        changed = self.poll()
+        if not changed and self.market is not None:
+            return 0
+        if self.market is None:
+            new = load_market(self.datafolder, self.timeframe, start=self._history_start(), compact=self.compact,
+                              columns=self.columns, pairs=self.pairs)
+            new['pair'] = new['pair'].astype(str)
+            self.market = new
+        else:
+            with stage('read_new') as st:
+                new = self._read_new(changed)
+                st['rows'] = len(new)
+            if new.empty:
+                return 0
+            self.market = pd.concat([self.market, new], ignore_index=True)
+        if new.empty:
+            return 0
+        self._last_candle.update(TimeIndex.from_frame(new).last())
+        if self.output is not None:
+            self._update_metrics()
+        if self.store is not None:
+            self._update_ranks()
+        self._trim()
+        return len(new)
+
+    def _update_metrics(self) -> None:
+        with stage('run_metrics'):
+            result = run_metrics(self.market, self.metric_names, self.ctx, float32=self.compact)
+        last = self.ctx.get('resume_after')
+        if last is not None:
+            result = result[result['date'] > last]
+        if result.empty:
+            return
+        self.metrics = result if self.metrics is None else pd.concat([self.metrics, result], ignore_index=True)
+        self.new_metrics = result
+        last = pd.Timestamp(result['date'].max())
+        with stage('save', rows=len(result)):
+            save(self.metrics, self.output)
+            _write_state(self.output, self.metric_names, last, self.ctx.get('state', {}))
+        self.ctx['resume_after'] = last
+
+    def _update_ranks(self) -> None:
+        with stage('rank', rows=len(self.market)):
+            ranked = _rank_frame(self.market.copy(), self.rank_last, self.compact)
+        if ranked is None:
+            return
+        panel, out = ranked
+        last = out['pair'].map(self.rank_last).astype(out['date'].dtype)
+        self.new_ranks = out[last.isna().to_numpy() | (out['date'] > last).to_numpy()].reset_index(drop=True)
+        with stage('write', rows=len(out)):
+            _write_ranks(panel, out, self.writer, self.rank_last)
+            self.writer.wait()
+            self.store.flush()
+        present = panel.present
+        for j, pair in enumerate(panel.pairs):
+            last = panel.dates[present[:, j]].max()
+            if pair not in self.rank_last or last > self.rank_last[pair]:
+                self.rank_last[pair] = last
+
+    def _trim(self) -> None:
+        """Drop resident candles no future update can need."""
+        df = self.market
+        keep = pd.Series(False, index=df.index)
+        if self.output is not None:
+            keep[_carry_rows(df, self.bars).index] = True
+        if self.store is not None:
+            index = TimeIndex.from_frame(df)
+            keep[df.index[index.since({p: t - LOOKBACK for p, t in index.last().items()})]] = True
+        self.market = df[keep.to_numpy()].reset_index(drop=True)
+
+    def run(self, interval: float = 5.0, iterations: Optional[int] = None,
+            on_update: Optional[Callable[['Watcher', int], None]] = None) -> None:
+        """Poll every `interval` seconds (forever unless `iterations` is given)."""
+        done = 0
+        while iterations is None or done < iterations:
+            t0 = time.monotonic()
+            n = self.update()
+            if n and on_update is not None:
+                on_update(self, n)
+            done += 1
+            if iterations is None or done < iterations:
+                time.sleep(max(0.0, interval - (time.monotonic() - t0)))
@@ -0,0 +1,80 @@
+"""
+Background writer for per-pair rank outputs.
+
+`PairWriter` runs `store.append` calls on a bounded thread pool. Reading a
+pair's old file, merging and compressing the new one overlap with the next
+pair (and, in streaming runs, with ranking the next chunk): Arrow releases
+the GIL while it decodes, compresses and writes. At most `max_pending`
+appends are queued; `submit` blocks beyond that, so a fast producer cannot
+pile every pair's frame up in memory. The first error is raised from the
+next `wait`.
+
+    with PairWriter(store, workers=8) as writer:
+        for pair, frame in frames:
+            writer.submit(pair, frame)
+        writer.wait()
+        store.flush()
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+import threading
+import pandas as pd
+from .options import DEFAULT_WORKERS
+
+
+class PairWriter:
+    """Appends frames to a store from `workers` threads (inline with one worker)."""
+
+    def __init__(self, store, workers: int = DEFAULT_WORKERS, max_pending: Optional[int] = None):
+        if workers < 1:
+            raise ValueError(f"Need at least one writer, got {workers}")
+        self.store = store
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='metrex-write') if workers > 1 else None
+        self._slots = threading.Semaphore(max_pending or 2 * workers)
+        self._pending: List[Future] = []
+
+    def submit(self, pair: str, df: pd.DataFrame) -> None:
+        """Queue an append (blocks while `max_pending` appends are outstanding).
+
+        Appends for one pair must not overlap: call `wait` before submitting
+        the same pair again.
+        """
+        if self._pool is None:
+            self.store.append(pair, df)
+            return
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self.store.append, pair, df)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append(future)
+
+    def wait(self) -> None:
+        """Block until every queued append has finished; re-raise the first error."""
+        pending, self._pending = self._pending, []
+        errors = [e for e in (f.exception() for f in pending) if e is not None]
+        if errors:
+            raise errors[0]
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def __enter__(self) -> 'PairWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # Already failing: let queued writes finish, but keep the original error
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,11 @@
+from pathlib import Path
+import pytest
+from benchmarks.synthetic import generate
+
+
+@pytest.fixture(scope='session')
+def datafolder(tmp_path_factory) -> Path:
+    """Small 1h market: listings, delistings, a gap in every pair and NaN closes."""
+    folder = tmp_path_factory.mktemp('data')
+    generate(folder, pairs=12, bars=1500, timeframe='1h', gaps=0.03, nan_closes=0.002, seed=7)
+    return folder
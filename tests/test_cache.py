@@ -0,0 +1,113 @@
+import os
+import shutil
+import pandas as pd
+import pytest
+import metrex.processor
+from metrex.cache import MetricCache
+from metrex.metrics import REGISTRY
+from metrex.processor import process
+
+CTX = {'vol_regime_mode': 'expanding'}
+METRICS = ['btc_trend_slope', 'breadth_sma50', 'market_vol_regime']
+
+
+def entries(cache_dir):
+    return sorted(p.stem for p in cache_dir.glob('*.feather'))
+
+
+def forbid_loads(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('candles loaded on a cached run')
+    monkeypatch.setattr(metrex.processor, 'load_market', fail)
+
+
+@pytest.fixture
+def market(datafolder, tmp_path):
+    """A copy of the test market that tests may modify."""
+    folder = tmp_path / 'data'
+    shutil.copytree(datafolder, folder)
+    return folder
+
+
+def test_exact_rerun_hits(datafolder, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    first = tmp_path / 'first.feather'
+    process(datafolder, '1h', '20220105-20220201', METRICS, first, ctx=CTX, cache_dir=cache_dir)
+    assert len(entries(cache_dir)) == len(METRICS)
+    forbid_loads(monkeypatch)
+    second = tmp_path / 'second.feather'
+    process(datafolder, '1h', '20220105-20220201', METRICS, second, ctx=CTX, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(pd.read_feather(first), pd.read_feather(second))
+    assert len(entries(cache_dir)) == len(METRICS)
+
+
+def test_changed_file_invalidates_only_its_readers(market, tmp_path):
+    cache_dir = tmp_path / 'cache'
+    output = tmp_path / 'metrics.feather'
+    process(market, '1h', '20220105-20220201', METRICS, output, ctx=CTX, cache_dir=cache_dir)
+    before = entries(cache_dir)
+    path = market / 'P0001_USDT-1h.feather'
+    df = pd.read_feather(path)
+    df.iloc[:-1].to_feather(path)
+    process(market, '1h', '20220105-20220201', METRICS, output, ctx=CTX, cache_dir=cache_dir)
+    # The BTC-only metrics hit; breadth_sma50 reads P0001 and is recomputed
+    added = set(entries(cache_dir)) - set(before)
+    assert len(added) == 1
+
+
+def test_key_changes_with_its_inputs(market, tmp_path):
+    cache = MetricCache(tmp_path / 'cache')
+    metric = REGISTRY['btc_trend_slope']
+    path = market / 'BTC_USDT-1h.feather'
+    inputs = {'timeframe': '1h', 'start': pd.Timestamp('2022-01-05', tz='UTC'),
+              'end': pd.Timestamp('2022-02-01', tz='UTC'), 'files': cache.fingerprints([path])}
+    key = cache.key(metric, CTX, inputs)
+    assert cache.key(metric, dict(CTX), dict(inputs)) == key
+
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.key(metric, CTX, {**inputs, 'files': cache.fingerprints([path])}) != key
+    assert cache.key(metric, CTX, {**inputs, 'end': pd.Timestamp('2022-02-02', tz='UTC')}) != key
+    assert cache.key(metric, {'vol_regime_mode': 'full'}, inputs) != key
+    assert cache.key(metric, {**CTX, 'state': {metric.name: {'n': 1}}}, inputs) != key
+
+    assert cache.key(type(metric)(window=metric.window + 1), CTX, inputs) != key
+    same, bumped = type(metric)(), type(metric)()
+    same.version, bumped.version = metric.version, metric.version + 1
+    assert cache.key(bumped, CTX, inputs) != cache.key(same, CTX, inputs)
+
+
+def test_lru_eviction(tmp_path):
+    frame = pd.DataFrame({'date': pd.date_range('2022-01-01', periods=1000, freq='1h', tz='UTC'),
+                          'value': range(1000)})
+    probe = MetricCache(tmp_path / 'probe')
+    probe.put('probe', frame)
+    size = sum(p.stat().st_size for p in (tmp_path / 'probe').iterdir())
+
+    cache = MetricCache(tmp_path / 'cache', max_bytes=3 * size + 64)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, frame, {'i': i})
+        # Distinct, increasing access times
+        for suffix in ('feather', 'json'):
+            os.utime(cache.root / f'{key}.{suffix}', ns=(10**18 + i, 10**18 + i))
+    assert entries(cache.root) == ['a', 'b', 'c']
+    # Reading 'a' makes 'b' the least recently used entry
+    hit = cache.get('a')
+    assert hit is not None and hit[1] == {'i': 0}
+    cache.put('d', frame)
+    assert entries(cache.root) == ['a', 'c', 'd']
+    assert cache.get('b') is None
+
+
+def test_latest_with_cache(datafolder, tmp_path, monkeypatch):
+    full = tmp_path / 'full.feather'
+    process(datafolder, '1h', '20220101-20220301', METRICS, full, ctx=CTX)
+    cache_dir = tmp_path / 'cache'
+    for name in ('first', 'second'):
+        if name == 'second':
+            forbid_loads(monkeypatch)
+        output = tmp_path / f'{name}.feather'
+        process(datafolder, '1h', '20220101-20220201', METRICS, output, ctx=CTX, cache_dir=cache_dir)
+        process(datafolder, '1h', 'latest-20220301', METRICS, output, ctx=CTX, cache_dir=cache_dir)
+        pd.testing.assert_frame_equal(pd.read_feather(full), pd.read_feather(output),
+                                      check_exact=False, rtol=1e-9, atol=1e-12)
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+from metrex.io import load_feathers
+from metrex.timeutils import parse_timerange
+
+
+def _write(folder, pair, dates):
+    n = len(dates)
+    pd.DataFrame({'date': dates, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+                  'volume': range(n)}).to_feather(folder / f"{pair}-1h.feather")
+
+
+@pytest.mark.parametrize('as_column', [
+    lambda d: d.strftime('%Y-%m-%d %H:%M:%S'),
+    lambda d: d.tz_localize(None),
+    lambda d: d,
+])
+def test_timerange_any_date_type(tmp_path, as_column):
+    dates = pd.date_range('2022-01-01', periods=3000, freq='h', tz='UTC')
+    _write(tmp_path, 'BTC_USDT', as_column(dates))
+    _write(tmp_path, 'ETH_USDT', as_column(dates[100:]))
+    start, end = parse_timerange('20220201-20220205')
+    df = load_feathers(tmp_path, '1h', start=start, end=end)
+    assert len(df) == 2 * 97
+    assert df['date'].min() == pd.Timestamp('2022-02-01', tz='UTC')
+    assert df['date'].max() == pd.Timestamp('2022-02-05', tz='UTC')
+
+
+def test_timerange_timestamp_column(tmp_path):
+    dates = pd.date_range('2022-01-01', periods=500, freq='h', tz='UTC')
+    frame = pd.DataFrame({'timestamp': dates.asi8, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0,
+                          'volume': 1.0})
+    frame.to_feather(tmp_path / 'BTC_USDT-1h.feather')
+    df = load_feathers(tmp_path, '1h', start=pd.Timestamp('2022-01-05'), end=pd.Timestamp('2022-01-06'))
+    assert len(df) == 25
+    assert df['date'].tolist() == list(dates[96:121])
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic import generate
+from metrex.io import load_feathers
+from metrex.metrics.base import PanelMetric
+from metrex.processor import run_metrics
+
+
+@pytest.fixture(scope='module')
+def market(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('clean')
+    generate(folder, pairs=10, bars=1200, timeframe='1h', gaps=0.03, nan_closes=0.0, seed=11)
+    return load_feathers(folder, '1h')
+
+
+def test_avg_correlation_btc_matches_pandas(market):
+    result = run_metrics(market, ['avg_correlation_btc'], {})
+
+    # Reference: per-pair pandas rolling correlation of returns with BTC's at the same dates
+    df = market.assign(pair=market['pair'].astype(str)).sort_values(['pair', 'date'])
+    df['ret'] = df.groupby('pair')['close'].pct_change()
+    btc = df[df['pair'] == 'BTC_USDT'].set_index('date')['ret'].rename('btc_ret')
+    df = df.join(btc, on='date')
+    df['corr'] = df.groupby('pair', group_keys=False).apply(
+        lambda g: g['ret'].rolling(50, min_periods=10).corr(g['btc_ret']))
+    expected = df.groupby('date')['corr'].mean().dropna()
+
+    got = result.set_index('date')['avg_corr_btc']
+    assert got.dropna().index.equals(expected.index)
+    np.testing.assert_allclose(got[expected.index].to_numpy(), expected.to_numpy(), rtol=1e-7, atol=1e-9)
+
+
+def test_panel_metric_requires_compute_panel():
+    class Incomplete(PanelMetric):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError, match='compute_panel'):
+        Incomplete()
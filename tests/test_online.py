@@ -0,0 +1,102 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from metrex.io import load_feathers
+from metrex.metrics import REGISTRY
+from metrex.online import P2Quantile, RunningMoments
+from metrex.panel import MarketPanel
+
+
+def round_trip(state):
+    return json.loads(json.dumps(state))
+
+
+@pytest.fixture(scope='module')
+def values():
+    rng = np.random.default_rng(3)
+    x = np.abs(rng.standard_t(4, 6000)) * 0.01
+    x[rng.random(len(x)) < 0.01] = np.nan
+    return x
+
+
+def test_p2_quantile_is_exact_up_to_five_values():
+    est = P2Quantile(0.33)
+    assert np.isnan(est.value)
+    seen = []
+    for x in [5.0, 1.0, 4.0, 2.0, 3.0]:
+        est.update(x)
+        seen.append(x)
+        assert est.value == np.quantile(seen, 0.33)
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
+
+
+@pytest.mark.parametrize('p', [0.33, 0.67])
+def test_p2_quantile_tracks_expanding_quantile(values, p):
+    got = P2Quantile(p).update_many(values)
+    expected = pd.Series(values).expanding().quantile(p).to_numpy()
+    # P² is approximate; once a few hundred values are in it stays close
+    np.testing.assert_allclose(got[500:], expected[500:], rtol=0.03)
+    assert abs(got[-1] / expected[-1] - 1) < 0.02
+
+
+def test_p2_quantile_state_round_trip(values):
+    full = P2Quantile(0.67).update_many(values)
+    for split in (3, 5, 2000):
+        head = P2Quantile(0.67)
+        first = head.update_many(values[:split])
+        rest = P2Quantile.from_state(round_trip(head.to_state()), 0.67).update_many(values[split:])
+        np.testing.assert_array_equal(np.r_[first, rest], full)
+    assert P2Quantile.from_state(None, 0.33).p == 0.33
+
+
+def test_running_moments_match_expanding(values):
+    # An offset mean checks the sums do not cancel
+    x = values + 1000.0
+    mean, std = RunningMoments().update_many(x)
+    s = pd.Series(x)
+    np.testing.assert_allclose(mean, s.expanding().mean(), rtol=1e-12)
+    np.testing.assert_allclose(std[1:], s.expanding().std()[1:], rtol=1e-7)
+    assert np.isnan(std[0])
+
+
+def test_running_moments_state_round_trip(values):
+    full_mean, full_std = RunningMoments().update_many(values)
+    head = RunningMoments()
+    means, stds = [], []
+    for part in np.array_split(values, [1, 700, 701, 4000]):
+        m, s = head.update_many(part)
+        means.append(m)
+        stds.append(s)
+        head = RunningMoments.from_state(round_trip(head.to_state()))
+    np.testing.assert_allclose(np.concatenate(means), full_mean, rtol=1e-12)
+    np.testing.assert_allclose(np.concatenate(stds), full_std, rtol=1e-12, equal_nan=True)
+
+
+def test_expanding_regime_incremental_matches_full(datafolder):
+    metric = REGISTRY['market_vol_regime']
+    market = load_feathers(datafolder, '1h', pairs=['BTC_USDT'])
+    ctx = {'vol_regime_mode': 'expanding'}
+    full = metric.compute_panel(MarketPanel.from_frame(market), dict(ctx))
+
+    dates = market['date'].sort_values().unique()
+    parts = []
+    run_ctx = dict(ctx)
+    previous = None
+    for end in (dates[300], dates[301], dates[900], dates[-1]):
+        part = market[market['date'] <= end]
+        if previous is not None:
+            # Like a `latest-` run: reload `lookback` bars before the last written date
+            start = dates[max(0, np.searchsorted(dates, previous) - metric.lookback)]
+            part = part[part['date'] >= start]
+            run_ctx = dict(ctx, state=round_trip(run_ctx['state']), resume_after=previous)
+        frame = metric.compute_panel(MarketPanel.from_frame(part), run_ctx)
+        parts.append(frame if previous is None else frame[frame['date'] > previous])
+        previous = end
+    incremental = pd.concat(parts, ignore_index=True)
+
+    pd.testing.assert_series_equal(incremental['date'], full['date'])
+    pd.testing.assert_series_equal(incremental['market_vol_regime'], full['market_vol_regime'])
+    # Moments are summed batch by batch, so the z-score agrees to rounding only
+    np.testing.assert_allclose(incremental['vol_zscore'], full['vol_zscore'], rtol=1e-12, atol=1e-12)
@@ -0,0 +1,26 @@
+import pytest
+from metrex.metrics import REGISTRY, all_names
+from metrex.processor import process
+
+CTX = {'vol_regime_mode': 'expanding'}
+
+
+@pytest.fixture
+def custom_metric(monkeypatch):
+    """A parameterized instance registered at runtime, unknown to spawned workers' registries."""
+    metric = type(REGISTRY['btc_trend_slope'])(window=35, fit=True)
+    metric.name = 'btc_trend_slope_35'
+    monkeypatch.setitem(REGISTRY._metrics, metric.name, metric)
+    monkeypatch.setitem(REGISTRY._specs, metric.name, REGISTRY._specs['btc_trend_slope']._replace(name=metric.name))
+    return metric
+
+
+@pytest.mark.parametrize('fmt', ['feather', 'csv'])
+def test_jobs_output_is_byte_identical(datafolder, tmp_path, custom_metric, fmt):
+    # The custom instance replaces the default one, whose columns it shares
+    names = [n for n in all_names() if n != 'btc_trend_slope']
+    serial, parallel = tmp_path / f'serial.{fmt}', tmp_path / f'parallel.{fmt}'
+    process(datafolder, '1h', '20220101-20220301', names, serial, ctx=CTX)
+    process(datafolder, '1h', '20220101-20220301', names, parallel, ctx=CTX, jobs=3)
+    assert custom_metric.name in names
+    assert serial.read_bytes() == parallel.read_bytes()
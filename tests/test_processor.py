@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+import metrex.io
+import metrex.processor
+from metrex.io import OHLCV_COLUMNS
+from metrex.metrics import all_names
+from metrex.processor import LoadPlan, lookback_start, plan_load, process
+from metrex.timeindex import TimeIndex
+
+CTX = {'vol_regime_mode': 'expanding'}
+
+
+def assert_same(expected: pd.DataFrame, actual: pd.DataFrame):
+    pd.testing.assert_frame_equal(expected.reset_index(drop=True), actual.reset_index(drop=True),
+                                  check_exact=False, rtol=1e-9, atol=1e-12)
+
+
+@pytest.fixture(scope='module')
+def full_metrics(datafolder, tmp_path_factory):
+    output = tmp_path_factory.mktemp('full') / 'metrics.feather'
+    process(datafolder, '1h', '20220101-20220301', all_names(), output, ctx=CTX)
+    return pd.read_feather(output)
+
+
+@pytest.mark.parametrize('first_end', ['20220115', '20220201'])
+def test_latest_matches_full_run(datafolder, full_metrics, tmp_path, first_end):
+    output = tmp_path / 'metrics.feather'
+    process(datafolder, '1h', f'20220101-{first_end}', all_names(), output, ctx=CTX)
+    process(datafolder, '1h', 'latest-20220301', all_names(), output, ctx=CTX)
+    assert_same(full_metrics, pd.read_feather(output))
+
+
+def test_lookback_start_counts_bars():
+    hour = pd.Timedelta('1h').value
+    btc = np.arange(100) * hour
+    # 20 bars, then a 50 bar gap, then 30 bars
+    gappy = np.r_[np.arange(0, 20), np.arange(70, 100)] * hour
+    df = pd.DataFrame({'date': pd.to_datetime(np.r_[btc, gappy], utc=True),
+                       'pair': ['BTC'] * len(btc) + ['ALT'] * len(gappy)})
+    before = pd.Timestamp(99 * hour, tz='UTC')
+    tails = TimeIndex.from_frame(df).tail(40, before)
+    assert len(tails['ALT']) == len(tails['BTC']) == 40
+    # The wall-clock window (bar 60 on) would hold only 30 ALT bars
+    assert lookback_start(tails, 40, before) == pd.Timestamp(10 * hour, tz='UTC')
+
+
+@pytest.mark.parametrize('chunk', ['10D', '3D'])
+def test_streaming_matches_full_run(datafolder, full_metrics, tmp_path, chunk):
+    output = tmp_path / 'metrics.feather'
+    process(datafolder, '1h', '20220101-20220301', all_names(), output, ctx=CTX, chunk=chunk)
+    assert_same(full_metrics, pd.read_feather(output))
+
+
+def test_plan_load_unions_declarations():
+    btc = plan_load(['btc_trend_slope', 'market_vol_regime'])
+    assert btc.columns == ['close']
+    assert btc.pairs('BTC_USDT') and not btc.pairs('P0001_USDT')
+    broad = plan_load(['btc_trend_slope', 'new_highs_lows', 'volume_surge_ratio'])
+    assert broad.pairs is None
+    assert broad.columns == ['high', 'low', 'close', 'volume']
+    assert broad.lookback == max(plan_load([n]).lookback for n in ['btc_trend_slope', 'new_highs_lows'])
+
+
+def test_btc_only_run_reads_btc_close_only(datafolder, tmp_path, monkeypatch):
+    names = ['btc_trend_slope', 'market_vol_regime']
+    reads = []
+    read_one = metrex.io._read_one
+
+    def spy(path, pair_index, dictionary, columns, start, end):
+        reads.append((path.name, list(columns)))
+        return read_one(path, pair_index, dictionary, columns, start, end)
+    monkeypatch.setattr(metrex.io, '_read_one', spy)
+    pruned = tmp_path / 'pruned.feather'
+    process(datafolder, '1h', '20220105-20220201', names, pruned, ctx=CTX)
+    assert reads == [('BTC_USDT-1h.feather', ['close'])]
+
+    # Without the pushdown every pair and column is read; the metrics are unchanged
+    reads.clear()
+    unpruned_plan = lambda metric_names: LoadPlan(None, list(OHLCV_COLUMNS), plan_load(metric_names).lookback)
+    monkeypatch.setattr(metrex.processor, 'plan_load', unpruned_plan)
+    unpruned = tmp_path / 'unpruned.feather'
+    process(datafolder, '1h', '20220105-20220201', names, unpruned, ctx=CTX)
+    assert len(reads) == len(list(datafolder.glob('*-1h.feather')))
+    pd.testing.assert_frame_equal(pd.read_feather(pruned), pd.read_feather(unpruned))
@@ -0,0 +1,51 @@
+import json
+from pathlib import Path
+import pandas as pd
+from metrex.io import load_feathers
+from metrex.processor import process
+from metrex.profiling import profile, stage
+
+CTX = {'vol_regime_mode': 'expanding'}
+METRICS = ['breadth_sma50', 'btc_trend_slope', 'new_highs_lows']
+
+
+def test_process_records_stages(datafolder, tmp_path):
+    output = tmp_path / 'metrics.feather'
+    report = tmp_path / 'profile.json'
+    with profile(report, cprofile=['run_metrics/metric:btc_trend_slope']):
+        process(datafolder, '1h', '20220105-20220201', METRICS, output, ctx=CTX)
+
+    candles = load_feathers(datafolder, '1h', start=pd.Timestamp('2022-01-05', tz='UTC'),
+                            end=pd.Timestamp('2022-02-01', tz='UTC'))
+    saved = pd.read_feather(output)
+    data = json.loads(report.read_text())
+    stages = {r['stage']: r for r in data['stages']}
+    assert stages['run_metrics/load_feathers']['rows'] == len(candles)
+    assert stages['run_metrics/panel']['rows'] == len(candles)
+    for name in METRICS:
+        assert stages[f'run_metrics/metric:{name}']['rows'] == len(candles)
+    assert stages['run_metrics/join']['rows'] == stages['save']['rows'] == len(saved)
+    # Stages are reported in the order they started, nested ones inside their parent
+    order = [r['stage'] for r in data['stages']]
+    assert order.index('run_metrics') < order.index('run_metrics/load_feathers') < order.index('save')
+    for r in data['stages']:
+        assert r['wall_s'] >= 0 and r['cpu_s'] >= 0
+    assert data['totals']['save']['count'] == 1
+
+    # Only the matching stage was run under cProfile
+    dumps = [r['cprofile'] for r in data['stages'] if 'cprofile' in r]
+    assert len(dumps) == 1 and Path(dumps[0]).exists()
+    assert stages['run_metrics/metric:btc_trend_slope']['cprofile'] == dumps[0]
+
+
+def test_streamed_stages_repeat(datafolder, tmp_path):
+    with profile() as profiler:
+        process(datafolder, '1h', '20220105-20220201', METRICS, tmp_path / 'metrics.feather', ctx=CTX, chunk='10D')
+    totals = profiler.totals()
+    assert totals['save']['count'] == totals['run_metrics']['count'] > 1
+    assert totals['save']['rows'] == len(pd.read_feather(tmp_path / 'metrics.feather'))
+
+
+def test_stage_without_profiler_is_a_no_op():
+    with stage('anything', rows=3) as record:
+        record['rows'] = 4
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+from metrex import processor, sharding
+from metrex.io import load_feathers
+from metrex.processor import rank_pairs
+from metrex.ranking import gather_ranks
+from metrex.sharding import rank_sharded
+from metrex.store import read_pair, stored_pairs
+
+
+def read_all(folder):
+    return {pair: read_pair(folder, pair, '1h') for pair in stored_pairs(folder, '1h')}
+
+
+def assert_same_ranks(expected, actual):
+    assert sorted(expected) == sorted(actual)
+    for pair, frame in expected.items():
+        pd.testing.assert_frame_equal(frame, actual[pair], check_exact=False, rtol=1e-9, obj=pair)
+
+
+@pytest.fixture(scope='module')
+def full_ranks(datafolder, tmp_path_factory):
+    folder = tmp_path_factory.mktemp('ranks')
+    rank_pairs(datafolder, '1h', '20220101-20220301', folder)
+    return read_all(folder)
+
+
+@pytest.mark.parametrize('store', ['feather', 'partitioned'])
+def test_latest_matches_full_run(datafolder, full_ranks, tmp_path, monkeypatch, store):
+    rank_pairs(datafolder, '1h', '20220101-20220201', tmp_path, store=store)
+    starts = []
+    load_market = processor.load_market
+    monkeypatch.setattr(processor, 'load_market', lambda *a, **kw: starts.append(kw['start']) or load_market(*a, **kw))
+    rank_pairs(datafolder, '1h', 'latest-20220301', tmp_path, store=store)
+    assert_same_ranks(full_ranks, read_all(tmp_path))
+    # Only the history from 24h before the oldest last written date is reloaded
+    assert starts[0] is not None and starts[0] > pd.Timestamp('2022-01-01', tz='UTC')
+
+
+def test_sharded_latest_matches_full_run(datafolder, full_ranks, tmp_path, monkeypatch):
+    out, work = tmp_path / 'out', tmp_path / 'work'
+    rank_pairs(datafolder, '1h', '20220101-20220201', out)
+    starts = []
+    load_market = sharding.load_market
+    monkeypatch.setattr(sharding, 'load_market', lambda *a, **kw: starts.append(kw['start']) or load_market(*a, **kw))
+    for i in range(3):
+        sharding.compute_shard(datafolder, '1h', 'latest-20220301', out, work, 3, i)
+    sharding.gather_shards(work)
+    for i in range(3):
+        sharding.write_shard(work, i)
+    assert_same_ranks(full_ranks, read_all(out))
+    assert all(s is not None and s > pd.Timestamp('2022-01-01', tz='UTC') for s in starts)
+
+
+def test_ranks_match_pandas(datafolder, full_ranks):
+    # Reference: per-pair time-based pandas operations, then per-date ranks
+    df = load_feathers(datafolder, '1h', start=pd.Timestamp('2022-01-01'), end=pd.Timestamp('2022-03-01'))
+    frames = []
+    for pair, g in df.assign(pair=df['pair'].astype(str)).groupby('pair'):
+        g = g.set_index('date')
+        prev = g['close'].reindex(g.index - pd.Timedelta('24h')).to_numpy()
+        g['changePercentage24h'] = (g['close'] - prev) / prev * 100.0
+        g['volumeInCurrency'] = g['volume'] * g['close']
+        g['volumeInCurrency24'] = g['volumeInCurrency'].rolling('24h').sum()
+        frames.append(g.reset_index())
+    ref = pd.concat(frames, ignore_index=True)
+    by_date = ref.groupby('date')
+    ref['pairsCount'] = by_date['pair'].transform('size')
+    ref['topGainerRank'] = by_date['changePercentage24h'].rank(method='min', ascending=False)
+    ref['topLooserRank'] = by_date['changePercentage24h'].rank(method='min')
+    ref['topVolumeRank'] = by_date['volumeInCurrency24'].rank(method='min', ascending=False)
+    ref['bottomVolumeRank'] = by_date['volumeInCurrency24'].rank(method='min')
+    for pair, g in ref.groupby('pair'):
+        out = full_ranks[pair]
+        expected = g.drop(columns=['pair']).reset_index(drop=True)[out.columns]
+        pd.testing.assert_frame_equal(out, expected, check_exact=False, rtol=1e-9, check_dtype=False, obj=pair)
+
+
+@pytest.mark.parametrize('store', ['feather', 'partitioned'])
+def test_streaming_matches_full_run(datafolder, full_ranks, tmp_path, store):
+    rank_pairs(datafolder, '1h', '20220101-20220301', tmp_path, store=store, chunk='4D')
+    assert_same_ranks(full_ranks, read_all(tmp_path))
+
+
+def test_streaming_latest_matches_full_run(datafolder, full_ranks, tmp_path):
+    rank_pairs(datafolder, '1h', '20220101-20220201', tmp_path, chunk='5D')
+    rank_pairs(datafolder, '1h', 'latest-20220301', tmp_path, chunk='5D')
+    assert_same_ranks(full_ranks, read_all(tmp_path))
+
+
+@pytest.mark.parametrize('store', ['feather', 'partitioned'])
+def test_sharded_matches_full_run(datafolder, full_ranks, tmp_path, store):
+    rank_sharded(datafolder, '1h', '20220101-20220301', tmp_path, shards=3, store=store, jobs=2)
+    assert_same_ranks(full_ranks, read_all(tmp_path))
+
+
+def test_gather_ranks_matches_panel(datafolder, full_ranks):
+    long = pd.concat([f.assign(pair=p) for p, f in full_ranks.items()], ignore_index=True)
+    ranks = gather_ranks(long['date'].array.asi8, long['changePercentage24h'].to_numpy(),
+                         long['volumeInCurrency24'].to_numpy(), block=97)
+    for col, values in ranks.items():
+        np.testing.assert_array_equal(values, long[col].to_numpy(dtype=float), err_msg=col)
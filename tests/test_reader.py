@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import metrex
+from metrex import reader
+from metrex.io import save
+
+
+@pytest.fixture(scope='module')
+def frame():
+    n = 5000
+    return pd.DataFrame({
+        'date': pd.date_range('2022-01-01', periods=n, freq='min', tz='UTC'),
+        'value': np.arange(n, dtype=float),
+        # Nullable, like --compact ranks
+        'rank': pd.array([None if i % 7 == 0 else i % 11 for i in range(n)], dtype='Int16'),
+    })
+
+
+@pytest.mark.parametrize('ext', ['feather', 'parquet'])
+def test_files_are_closed(frame, tmp_path, monkeypatch, ext):
+    path = tmp_path / f'metrics.{ext}'
+    save(frame, path, batch_rows=1000)
+    opened = []
+    memory_map = pa.memory_map
+    monkeypatch.setattr(reader.pa, 'memory_map', lambda *a: opened.append(memory_map(*a)) or opened[-1])
+    closed = []
+    parquet_close = reader._ParquetFile.close
+    monkeypatch.setattr(reader._ParquetFile, 'close', lambda self: closed.append(self) or parquet_close(self))
+    metrex.read(path, start='2022-01-02 00:00', end='2022-01-02 06:00')
+    metrex.read(path, last=10, columns=['rank'])
+    if ext == 'feather':
+        assert len(opened) == 2 and all(source.closed for source in opened)
+    else:
+        assert len(closed) == 2
+
+
+def _expected(frame, start=None, end=None, last=None, columns=None):
+    df = frame
+    if start is not None:
+        df = df[df['date'] >= pd.Timestamp(start, tz='UTC')]
+    if end is not None:
+        df = df[df['date'] <= pd.Timestamp(end, tz='UTC')]
+    if last is not None:
+        df = df.iloc[len(df) - min(last, len(df)):]
+    if columns is not None:
+        df = df[['date'] + columns]
+    return df.reset_index(drop=True)
+
+
+QUERIES = [
+    {},
+    {'start': '2022-01-02 03:07', 'end': '2022-01-02 09:59'},
+    {'start': '2022-01-03'},
+    {'end': '2022-01-01 00:00'},
+    {'start': '2021-01-01', 'end': '2021-12-31'},
+    {'last': 1},
+    {'last': 1500},
+    {'last': 0},
+    {'last': 100000},
+    {'start': '2022-01-01 10:00', 'end': '2022-01-02', 'last': 30},
+    {'start': '2022-01-02', 'columns': ['rank']},
+]
+
+
+@pytest.mark.parametrize('ext', ['feather', 'parquet', 'csv'])
+@pytest.mark.parametrize('query', QUERIES, ids=str)
+def test_read_file_round_trip(frame, tmp_path, ext, query):
+    path = tmp_path / f'metrics.{ext}'
+    save(frame, path, batch_rows=700)
+    got = metrex.read(path, **query)
+    expected = _expected(frame, **query)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=ext != 'csv')
+
+
+def test_read_unindexed_feather(frame, tmp_path):
+    # Plain pandas output: a single batch and no stored index
+    path = tmp_path / 'metrics.feather'
+    frame.to_feather(path)
+    for query in QUERIES:
+        pd.testing.assert_frame_equal(metrex.read(path, **query), _expected(frame, **query))
+
+
+@pytest.mark.parametrize('ext', ['feather', 'parquet'])
+def test_read_asof(frame, tmp_path, ext):
+    path = tmp_path / f'metrics.{ext}'
+    save(frame, path, batch_rows=700)
+    # On a row, between rows, before the first and after the last
+    for ts in ['2022-01-02 05:00', '2022-01-02 05:00:30', '2021-12-31', '2030-01-01']:
+        got = metrex.read(path, asof=ts)
+        pd.testing.assert_frame_equal(got, _expected(frame, end=ts, last=1))
+    got = metrex.read(path, start='2022-01-02 05:01', asof='2022-01-02 05:00:30')
+    assert got.empty and list(got.columns) == list(frame.columns)
+    with pytest.raises(ValueError):
+        metrex.read(path, asof='2022-01-02', last=3)
+
+
+@pytest.mark.parametrize('store', ['feather', 'partitioned'])
+def test_read_rank_folder(datafolder, tmp_path, store):
+    from metrex.processor import rank_pairs
+    from metrex.store import read_pair
+    # Three runs: the partitioned store keeps one segment per run
+    rank_pairs(datafolder, '1h', '20220101-20220120', tmp_path, store=store, batch_rows=100)
+    rank_pairs(datafolder, '1h', 'latest-20220201', tmp_path, store=store, batch_rows=100)
+    rank_pairs(datafolder, '1h', 'latest-20220215', tmp_path, store=store, batch_rows=100)
+    frame = read_pair(tmp_path, 'BTC_USDT', '1h')
+    for query in QUERIES[:-1] + [{'start': '2022-01-10', 'columns': ['topVolumeRank']}]:
+        got = metrex.read(tmp_path, pair='BTC_USDT', timeframe='1h', **query)
+        pd.testing.assert_frame_equal(got, _expected(frame, **query), obj=str(query))
+    got = metrex.read(tmp_path, pair='BTC_USDT', timeframe='1h', asof='2022-01-25 07:30')
+    pd.testing.assert_frame_equal(got, _expected(frame, end='2022-01-25 07:30', last=1))
+    with pytest.raises(FileNotFoundError):
+        metrex.read(tmp_path, pair='NOPE_USDT', timeframe='1h')
+    with pytest.raises(ValueError):
+        metrex.read(tmp_path, last=5)
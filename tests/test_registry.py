@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import textwrap
+from importlib.metadata import EntryPoint
+import pytest
+from click.testing import CliRunner
+import metrex.cli
+import metrex.metrics
+from metrex.metrics import BUILTIN, ENTRY_POINT_GROUP, _Registry
+
+PLUGIN = '''
+import pandas as pd
+from metrex.metrics.base import PanelMetric
+
+class FundingSkew(PanelMetric):
+    """Test plugin metric."""
+    name = 'funding_skew'
+    columns = ['close']
+
+    def __init__(self, scale: float = 2.0):
+        self.scale = scale
+
+    def compute_panel(self, panel, ctx):
+        return pd.DataFrame({'date': panel.dates, 'funding_skew': self.scale})
+'''
+
+
+def test_list_does_not_import_pandas_or_numpy():
+    code = textwrap.dedent('''
+        import sys
+        from metrex.cli import cli
+        cli(['list'], standalone_mode=False)
+        heavy = sorted(m for m in sys.modules if m.split('.')[0] in ('numpy', 'pandas', 'pyarrow'))
+        print('HEAVY', heavy)
+    ''')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert 'btc_trend_slope' in out
+    assert 'HEAVY []' in out
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """A fresh registry that discovers a `funding_skew` plugin and one clashing with a built-in."""
+    (tmp_path / 'fake_plugin.py').write_text(PLUGIN)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    eps = [EntryPoint('funding_skew', 'fake_plugin:FundingSkew', ENTRY_POINT_GROUP),
+           EntryPoint('breadth_sma50', 'fake_plugin:FundingSkew', ENTRY_POINT_GROUP)]
+    monkeypatch.setattr(metrex.metrics, '_entry_points', lambda: eps)
+    reg = _Registry(BUILTIN)
+    monkeypatch.setattr(metrex.cli, 'REGISTRY', reg)
+    yield reg
+    sys.modules.pop('fake_plugin', None)
+
+
+def test_plugin_metric_is_found(registry):
+    with pytest.warns(UserWarning, match='breadth_sma50'):
+        names = list(registry)
+    assert names == [s.name for s in BUILTIN] + ['funding_skew']
+    assert 'fake_plugin' not in sys.modules
+    metric = registry['funding_skew']
+    assert type(metric).__name__ == 'FundingSkew' and metric.scale == 2.0
+    # The built-in keeps its name
+    assert {s.name: s.plugin for s in registry.specs()}['breadth_sma50'] is False
+
+
+def test_list_shows_plugins(registry):
+    with pytest.warns(UserWarning):
+        result = CliRunner().invoke(metrex.cli.cli, ['list'])
+    assert result.exit_code == 0
+    assert '(plugin: fake_plugin:FundingSkew)' in result.output
@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+from benchmarks.synthetic import generate
+from metrex.io import load_feathers
+from metrex.metrics import all_names
+from metrex.processor import process, process_timeframes, rank_pairs, rank_timeframes
+from metrex.resample import bucket_ends, bucket_starts, resample_ohlcv, timeframe_key
+from metrex.store import read_pair
+from metrex.timeutils import timeframe_to_timedelta
+
+CTX = {'vol_regime_mode': 'expanding'}
+# pandas rules with left-closed, left-labelled buckets like metrex's
+RULES = {'15m': ('15min', pd.Timedelta('15min')), '1h': ('1h', pd.Timedelta('1h')),
+         '4h': ('4h', pd.Timedelta('4h')), '1d': ('1D', pd.Timedelta('1D')),
+         '1w': ('W-MON', pd.Timedelta('7D')), '1M': ('MS', pd.offsets.MonthBegin(1))}
+AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last'}
+
+
+@pytest.fixture(scope='module')
+def base_5m(tmp_path_factory):
+    """5m candles starting mid-hour on a Saturday, with gaps and NaN closes."""
+    folder = tmp_path_factory.mktemp('base5m')
+    generate(folder, pairs=5, bars=3000, timeframe='5m', start='2022-01-01 00:35', gaps=0.05,
+             nan_closes=0.01, seed=3)
+    return load_feathers(folder, '5m')
+
+
+def reference(df: pd.DataFrame, base: pd.Timedelta, timeframe: str, partial: bool) -> pd.DataFrame:
+    """Per-pair pandas resample; buckets without candles dropped, like metrex."""
+    rule, width = RULES[timeframe]
+    frames = []
+    for pair, g in df.groupby('pair', observed=True):
+        g = g.set_index('date').sort_index()
+        kwargs = dict(label='left', closed='left')
+        if timeframe in ('15m', '1h', '4h', '1d'):
+            kwargs['origin'] = 'epoch'
+        r = g.resample(rule, **kwargs)
+        out = r.agg(AGG)
+        out['volume'] = r['volume'].sum(min_count=1)
+        out = out[r.size() > 0]
+        if not partial:
+            out = out[out.index + width <= g.index[-1] + base]
+        frames.append(out.reset_index().assign(pair=pair))
+    return pd.concat(frames, ignore_index=True)
+
+
+def as_compared(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.assign(pair=df['pair'].astype(str), date=df['date'].astype('datetime64[ns, UTC]'))
+    return df[['date', 'pair', 'open', 'high', 'low', 'close', 'volume']].sort_values(
+        ['pair', 'date'], ignore_index=True)
+
+
+@pytest.mark.parametrize('partial', [False, True])
+@pytest.mark.parametrize('base, timeframes', [('5m', ['15m', '1h', '4h', '1d', '1w', '1M']),
+                                              ('1h', ['4h', '1d', '1w', '1M'])])
+def test_resample_matches_pandas(base_5m, datafolder, partial, base, timeframes):
+    # The 1h market spans two months, so it has complete weeks and a complete month
+    df = base_5m if base == '5m' else load_feathers(datafolder, '1h')
+    frames = resample_ohlcv(df, base, timeframes, partial=partial)
+    assert list(frames) == timeframes
+    for tf in timeframes:
+        expected = reference(df, timeframe_to_timedelta(base), tf, partial)
+        pd.testing.assert_frame_equal(as_compared(frames[tf]), as_compared(expected), check_exact=False,
+                                      rtol=1e-12, obj=tf)
+
+
+def test_trailing_bucket_needs_full_coverage(base_5m):
+    btc = base_5m[base_5m['pair'] == 'BTC_USDT']
+    last = btc['date'].max()
+    # Cut the history 20 minutes into an hour: the last 1h bucket is partial
+    cut = btc[btc['date'] <= last.floor('1h') - pd.Timedelta('40min')]
+    full = resample_ohlcv(cut, '5m', ['1h'])['1h']
+    partial = resample_ohlcv(cut, '5m', ['1h'], partial=True)['1h']
+    assert len(partial) == len(full) + 1
+    assert partial['date'].iloc[-1] == cut['date'].max().floor('1h')
+    # The last 5m candle closes exactly on the hour: the bucket is complete
+    whole = btc[btc['date'] < last.floor('1h')]
+    assert resample_ohlcv(whole, '5m', ['1h'])['1h']['date'].iloc[-1] == last.floor('1h') - pd.Timedelta('1h')
+
+
+def test_bucket_alignment():
+    dates = pd.to_datetime(['2022-01-01 00:35', '2022-01-03 00:00', '2022-02-28 23:59', '2024-02-29 12:00'],
+                           utc=True)
+    ns = dates.as_unit('ns').asi8
+    as_ts = lambda a: list(pd.to_datetime(a, utc=True).strftime('%Y-%m-%d %H:%M'))
+    # Weeks open on Monday 00:00 UTC
+    assert as_ts(bucket_starts(ns, '1w')) == ['2021-12-27 00:00', '2022-01-03 00:00', '2022-02-28 00:00',
+                                              '2024-02-26 00:00']
+    assert as_ts(bucket_starts(ns, '1M')) == ['2022-01-01 00:00', '2022-01-01 00:00', '2022-02-01 00:00',
+                                              '2024-02-01 00:00']
+    assert as_ts(bucket_ends(bucket_starts(ns, '1M'), '1M')) == ['2022-02-01 00:00', '2022-02-01 00:00',
+                                                                  '2022-03-01 00:00', '2024-03-01 00:00']
+    assert as_ts(bucket_starts(ns, '3M')) == ['2022-01-01 00:00', '2022-01-01 00:00', '2022-01-01 00:00',
+                                              '2024-01-01 00:00']
+    assert as_ts(bucket_starts(ns, '4h')) == ['2022-01-01 00:00', '2022-01-03 00:00', '2022-02-28 20:00',
+                                              '2024-02-29 12:00']
+    assert sorted(['1M', '1w', '1d', '4h', '5m', '1h'], key=timeframe_key) == ['5m', '1h', '4h', '1d', '1w', '1M']
+
+
+def test_untileable_timeframe_raises(base_5m):
+    with pytest.raises(ValueError, match='Cannot build'):
+        resample_ohlcv(base_5m, '5m', ['7m'])
+    with pytest.raises(ValueError, match='Cannot build'):
+        resample_ohlcv(base_5m, '1w', ['1M'])
+
+
+@pytest.fixture(scope='module')
+def presampled(datafolder, tmp_path_factory):
+    """The test market resampled to 4h and 1d ahead of time, one file per pair."""
+    folder = tmp_path_factory.mktemp('presampled')
+    frames = resample_ohlcv(load_feathers(datafolder, '1h'), '1h', ['4h', '1d'])
+    for tf, frame in frames.items():
+        for pair, g in frame.groupby('pair', observed=True):
+            g.drop(columns='pair').reset_index(drop=True).to_feather(folder / f'{pair}-{tf}.feather')
+    return folder
+
+
+def test_process_timeframes_matches_presampled_files(datafolder, presampled, tmp_path):
+    outputs = process_timeframes(datafolder, '1h', ['4h', '1d'], '20220105-20220220', all_names(),
+                                 tmp_path / 'metrics.feather', ctx=CTX)
+    assert outputs == {'4h': tmp_path / 'metrics-4h.feather', '1d': tmp_path / 'metrics-1d.feather'}
+    for tf, path in outputs.items():
+        expected = tmp_path / f'expected-{tf}.feather'
+        process(presampled, tf, '20220105-20220220', all_names(), expected, ctx=CTX)
+        pd.testing.assert_frame_equal(pd.read_feather(path), pd.read_feather(expected))
+
+
+def test_rank_timeframes_matches_presampled_files(datafolder, presampled, tmp_path):
+    rank_timeframes(datafolder, '1h', ['4h', '1d'], '20220105-20220220', tmp_path / 'out')
+    for tf in ('4h', '1d'):
+        rank_pairs(presampled, tf, '20220105-20220220', tmp_path / 'expected')
+        pairs = sorted(p.name for p in (tmp_path / 'expected').glob(f'*-{tf}.feather'))
+        assert pairs == sorted(p.name for p in (tmp_path / 'out').glob(f'*-{tf}.feather'))
+        for name in pairs:
+            pair = name.split('-')[0]
+            pd.testing.assert_frame_equal(read_pair(tmp_path / 'out', pair, tf),
+                                          read_pair(tmp_path / 'expected', pair, tf))
@@ -0,0 +1,150 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+from metrex.rolling import STATS, rolling_corr, rolling_ols, rolling_stats
+
+
+def _values(rows: int, cols: int = 4, level: float = 100.0, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    values = level + np.cumsum(rng.normal(0, 1, (rows, cols)), axis=0)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    values[10:40, 1] = np.nan
+    return values
+
+
+def _pandas(values: np.ndarray, window: int, stat: str, min_periods=None) -> np.ndarray:
+    roll = pd.DataFrame(values).rolling(window, min_periods=window if min_periods is None else min_periods)
+    return getattr(roll, stat)().to_numpy()
+
+
+def _exact(values: np.ndarray, window: int, stat: str, min_periods=None) -> np.ndarray:
+    """Each window computed on its own in extended precision."""
+    padded = np.concatenate([np.full((window - 1, values.shape[1]), np.nan), values]).astype(np.longdouble)
+    win = sliding_window_view(padded, window, axis=0)
+    count = (~np.isnan(win)).sum(axis=-1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        res = {'sum': np.nansum, 'mean': np.nanmean, 'max': np.nanmax, 'min': np.nanmin,
+               'std': lambda a, axis: np.nanstd(a, axis=axis, ddof=1)}[stat](win, axis=-1)
+    res = res.astype(float)
+    res[count < (window if min_periods is None else min_periods)] = np.nan
+    if stat == 'std':
+        res[count < 2] = np.nan
+    return res
+
+
+@pytest.mark.parametrize('rows', [5000, 30, 3])
+@pytest.mark.parametrize('min_periods', [None, 1, 4])
+def test_rolling_stats_match_pandas(rows, min_periods):
+    values = _values(rows)
+    windows = [5, 20, 50]
+    result = rolling_stats(values, windows, STATS, min_periods)
+    for w in windows:
+        for stat in STATS:
+            # pandas updates its variance online, which drifts slightly on long series
+            rtol = 1e-7 if stat == 'std' else 1e-9
+            np.testing.assert_allclose(result[(stat, w)], _pandas(values, w, stat, min_periods),
+                                       rtol=rtol, atol=1e-9, err_msg=f'{stat} {w}')
+
+
+def test_rolling_stats_precision_on_long_high_series():
+    # Small moves on a large level over a long history: the extended-precision
+    # running sums stay accurate where pandas' online variance is off by ~1e-4
+    values = _values(20000, level=1e6)
+    result = rolling_stats(values, [5, 200], ['sum', 'mean', 'std'], 2)
+    for (stat, w), res in result.items():
+        np.testing.assert_allclose(res, _exact(values, w, stat, 2), rtol=1e-7 if stat == 'std' else 1e-12,
+                                   err_msg=f'{stat} {w}')
+
+
+def test_rolling_extremes_match_pandas_exactly():
+    values = _values(1000, seed=1)
+    for w in [1, 2, 7, 64, 999, 1000, 1500]:
+        result = rolling_stats(values, [w], ['max', 'min'], 1)
+        for stat in ['max', 'min']:
+            np.testing.assert_array_equal(result[(stat, w)], _pandas(values, w, stat, 1), err_msg=f'{stat} {w}')
+
+
+def test_all_nan_column():
+    values = np.full((100, 2), np.nan)
+    values[:, 0] = np.arange(100.0)
+    result = rolling_stats(values, [10], STATS)
+    assert all(np.isnan(result[(stat, 10)][:, 1]).all() for stat in STATS)
+    np.testing.assert_allclose(result[('mean', 10)][9:, 0], np.arange(4.5, 95.0))
+
+
+def test_unknown_stat():
+    with pytest.raises(ValueError):
+        rolling_stats(np.zeros((5, 1)), [2], ['median'])
+
+
+@pytest.mark.parametrize('min_periods', [None, 10])
+def test_rolling_corr_matches_pandas(min_periods):
+    rng = np.random.default_rng(3)
+    y = rng.normal(0, 0.01, 3000)
+    x = 0.7 * y[:, None] + rng.normal(0, 0.01, (3000, 3))
+    x[rng.random(x.shape) < 0.05] = np.nan
+    y[rng.random(len(y)) < 0.02] = np.nan
+    x[100:200, 1] = 0.5  # constant: undefined correlation
+    result = rolling_corr(x, y[:, None], 50, min_periods, beta=True)
+    mp = 50 if min_periods is None else min_periods
+    for j in range(x.shape[1]):
+        xs, ys = pd.Series(x[:, j]), pd.Series(y)
+        corr = xs.rolling(50, min_periods=mp).corr(ys).to_numpy()
+        beta = (xs.rolling(50, min_periods=mp).cov(ys) / ys.where(xs.notna()).rolling(50, min_periods=mp).var())
+        # Windows over the constant stretch are left out: pandas gives NaN or noise there
+        defined = np.ones(len(y), dtype=bool)
+        if j == 1:
+            defined[100:250] = False
+        np.testing.assert_array_equal(np.isnan(result['corr'][defined, j]), np.isnan(corr[defined]))
+        defined &= ~np.isnan(corr)
+        np.testing.assert_allclose(result['corr'][defined, j], corr[defined], rtol=1e-7, atol=1e-9)
+        np.testing.assert_allclose(result['beta'][defined, j], beta.to_numpy()[defined], rtol=1e-7, atol=1e-9)
+    # Windows entirely within the constant stretch
+    assert np.isnan(result['corr'][149:200, 1]).all() and np.isnan(result['beta'][149:200, 1]).all()
+
+
+def _lstsq_ols(y: np.ndarray, window: int):
+    """Per-bar reference: np.linalg.lstsq on every complete window."""
+    n = len(y)
+    out = {k: np.full(n, np.nan) for k in ('slope', 'intercept', 'r2')}
+    x = np.arange(window, dtype=float)
+    a = np.column_stack([x, np.ones(window)])
+    for t in range(window - 1, n):
+        win = y[t - window + 1:t + 1]
+        if np.isnan(win).any():
+            continue
+        (slope, intercept), *_ = np.linalg.lstsq(a, win, rcond=None)
+        out['slope'][t], out['intercept'][t] = slope, intercept
+        ss_tot = ((win - win.mean()) ** 2).sum()
+        if np.ptp(win) > 0:
+            out['r2'][t] = 1 - ((win - (slope * x + intercept)) ** 2).sum() / ss_tot
+    return out
+
+
+@pytest.mark.parametrize('window', [2, 5, 20])
+def test_rolling_ols_matches_lstsq(window):
+    y = _values(600, 2, level=40000.0, seed=5)[:, 1]
+    y[200:230] = y[199]  # constant stretch: slope 0, R² undefined
+    got = rolling_ols(y, window=window, fit=True)
+    expected = _lstsq_ols(y, window)
+    assert np.isnan(got['slope'][:window - 1]).all()
+    for key in ('slope', 'intercept', 'r2'):
+        np.testing.assert_array_equal(np.isnan(got[key]), np.isnan(expected[key]), err_msg=key)
+    np.testing.assert_allclose(got['slope'], expected['slope'], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(got['intercept'], expected['intercept'], rtol=1e-12)
+    # 1 - ss_res/ss_tot in the reference cancels to ~1e-11 when R² is near 0
+    np.testing.assert_allclose(got['r2'], expected['r2'], rtol=1e-9, atol=1e-10)
+    # Without `fit` only the slope is returned, with the same values
+    slope_only = rolling_ols(y, window=window)
+    assert list(slope_only) == ['slope']
+    np.testing.assert_array_equal(slope_only['slope'], got['slope'])
+
+
+def test_rolling_ols_window_longer_than_series():
+    got = rolling_ols(np.arange(5, dtype=float), window=20, fit=True)
+    assert set(got) == {'slope', 'intercept', 'r2'}
+    assert all(len(v) == 5 and np.isnan(v).all() for v in got.values())
+    assert np.isnan(rolling_ols(np.full(30, np.nan), window=5)['slope']).all()
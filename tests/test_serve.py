@@ -0,0 +1,50 @@
+import threading
+import pandas as pd
+import pytest
+from metrex.metrics import all_names
+from metrex.processor import process, rank_pairs
+from metrex.serve import TOP_COLUMNS, MetrexClient, OutputReloader, QueryIndex, make_server
+from metrex.store import read_pair
+
+
+@pytest.fixture(scope='module', params=[False, True], ids=['default', 'compact'])
+def served(request, datafolder, tmp_path_factory):
+    folder = tmp_path_factory.mktemp('out')
+    output = folder / 'metrics.feather'
+    process(datafolder, '1h', '20220101-20220201', all_names(), output, compact=request.param)
+    rank_pairs(datafolder, '1h', '20220101-20220201', folder / 'ranks', compact=request.param)
+    index = QueryIndex()
+    OutputReloader(index, output, folder / 'ranks', '1h').refresh()
+    server = make_server(index, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = MetrexClient(port=server.server_address[1])
+    yield client, folder / 'ranks'
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_rank_asof_in_first_day(served):
+    client, ranks = served
+    df = read_pair(ranks, 'BTC_USDT', '1h')
+    row = client.rank_asof('BTC_USDT', df['date'].iloc[3])
+    # No 24h change yet: the change ranks are null
+    assert row['date'] == df['date'].iloc[3].isoformat()
+    assert row['changePercentage24h'] is None and row['topGainerRank'] is None
+    assert row['topVolumeRank'] == df['topVolumeRank'].iloc[3]
+
+
+@pytest.mark.parametrize('by', TOP_COLUMNS)
+def test_top_with_missing_ranks(served, by):
+    client, _ = served
+    ts = pd.Timestamp('2022-01-01 05:00', tz='UTC')
+    rows = client.top(by, k=5, ts=ts)
+    assert all(r['date'] == ts.isoformat() and r[by] is not None for r in rows)
+    assert [r[by] for r in rows] == sorted(r[by] for r in rows)
+
+
+def test_metrics_and_health(served):
+    client, _ = served
+    assert client.metrics_asof('2022-01-01 00:00')['date'] == '2022-01-01T00:00:00+00:00'
+    assert client.latest_metrics()['date'] == '2022-02-01T00:00:00+00:00'
+    assert client.health()['pairs'] > 0
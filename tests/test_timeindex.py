@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from metrex.cli import cli
+from metrex.timeindex import TimeIndex
+
+HOUR = pd.Timedelta('1h')
+START = pd.Timestamp('2022-01-01', tz='UTC')
+# ALT misses bars 40-44 and 70; NEW lists late but has no gap; BTC is complete
+BARS = {
+    'BTC_USDT': np.arange(100),
+    'ALT_USDT': np.r_[np.arange(0, 40), np.arange(45, 70), np.arange(71, 100)],
+    'NEW_USDT': np.arange(60, 100),
+}
+
+
+def candles(bars: np.ndarray) -> pd.DataFrame:
+    dates = START + bars * HOUR
+    close = 100.0 + np.arange(len(bars))
+    return pd.DataFrame({'date': dates, 'open': close, 'high': close, 'low': close, 'close': close,
+                         'volume': 1.0})
+
+
+@pytest.fixture
+def gappy(tmp_path):
+    """The `BARS` candles as 1h feather files."""
+    for pair, bars in BARS.items():
+        candles(bars).to_feather(tmp_path / f'{pair}-1h.feather')
+    return tmp_path
+
+
+def test_gaps():
+    frames = [candles(bars).assign(pair=pair) for pair, bars in BARS.items()]
+    df = pd.concat(frames, ignore_index=True).sample(frac=1, random_state=0)
+    found = TimeIndex.from_frame(df).gaps('1h')
+    assert list(found['pair'].astype(str)) == ['ALT_USDT', 'ALT_USDT']
+    assert list(found['last_before']) == [START + 39 * HOUR, START + 69 * HOUR]
+    assert list(found['first_after']) == [START + 45 * HOUR, START + 71 * HOUR]
+    assert list(found['missing_bars']) == [5, 1]
+    # On a 2h grid only the 6h jump is a gap, of 2 bars
+    assert TimeIndex.from_frame(df).gaps('2h')['missing_bars'].tolist() == [2]
+
+
+def test_gaps_cli(gappy):
+    result = CliRunner().invoke(cli, ['gaps', '--datafolder', str(gappy), '--timeframe', '1h'])
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[-1] == '2 gaps, 6 missing bars in 1 pairs'
+    assert any('ALT_USDT' in line and '2022-01-02 15:00:00+00:00' in line and line.rstrip().endswith('5')
+               for line in lines)
+
+    result = CliRunner().invoke(cli, ['gaps', '--datafolder', str(gappy), '--timeframe', '1h', '--min-bars', '2'])
+    assert result.output.splitlines()[-1] == '1 gaps, 5 missing bars in 1 pairs'
+
+    result = CliRunner().invoke(cli, ['gaps', '--datafolder', str(gappy), '--timeframe', '1h', '--min-bars', '6'])
+    assert result.exit_code == 0
+    assert 'No gaps in 1h candles' in result.output